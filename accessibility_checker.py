@@ -1,88 +1,155 @@
-from bs4 import BeautifulSoup
+from document import as_document
 
-def check_accessibility(soup, url):
+# Landmark roles and the elements that carry them implicitly
+LANDMARK_TAGS = {'main': 'main', 'nav': 'navigation', 'header': 'banner', 'footer': 'contentinfo',
+                 'aside': 'complementary', 'search': 'search'}
+
+# Input types that need no label (buttons carry their own text, hidden inputs are not shown)
+UNLABELED_INPUT_TYPES = ('submit', 'button', 'hidden', 'reset', 'image')
+
+GENERIC_LINK_TEXT = ('click here', 'read more', 'here', 'link')
+
+class AccessibilityIndex:
+    """
+    Lookups the accessibility rules share, derived from the page's TagIndex without
+    walking the tree again: id counts, label targets, ARIA id references, landmark
+    roles and heading levels in document order
+    """
+    def __init__(self, index):
+        self.index = index
+        self.ids = {value: len(elements) for value, elements in index.values.get('id', {}).items()}
+        self.label_for = set(index.values.get('for', {}))
+
+        # (attribute, referenced id) of every aria-labelledby / aria-describedby
+        self.aria_refs = []
+        for attr in ('aria-labelledby', 'aria-describedby'):
+            for elem in index.with_attr(attr):
+                self.aria_refs += [(attr, ref) for ref in _id_refs(elem.get(attr))]
+
+        self.landmarks = {role for tag, role in LANDMARK_TAGS.items() if index.count(tag)}
+        self.landmarks.update(index.values.get('role', {}))
+
+    def is_labelled(self, control):
+        """True if a form control has an accessible name: <label for>, a wrapping <label>, ARIA or a title"""
+        elem = control['control']
+        if control['wrapped'] or elem.get('id') in self.label_for:
+            return True
+        if (elem.get('aria-label') or '').strip() or (elem.get('title') or '').strip():
+            return True
+        return any(ref in self.ids for ref in _id_refs(elem.get('aria-labelledby')))
+
+def _id_refs(value):
+    if isinstance(value, list):
+        return value
+    return (value or '').split()
+
+# Rules run in registration order; each takes an AccessibilityIndex and returns
+# (issue, penalty) or None. Register more with @accessibility_rule
+ACCESSIBILITY_RULES = []
+
+def accessibility_rule(func):
+    """Adds a rule to the checks run by check_accessibility"""
+    ACCESSIBILITY_RULES.append(func)
+    return func
+
+@accessibility_rule
+def images_alt(a11y):
+    images_without_alt = [img for img in a11y.index.find_all('img') if not img.get('alt')]
+    if images_without_alt:
+        return f"❌ {len(images_without_alt)} images missing alt text", min(20, len(images_without_alt) * 2)
+
+@accessibility_rule
+def single_h1(a11y):
+    h1_count = a11y.index.count('h1')
+    if h1_count == 0:
+        return "❌ No H1 heading found - important for screen readers", 10
+    if h1_count > 1:
+        return f"⚠️ Multiple H1 headings ({h1_count}) - should be unique", 5
+
+@accessibility_rule
+def heading_order(a11y):
+    previous = 0
+    for level in a11y.index.headings:
+        if previous and level > previous + 1:
+            return f"⚠️ Heading levels skipped (H{previous} → H{level}) - keep the outline sequential", 3
+        previous = level
+
+@accessibility_rule
+def form_labels(a11y):
+    for control in a11y.index.controls:
+        if control['control'].get('type') not in UNLABELED_INPUT_TYPES and not a11y.is_labelled(control):
+            return "❌ Form inputs missing associated labels", 5
+
+@accessibility_rule
+def duplicate_ids(a11y):
+    duplicates = [value for value, count in a11y.ids.items() if count > 1]
+    if duplicates:
+        return (f"❌ {len(duplicates)} duplicate id values (e.g., '{duplicates[0]}') - "
+                "breaks labels and ARIA references", 5)
+
+@accessibility_rule
+def aria_references(a11y):
+    missing = [ref for _, ref in a11y.aria_refs if ref not in a11y.ids]
+    if missing:
+        return (f"❌ {len(missing)} aria-labelledby/aria-describedby references point to missing ids "
+                f"(e.g., '{missing[0]}')", 5)
+
+@accessibility_rule
+def inline_styles(a11y):
+    # Color contrast (basic check)
+    if a11y.index.with_attr('style'):
+        return "⚠️ Inline styles detected - may affect accessibility", 3
+
+@accessibility_rule
+def main_landmark(a11y):
+    if 'main' not in a11y.landmarks:
+        return "⚠️ No <main> landmark - helps screen reader navigation", 5
+
+@accessibility_rule
+def nav_landmark(a11y):
+    if 'navigation' not in a11y.landmarks:
+        return "⚠️ No <nav> landmark found", 3
+
+@accessibility_rule
+def link_text(a11y):
+    for text in a11y.index.anchor_texts:
+        if text.strip().lower() in GENERIC_LINK_TEXT:
+            return "❌ Generic link text found (e.g., 'click here') - use descriptive text", 5
+
+@accessibility_rule
+def html_lang(a11y):
+    html_tag = a11y.index.find('html')
+    if html_tag and not html_tag.get('lang'):
+        return "❌ Missing lang attribute on <html> tag", 10
+
+@accessibility_rule
+def skip_link(a11y):
+    index = a11y.index
+    if not (index.by_attr_value('href', '#main', 'a') or index.by_attr_value('href', '#content', 'a')):
+        return "⚠️ No skip navigation link found", 5
+
+@accessibility_rule
+def video_captions(a11y):
+    if any(not video['has_captions'] for video in a11y.index.videos):
+        return "❌ Videos missing captions/subtitles", 10
+
+def check_accessibility(page, url):
     """
     Checks WCAG 2.1 accessibility guidelines
+    Accepts a PageDocument or a BeautifulSoup tree; every rule in ACCESSIBILITY_RULES
+    is evaluated against indexes built in the page's single tag-index walk
     Returns dict with accessibility issues and score
     """
+    a11y = AccessibilityIndex(as_document(page, url).index)
     issues = []
     score = 100
-    
-    # Check for missing alt text on images
-    images = soup.find_all('img')
-    images_without_alt = [img for img in images if not img.get('alt')]
-    if images_without_alt:
-        issues.append(f"❌ {len(images_without_alt)} images missing alt text")
-        score -= min(20, len(images_without_alt) * 2)
-    
-    # Check for proper heading hierarchy
-    headings = soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
-    h1_count = len(soup.find_all('h1'))
-    if h1_count == 0:
-        issues.append("❌ No H1 heading found - important for screen readers")
-        score -= 10
-    elif h1_count > 1:
-        issues.append(f"⚠️ Multiple H1 headings ({h1_count}) - should be unique")
-        score -= 5
-    
-    # Check for form labels
-    forms = soup.find_all('form')
-    for form in forms:
-        inputs = form.find_all(['input', 'select', 'textarea'])
-        for input_elem in inputs:
-            if input_elem.get('type') not in ['submit', 'button', 'hidden']:
-                label_id = input_elem.get('id')
-                if not label_id or not form.find('label', {'for': label_id}):
-                    issues.append("❌ Form inputs missing associated labels")
-                    score -= 5
-                    break
-    
-    # Check for color contrast (basic check)
-    inline_styles = soup.find_all(style=True)
-    if inline_styles:
-        issues.append("⚠️ Inline styles detected - may affect accessibility")
-        score -= 3
-    
-    # Check for ARIA landmarks
-    main_tag = soup.find('main')
-    nav_tag = soup.find('nav')
-    if not main_tag:
-        issues.append("⚠️ No <main> landmark - helps screen reader navigation")
-        score -= 5
-    if not nav_tag:
-        issues.append("⚠️ No <nav> landmark found")
-        score -= 3
-    
-    # Check for link text
-    links = soup.find_all('a')
-    generic_link_text = ['click here', 'read more', 'here', 'link']
-    for link in links:
-        text = link.get_text().strip().lower()
-        if text in generic_link_text:
-            issues.append("❌ Generic link text found (e.g., 'click here') - use descriptive text")
-            score -= 5
-            break
-    
-    # Check for lang attribute
-    html_tag = soup.find('html')
-    if html_tag and not html_tag.get('lang'):
-        issues.append("❌ Missing lang attribute on <html> tag")
-        score -= 10
-    
-    # Check for skip links
-    skip_link = soup.find('a', href='#main') or soup.find('a', href='#content')
-    if not skip_link:
-        issues.append("⚠️ No skip navigation link found")
-        score -= 5
-    
-    # Check for video captions
-    videos = soup.find_all('video')
-    for video in videos:
-        if not video.find('track', kind='captions'):
-            issues.append("❌ Videos missing captions/subtitles")
-            score -= 10
-            break
-    
+    for rule in ACCESSIBILITY_RULES:
+        found = rule(a11y)
+        if found:
+            issue, penalty = found
+            issues.append(issue)
+            score -= penalty
+
     return {
         'accessibility_score': max(0, score),
         'accessibility_issues': issues if issues else ["✅ No major accessibility issues detected"],
@@ -1,27 +1,36 @@
-import google.generativeai as genai
-from dotenv import load_dotenv
 import os
 import json
 import re
+import hashlib
+import sqlite3
+import threading
+from config import setting
+from disk_cache import DiskCache
 
-load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-model = genai.GenerativeModel('gemini-1.5-flash')
+MODEL_NAME = 'gemini-1.5-flash'
 
-def analyze_with_ai(scan_data):
+_model = None
+_model_lock = threading.Lock()
+
+def get_model():
     """
-    Returns:
-    - issues: list of problems
-    - suggestions: list of improvements
-    - fix_snippets: code snippets for fixes
-    - optimized_html: full HTML with improvements (agentic AI)
-    - keywords: top keywords
-    - headings_count: H1/H2/H3 count
+    Gemini model, created on first use
+    google-generativeai is imported here rather than at module import, so
+    importing this module stays cheap for workers that never call the model
     """
-    # Generate dummy keywords from title
-    keywords = re.findall(r'\b\w+\b', scan_data.get("title", ""))[:10]
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                import google.generativeai as genai
+                genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+                _model = genai.GenerativeModel(MODEL_NAME)
+    return _model
 
-    prompt = f"""
+# Bump PROMPT_VERSION for changes to how responses are used; any edit to the
+# template itself also changes the cache key, so stale reports are never served
+PROMPT_VERSION = "1"
+PROMPT_TEMPLATE = """
 You are a website audit and optimization expert.
 Analyze this website scan data and provide:
 1) issues (list)
@@ -34,45 +43,139 @@ Analyze this website scan data and provide:
 Respond ONLY in JSON format.
 
 Scan Data:
-{json.dumps(scan_data, indent=2)}
+{scan_data}
 """
+
+# Several pages in one request; the response maps each page id to a report
+BATCH_PROMPT_TEMPLATE = """
+You are a website audit and optimization expert.
+Analyze the scan data of each page below and, for every page, provide:
+1) issues (list)
+2) suggestions (list)
+3) fix_snippets (list of HTML/SEO fixes)
+4) optimized_html (full HTML content with improvements applied)
+5) keywords (list)
+6) headings_count (dict of H1, H2, H3 counts)
+
+Respond ONLY in JSON format, as an object mapping each page id to its report.
+
+Pages:
+{pages}
+"""
+
+# AI report cache, keyed by normalized scan data + prompt + model
+AI_CACHE_PATH = setting("AUDITAI_AI_CACHE", "ai_cache.db")
+AI_CACHE_TTL = setting("AUDITAI_AI_CACHE_TTL", 7 * 24 * 3600)
+AI_CACHE_MAX_ENTRIES = setting("AUDITAI_AI_CACHE_MAX", 5000)
+
+# Timing-dependent fields differ on every fetch of an unchanged page
+VOLATILE_FIELDS = ('load_time', 'timings', 'timings_p95', 'performance_score', 'overall_score')
+
+_ai_cache = None
+
+def get_ai_cache():
+    """Shared on-disk AI report cache, opened on first use"""
+    global _ai_cache
+    if _ai_cache is None:
+        _ai_cache = DiskCache(AI_CACHE_PATH, max_entries=AI_CACHE_MAX_ENTRIES)
+    return _ai_cache
+
+def ai_cache_key(scan_data, model=MODEL_NAME):
+    """Stable hash of the normalized scan data, prompt templates and model name"""
+    normalized = {key: value for key, value in scan_data.items() if key not in VOLATILE_FIELDS}
+    if isinstance(normalized.get('page_size_mb'), float):
+        normalized['page_size_mb'] = round(normalized['page_size_mb'], 2)
+    prompts = PROMPT_VERSION + PROMPT_TEMPLATE + BATCH_PROMPT_TEMPLATE
+    payload = json.dumps({
+        'scan_data': normalized,
+        'prompt': hashlib.sha256(prompts.encode()).hexdigest(),
+        'model': model
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def cached_report(cache_key):
+    """Cached report for cache_key, or None"""
     try:
-        response = model.generate_content(prompt)
-        content = response.text
-        
-        # Clean markdown code blocks if present
-        if '```json' in content:
-            content = content.split('```json')[1].split('```')[0].strip()
-        elif '```' in content:
-            content = content.split('```')[1].split('```')[0].strip()
-        
-        ai_report = json.loads(content)
-
-        # Fallbacks
-        ai_report.setdefault("keywords", keywords)
-        ai_report.setdefault("headings_count", scan_data.get("headings_count", {}))
-        ai_report.setdefault("fix_snippets", [])
-        ai_report.setdefault("optimized_html", "")
-        return ai_report
-
-    except Exception as e:
-        # Fallback
-        return {
-            "issues": [
-                f"H1 tags found: {scan_data.get('h1_count',0)}",
-                f"Images without ALT: {scan_data.get('images_without_alt',0)}",
-                f"Page load time: {scan_data.get('load_time',0)}s"
-            ],
-            "suggestions": [
-                "Add missing meta description",
-                "Optimize images and include ALT text",
-                "Improve page speed"
-            ],
-            "fix_snippets": [
-                "<meta name='description' content='Your description here'>",
-                "<img src='image.jpg' alt='Descriptive text'>"
-            ],
-            "optimized_html": "<!-- Add optimized HTML here -->",
-            "keywords": keywords,
-            "headings_count": scan_data.get("headings_count", {})
-        }
+        cached = get_ai_cache().get(cache_key)
+    except sqlite3.Error:
+        return None
+    if cached is not None:
+        cached["cache_status"] = "hit"
+    return cached
+
+def store_report(cache_key, ai_report):
+    """Caches a model report; fallback reports must never be stored"""
+    try:
+        get_ai_cache().set(cache_key, ai_report, AI_CACHE_TTL)
+    except sqlite3.Error:
+        pass
+
+def build_prompt(scan_data):
+    """Prompt for a single page"""
+    return PROMPT_TEMPLATE.format(scan_data=json.dumps(scan_data, indent=2, default=str))
+
+def build_batch_prompt(pages):
+    """Prompt for several pages, given as a dict of page id -> scan data"""
+    return BATCH_PROMPT_TEMPLATE.format(pages=json.dumps(pages, indent=2, default=str))
+
+def extract_json(content):
+    """Parses a JSON response, stripping markdown code fences if present"""
+    if '```json' in content:
+        content = content.split('```json')[1].split('```')[0].strip()
+    elif '```' in content:
+        content = content.split('```')[1].split('```')[0].strip()
+    return json.loads(content)
+
+def _keywords(scan_data):
+    # Generate dummy keywords from title
+    return re.findall(r'\b\w+\b', scan_data.get("title") or "")[:10]
+
+def complete_report(ai_report, scan_data):
+    """Fills in the fields a model response may leave out"""
+    if not isinstance(ai_report, dict):
+        raise ValueError("AI report is not a JSON object")
+    ai_report.setdefault("keywords", _keywords(scan_data))
+    ai_report.setdefault("headings_count", scan_data.get("headings_count", {}))
+    ai_report.setdefault("fix_snippets", [])
+    ai_report.setdefault("optimized_html", "")
+    return ai_report
+
+def fallback_report(scan_data):
+    """Heuristic report used when the model is unavailable, fails or times out"""
+    return {
+        "issues": [
+            f"H1 tags found: {scan_data.get('h1_count',0)}",
+            f"Images without ALT: {scan_data.get('images_without_alt',0)}",
+            f"Page load time: {scan_data.get('load_time',0)}s"
+        ],
+        "suggestions": [
+            "Add missing meta description",
+            "Optimize images and include ALT text",
+            "Improve page speed"
+        ],
+        "fix_snippets": [
+            "<meta name='description' content='Your description here'>",
+            "<img src='image.jpg' alt='Descriptive text'>"
+        ],
+        "optimized_html": "<!-- Add optimized HTML here -->",
+        "keywords": _keywords(scan_data),
+        "headings_count": scan_data.get("headings_count", {}),
+        "fallback": True
+    }
+
+def analyze_with_ai(scan_data, use_cache=True, timeout=None):
+    """
+    Runs through the shared AI scheduler, so concurrent callers are batched and
+    rate limited; falls back to a heuristic report on errors or after timeout seconds
+    Reuses a cached report for identical scan data unless use_cache is False;
+    ai_report['cache_status'] is 'hit', 'miss' or 'off'
+    Returns:
+    - issues: list of problems
+    - suggestions: list of improvements
+    - fix_snippets: code snippets for fixes
+    - optimized_html: full HTML with improvements (agentic AI)
+    - keywords: top keywords
+    - headings_count: H1/H2/H3 count
+    """
+    from ai_scheduler import get_scheduler
+    return get_scheduler().submit(scan_data, use_cache=use_cache, timeout=timeout).result()
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import time
+from config import setting
+
+# Pluggable AI backends used by the AI scheduler. A backend turns a prompt into
+# response text; "gemini" calls the real model, "stub" answers locally so batching,
+# rate limiting and throughput can be exercised offline.
+
+class AIBackend:
+    """
+    Backend interface: generate(prompt, timeout) returns the model's response text
+    and raises on failure. `model` is part of the report cache key.
+    """
+    name = None
+    model = None
+
+    def generate(self, prompt, timeout=None):
+        raise NotImplementedError
+
+class GeminiBackend(AIBackend):
+    """Google Gemini through google-generativeai"""
+    name = 'gemini'
+
+    def __init__(self):
+        from ai_analyzer import MODEL_NAME
+        self.model = MODEL_NAME
+
+    def generate(self, prompt, timeout=None):
+        from ai_analyzer import get_model
+        options = {'timeout': timeout} if timeout else None
+        return get_model().generate_content(prompt, request_options=options).text
+
+class StubBackend(AIBackend):
+    """
+    Deterministic local backend: the same prompt always gets the same report
+    Sleeps latency seconds plus seconds_per_kb of prompt to mimic a remote model
+    """
+    name = 'stub'
+    model = 'stub'
+
+    def __init__(self, latency=None, seconds_per_kb=None):
+        self.latency = setting("AUDITAI_AI_STUB_LATENCY", 0.5) if latency is None else latency
+        self.seconds_per_kb = (setting("AUDITAI_AI_STUB_SECONDS_PER_KB", 0.0)
+                               if seconds_per_kb is None else seconds_per_kb)
+
+    def generate(self, prompt, timeout=None):
+        delay = self.latency + self.seconds_per_kb * len(prompt) / 1024
+        if timeout is not None and delay > timeout:
+            # Like a real client, give up once the timeout has passed
+            time.sleep(timeout)
+            raise TimeoutError(f"Stub backend timed out after {timeout}s")
+        time.sleep(delay)
+        if '\nPages:\n' in prompt:
+            pages = json.loads(prompt.split('\nPages:\n', 1)[1])
+            return json.dumps({page_id: self._report(scan_data) for page_id, scan_data in pages.items()})
+        scan_data = json.loads(prompt.split('\nScan Data:\n', 1)[1])
+        return "```json\n" + json.dumps(self._report(scan_data)) + "\n```"
+
+    def _report(self, scan_data):
+        digest = hashlib.sha256(json.dumps(scan_data, sort_keys=True).encode()).hexdigest()[:8]
+        issues = []
+        if not scan_data.get('meta_description'):
+            issues.append("Missing meta description")
+        if scan_data.get('h1_count', 0) != 1:
+            issues.append(f"Page has {scan_data.get('h1_count', 0)} H1 tags, expected 1")
+        if scan_data.get('images_without_alt', 0):
+            issues.append(f"{scan_data['images_without_alt']} images without ALT text")
+        if not scan_data.get('https'):
+            issues.append("Page is not served over HTTPS")
+        return {
+            "issues": issues,
+            "suggestions": [f"Resolve: {issue}" for issue in issues],
+            "fix_snippets": [],
+            "optimized_html": f"<!-- stub report {digest} -->",
+            "keywords": sorted(set((scan_data.get('title') or '').lower().split()))[:10],
+            "headings_count": scan_data.get('headings_count', {})
+        }
+
+AI_BACKENDS = {
+    'gemini': GeminiBackend,
+    'stub': StubBackend,
+}
+
+def get_backend(name=None):
+    """Creates the named (or AUDITAI_AI_BACKEND) backend"""
+    name = name or setting("AUDITAI_AI_BACKEND", 'gemini')
+    if name not in AI_BACKENDS:
+        raise ValueError(f"Unknown AI backend '{name}', expected one of {tuple(AI_BACKENDS)}")
+    return AI_BACKENDS[name]()
@@ -0,0 +1,275 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from config import setting
+from ai_backends import get_backend
+from ai_analyzer import (ai_cache_key, cached_report, store_report, build_prompt, build_batch_prompt,
+                         extract_json, complete_report, fallback_report)
+
+# Limits default to the Gemini free tier; 0 disables a limit
+AI_RPM = setting("AUDITAI_AI_RPM", 15)
+AI_TPM = setting("AUDITAI_AI_TPM", 1000000)
+AI_CONCURRENCY = setting("AUDITAI_AI_CONCURRENCY", 4)     # requests in flight
+AI_BATCH_SIZE = setting("AUDITAI_AI_BATCH_SIZE", 4)       # pages per request
+AI_BATCH_WAIT = setting("AUDITAI_AI_BATCH_WAIT", 0.05)    # seconds to wait for a batch to fill
+AI_TIMEOUT = setting("AUDITAI_AI_TIMEOUT", 30.0)          # seconds per request
+
+# Rough token accounting for the TPM budget: ~4 characters per prompt token,
+# plus the expected response size per page
+CHARS_PER_TOKEN = 4
+OUTPUT_TOKENS_PER_PAGE = 1500
+
+def estimate_tokens(prompt, pages=1):
+    """Estimated input + output tokens of one request"""
+    return len(prompt) // CHARS_PER_TOKEN + OUTPUT_TOKENS_PER_PAGE * pages
+
+class RateLimiter:
+    """
+    Token buckets for requests per minute and tokens per minute
+    acquire() blocks until a request fits in both (or gives up at a deadline);
+    a limit of 0 is unlimited
+    """
+    def __init__(self, rpm=0, tpm=0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def acquire(self, tokens=0, deadline=None):
+        """
+        Blocks until one request of `tokens` tokens is within both limits and returns True
+        Returns False, without taking anything, if that would be after deadline (time.monotonic())
+        """
+        if self.tpm:
+            # A request larger than the whole budget waits for a full bucket
+            tokens = min(tokens, self.tpm)
+        while True:
+            with self._lock:
+                self._refill()
+                delay = 0
+                if self.rpm and self._requests < 1:
+                    delay = (1 - self._requests) * 60 / self.rpm
+                if self.tpm and self._tokens < tokens:
+                    delay = max(delay, (tokens - self._tokens) * 60 / self.tpm)
+                if delay <= 0:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return True
+                if deadline is not None and time.monotonic() + delay > deadline:
+                    return False
+            time.sleep(delay)
+
+class AIScheduler:
+    """
+    Batches and runs AI analyses concurrently under a rate limit
+    submit() returns a Future resolving to the report. Pages queued while every
+    request slot is busy are sent together in one request (up to batch_size).
+    Each page's timeout runs from when it is submitted, so time spent waiting for a
+    request slot or the rate limit counts; a page whose timeout passes, or a request
+    that fails, resolves with the heuristic fallback report (a late response is
+    still cached for next time).
+    """
+    def __init__(self, backend=None, rpm=AI_RPM, tpm=AI_TPM, concurrency=AI_CONCURRENCY,
+                 batch_size=AI_BATCH_SIZE, batch_wait=AI_BATCH_WAIT, timeout=AI_TIMEOUT):
+        self.backend = backend or get_backend()
+        self.limiter = RateLimiter(rpm, tpm)
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait
+        self.timeout = timeout
+        self.stats = {'requests': 0, 'pages': 0, 'cache_hits': 0, 'timeouts': 0, 'errors': 0}
+        self._queue = queue.Queue()
+        self._slots = threading.Semaphore(max(1, concurrency))
+        self._pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='ai')
+        self._lock = threading.Lock()
+        self._dispatcher = None
+        self._closed = False
+
+    def submit(self, scan_data, use_cache=True, timeout=None):
+        """Queues one page's scan data; returns a Future of its report"""
+        future = Future()
+        cache_key = ai_cache_key(scan_data, self.backend.model) if use_cache else None
+        if cache_key:
+            cached = cached_report(cache_key)
+            if cached is not None:
+                with self._lock:
+                    self.stats['cache_hits'] += 1
+                future.set_result(cached)
+                return future
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("AI scheduler is closed")
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch, name='ai-dispatcher', daemon=True)
+                self._dispatcher.start()
+        deadline = time.monotonic() + (timeout or self.timeout)
+        self._queue.put((scan_data, cache_key, deadline, future))
+        return future
+
+    def analyze_many(self, scan_datas, use_cache=True):
+        """Reports for several pages, in order"""
+        futures = [self.submit(scan_data, use_cache) for scan_data in scan_datas]
+        return [future.result() for future in futures]
+
+    def close(self):
+        """Finishes queued analyses and stops the worker threads"""
+        with self._lock:
+            self._closed = True
+            dispatcher = self._dispatcher
+        if dispatcher is not None:
+            self._queue.put(None)
+            dispatcher.join()
+        self._pool.shutdown(wait=True)
+
+    def _dispatch(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                return
+            # While every request slot is busy, more pages queue up for this batch;
+            # a page whose timeout passes while waiting gets the fallback report
+            if not self._slots.acquire(timeout=max(0, item[2] - time.monotonic())):
+                self._expire([item])
+                continue
+            batch = [item]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                self._pool.submit(self._run, batch)
+            except RuntimeError:
+                # The interpreter is shutting down; answer now rather than leave callers waiting
+                self._slots.release()
+                for scan_data, cache_key, _, future in batch:
+                    self._resolve(future, self._fallback(scan_data, cache_key))
+
+    def _run(self, batch):
+        try:
+            if len(batch) == 1:
+                prompt = build_prompt(batch[0][0])
+            else:
+                prompt = build_batch_prompt({f"page_{i + 1}": item[0] for i, item in enumerate(batch)})
+            deadline = min(item[2] for item in batch)
+            if not self.limiter.acquire(estimate_tokens(prompt, len(batch)), deadline):
+                self._expire(batch)
+                return
+            timeout = max(0, deadline - time.monotonic())
+
+            timer = threading.Timer(timeout, self._expire, (batch,))
+            timer.daemon = True
+            started = time.monotonic()
+            timer.start()
+            try:
+                reports = self._parse(self.backend.generate(prompt, timeout), batch)
+            except Exception:
+                reports = [None] * len(batch)
+            finally:
+                timer.cancel()
+            failure = 'timeouts' if time.monotonic() - started >= timeout else 'errors'
+
+            with self._lock:
+                self.stats['requests'] += 1
+                self.stats['pages'] += len(batch)
+
+            for (scan_data, cache_key, _, future), report in zip(batch, reports):
+                if report is None:
+                    if self._resolve(future, self._fallback(scan_data, cache_key)):
+                        with self._lock:
+                            self.stats[failure] += 1
+                    continue
+                # Only real model responses are cached, never the fallback report
+                if cache_key:
+                    store_report(cache_key, report)
+                report["cache_status"] = "miss" if cache_key else "off"
+                self._resolve(future, report)
+        except Exception:
+            for scan_data, cache_key, _, future in batch:
+                self._resolve(future, self._fallback(scan_data, cache_key))
+        finally:
+            self._slots.release()
+
+    def _parse(self, text, batch):
+        data = extract_json(text)
+        if len(batch) == 1:
+            return [complete_report(data, batch[0][0])]
+        if isinstance(data, list):
+            data = {f"page_{i + 1}": report for i, report in enumerate(data)}
+        reports = []
+        for i, (scan_data, _, _, _) in enumerate(batch):
+            # A page missing from the batch response gets the fallback report
+            try:
+                reports.append(complete_report(data[f"page_{i + 1}"], scan_data))
+            except (KeyError, TypeError, ValueError):
+                reports.append(None)
+        return reports
+
+    def _expire(self, batch):
+        expired = sum(self._resolve(future, self._fallback(scan_data, cache_key))
+                      for scan_data, cache_key, _, future in batch)
+        with self._lock:
+            self.stats['timeouts'] += expired
+
+    def _fallback(self, scan_data, cache_key):
+        report = fallback_report(scan_data)
+        report["cache_status"] = "miss" if cache_key else "off"
+        return report
+
+    def _resolve(self, future, report):
+        with self._lock:
+            if future.done():
+                return False
+            future.set_result(report)
+            return True
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """Shared AI scheduler for the configured backend, created on first use"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = AIScheduler()
+    return _scheduler
+
+def configure_ai_scheduler(**options):
+    """
+    Replaces the shared scheduler with one built from options (backend, rpm, tpm,
+    concurrency, batch_size, batch_wait, timeout); a backend may be given by name
+    """
+    global _scheduler
+    if isinstance(options.get('backend'), str):
+        options['backend'] = get_backend(options['backend'])
+    with _scheduler_lock:
+        old_scheduler, _scheduler = _scheduler, AIScheduler(**options)
+    if old_scheduler is not None:
+        old_scheduler.close()
+
+def close_ai_scheduler():
+    """Finishes queued analyses and stops the shared scheduler"""
+    global _scheduler
+    with _scheduler_lock:
+        old_scheduler, _scheduler = _scheduler, None
+    if old_scheduler is not None:
+        old_scheduler.close()
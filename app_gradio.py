@@ -1,21 +1,16 @@
 import gradio as gr
-from scanner import scan_website
-from ai_analyzer import analyze_with_ai
 from utils import normalize_url, is_valid_url
-from scoring import calculate_score
-from accessibility_checker import check_accessibility
-from mobile_checker import check_mobile_responsiveness
-from link_checker import check_broken_links
+from pipeline import audit_stages, idle_stages
+from stages import Stage, iter_stages
+from job_service import get_job_service, serve_jobs, QueueFull
 from report_generator import generate_pdf_report
 from history_tracker import save_audit, get_trend_data
-import plotly.graph_objects as go
-import plotly.express as px
-import pandas as pd
-from bs4 import BeautifulSoup
-import requests
+from metrics import add_span, record_audit, serve_metrics, span, stage_spans
+from datetime import datetime, timedelta
 
 def create_gauge_chart(score, title):
     """Create a gauge chart for scores"""
+    import plotly.graph_objects as go
     fig = go.Figure(go.Indicator(
         mode="gauge+number",
         value=score,
@@ -40,6 +35,7 @@ def create_gauge_chart(score, title):
 
 def create_radar_chart(scores_dict):
     """Create radar chart for all scores"""
+    import plotly.graph_objects as go
     categories = list(scores_dict.keys())
     values = list(scores_dict.values())
     
@@ -59,38 +55,36 @@ def create_radar_chart(scores_dict):
 
 def create_metrics_bar_chart(scan_data):
     """Create bar chart for SEO metrics"""
-    metrics_data = pd.DataFrame({
-        'Metric': ['H1 Tags', 'H2 Tags', 'H3 Tags', 'Images w/o ALT', 'Links', 'Scripts'],
-        'Value': [
-            scan_data.get('h1_count', 0),
-            scan_data.get('h2_count', 0),
-            scan_data.get('h3_count', 0),
-            scan_data.get('images_without_alt', 0),
-            scan_data.get('links_count', 0),
-            scan_data.get('scripts_count', 0)
-        ]
-    })
-    
-    fig = px.bar(metrics_data, x='Metric', y='Value', 
-                 title='SEO & Technical Metrics',
-                 color='Value',
-                 color_continuous_scale='Viridis')
-    fig.update_layout(height=400)
+    import plotly.graph_objects as go
+    metrics = ['H1 Tags', 'H2 Tags', 'H3 Tags', 'Images w/o ALT', 'Links', 'Scripts']
+    values = [
+        scan_data.get('h1_count', 0),
+        scan_data.get('h2_count', 0),
+        scan_data.get('h3_count', 0),
+        scan_data.get('images_without_alt', 0),
+        scan_data.get('links_count', 0),
+        scan_data.get('scripts_count', 0)
+    ]
+    
+    fig = go.Figure(go.Bar(
+        x=metrics,
+        y=values,
+        marker=dict(color=values, colorscale='Viridis', showscale=True, colorbar=dict(title='Value'))
+    ))
+    fig.update_layout(title='SEO & Technical Metrics', xaxis_title='Metric', yaxis_title='Value', height=400)
     return fig
 
-def create_trend_chart(url):
-    """Create trend chart from history"""
-    trend_data = get_trend_data(url)
+def create_trend_chart(url, days=365, points=60):
+    """Create trend chart from history rollups for the last `days` days"""
+    import plotly.graph_objects as go
+    trend_data = get_trend_data(url, start=datetime.now() - timedelta(days=days), points=points)
     
     if not trend_data:
         return None
     
-    df = pd.DataFrame(trend_data['scores'])
-    df['Date'] = trend_data['dates']
-    
     fig = go.Figure()
-    for col in df.columns[:-1]:
-        fig.add_trace(go.Scatter(x=df['Date'], y=df[col], mode='lines+markers', name=col))
+    for name, values in trend_data['scores'].items():
+        fig.add_trace(go.Scatter(x=trend_data['dates'], y=values, mode='lines+markers', name=name))
     
     fig.update_layout(
         title='Score Trends Over Time',
@@ -100,116 +94,155 @@ def create_trend_chart(url):
     )
     return fig
 
-def audit_website(url, check_links=True):
-    """Main audit function"""
-    if not url or not is_valid_url(url):
-        return ("❌ Invalid URL", None, None, None, None, None, None, None, None, None, None)
-    
-    url = normalize_url(url)
-    status_msg = f"🔍 Scanning {url}..."
-    
-    # Step 1: Scan website
-    scan_data = scan_website(url)
-    
-    if "error" in scan_data:
-        return (f"❌ Error: {scan_data['error']}", None, None, None, None, None, None, None, None, None, None)
-    
-    # Step 2: Get page content for additional checks
-    try:
-        response = requests.get(url, timeout=10, headers={"User-Agent": "AI-Site-Auditor"})
-        soup = BeautifulSoup(response.text, 'html.parser')
-    except:
-        return ("❌ Failed to fetch page content", None, None, None, None, None, None, None, None, None, None)
-    
-    # Step 3: Run all checks
-    accessibility_data = check_accessibility(soup, url)
-    mobile_data = check_mobile_responsiveness(soup, scan_data.get('page_size_mb', 0))
-    
-    if check_links:
-        link_data = check_broken_links(url, soup, max_links=50)
-    else:
-        link_data = {'total_links_checked': 0, 'working_links': 0, 'broken_links_count': 0, 
-                     'broken_links_details': [], 'link_health': 'Skipped'}
-    
-    # Step 4: Calculate scores
-    overall_score = calculate_score(scan_data)
-    scan_data["overall_score"] = overall_score
-    scan_data["seo_score"] = max(0, 100 - scan_data.get("images_without_alt", 0) * 5)
-    scan_data["performance_score"] = max(0, 100 - scan_data.get("load_time", 5) * 10)
-    scan_data["security_score"] = 100 if scan_data.get("https") else 50
-    
-    # Step 5: AI Analysis
-    ai_report = analyze_with_ai(scan_data)
-    
-    # Step 6: Save to history
-    save_audit(url, scan_data, ai_report, accessibility_data, mobile_data, link_data)
-    
-    # Step 7: Create visualizations
-    scores_dict = {
-        'SEO': scan_data["seo_score"],
-        'Performance': scan_data["performance_score"],
-        'Accessibility': accessibility_data['accessibility_score'],
-        'Security': scan_data["security_score"],
-        'Mobile': mobile_data['mobile_score']
-    }
-    
-    gauge_overall = create_gauge_chart(overall_score, "Overall Score")
-    radar_chart = create_radar_chart(scores_dict)
-    metrics_chart = create_metrics_bar_chart(scan_data)
-    trend_chart = create_trend_chart(url)
-    
-    # Step 8: Format results
+# Audit outputs, in the order of the Gradio output components
+OUTPUT_NAMES = ('summary', 'ai_issues', 'ai_suggestions', 'accessibility', 'mobile', 'broken_links',
+                'gauge', 'radar', 'metrics', 'trend', 'pdf')
+
+# Audit results the history entry and PDF are built from, and the output showing each
+AUDIT_PARTS = ('scan_data', 'accessibility_data', 'mobile_data', 'link_data', 'ai_report')
+OUTPUT_OF_STAGE = {'scan_data': 'metrics', 'accessibility_data': 'accessibility', 'mobile_data': 'mobile',
+                   'link_data': 'broken_links', 'ai_report': 'ai_issues', 'mobile': 'mobile'}
+
+TIMING_LABELS = (('dns', 'DNS'), ('connect', 'Connect'), ('tls', 'TLS'), ('ttfb', 'TTFB'),
+                 ('download', 'Download'), ('parse', 'Parse'))
+
+def format_timings(scan_data):
+    """Timing breakdown line for the summary, in ms (with p95 when sampled)"""
+    timings = scan_data.get('timings')
+    if not timings:
+        return ""
+    p95 = scan_data.get('timings_p95', {})
+    parts = []
+    for key, label in TIMING_LABELS:
+        part = f"{label} {timings.get(key, 0) * 1000:.0f} ms"
+        if key in p95:
+            part += f" (p95 {p95[key] * 1000:.0f})"
+        parts.append(part)
+    return "\n- **Timing:** " + " · ".join(parts)
+
+def format_page_weight(resource_data):
+    """Page weight section: totals per resource type, third-party share and largest resources"""
+    if not resource_data:
+        return "\n## 📦 Page Weight\n- ⏳ Sizing resources...\n"
+    mb = 1024 * 1024
+    # Bodies cut off at the stream limit make the totals lower bounds
+    at_least = "at least " if resource_data.get('capped_count') else ""
+    lines = [f"\n## 📦 Page Weight\n- **Total:** {at_least}{resource_data['total_bytes'] / mb:.2f} MB "
+             f"({resource_data['resource_count']} resources)"]
+    for kind, entry in resource_data['by_type'].items():
+        if entry['count']:
+            label = 'HTML' if kind == 'html' else kind.title()
+            lines.append(f"- **{label}:** {entry['bytes'] / mb:.2f} MB ({entry['count']})")
+    lines.append(f"- **Third-party:** {resource_data['third_party_bytes'] / mb:.2f} MB")
+    for resource in resource_data['largest_resources'][:3]:
+        lines.append(f"- 🔺 `{resource['url'][:80]}` - {'≥' if resource.get('capped') else ''}"
+                     f"{resource['bytes'] / 1024:.0f} KB")
+    if resource_data['unchecked_count'] or resource_data['unsized_count']:
+        lines.append(f"- **Not sized:** {resource_data['unchecked_count'] + resource_data['unsized_count']}")
+    return "\n".join(lines) + "\n"
+
+def format_css(css_data):
+    """CSS section: stylesheets read, media queries, font-size units and unused selectors"""
+    if not css_data:
+        return "\n## 🎨 CSS\n- ⏳ Analyzing stylesheets...\n"
+    units = ", ".join(f"{unit} ({count})" for unit, count in
+                      sorted(css_data['font_sizes'].items(), key=lambda item: item[1], reverse=True))
+    lines = [f"\n## 🎨 CSS\n- **Stylesheets:** {css_data['stylesheets_loaded']}/{css_data['stylesheets']} loaded, "
+             f"{css_data['inline_blocks']} inline ({css_data['css_bytes'] / 1024:.0f} KB, {css_data['rules']} rules)",
+             f"- **Media Queries:** {css_data['media_query_count']}"
+             f"{' (responsive)' if css_data['responsive'] else ''}",
+             f"- **Font Sizes:** {units or 'none set'}",
+             f"- **Unused Selectors:** {css_data['unused_selector_count']}/{css_data['selector_count']}"]
+    if css_data['failed_count'] or css_data['unchecked_count']:
+        lines.append(f"- **Not loaded:** {css_data['failed_count'] + css_data['unchecked_count']}")
+    return "\n".join(lines) + "\n"
+
+def format_summary(url, scan_data, accessibility_data=None, mobile_data=None, link_data=None, ai_report=None,
+                   resource_data=None, css_data=None):
+    """Audit summary markdown; sections whose results are not ready yet show as pending"""
+    pending = "⏳ Pending..."
+    accessibility_score = f"{accessibility_data['accessibility_score']}/100" if accessibility_data else pending
+    mobile_score = f"{mobile_data['mobile_score']}/100" if mobile_data else pending
+
     summary = f"""
 # 🎯 Audit Summary for {url}
 
 ## 📊 Scores
-- **Overall Score:** {overall_score}/100
+- **Overall Score:** {scan_data['overall_score']}/100
 - **SEO Score:** {scan_data['seo_score']}/100
 - **Performance Score:** {scan_data['performance_score']}/100
-- **Accessibility Score:** {accessibility_data['accessibility_score']}/100
+- **Accessibility Score:** {accessibility_score}
 - **Security Score:** {scan_data['security_score']}/100
-- **Mobile Score:** {mobile_data['mobile_score']}/100
+- **Mobile Score:** {mobile_score}
 
 ## 🔧 Technical Metrics
-- **Load Time:** {scan_data.get('load_time', 0)}s
-- **Page Size:** {scan_data.get('page_size_mb', 0):.2f} MB
+- **Load Time:** {scan_data.get('load_time', 0)}s{format_timings(scan_data)}
+- **Page Size:** {scan_data.get('page_size_mb', 0):.2f} MB{' (truncated at the size limit)' if scan_data.get('truncated') else ''}
 - **HTTPS:** {'✅ Yes' if scan_data.get('https') else '❌ No'}
 - **Status Code:** {scan_data.get('status_code', 'N/A')}
-
+"""
+    summary += format_page_weight(resource_data)
+    summary += format_css(css_data)
+    if link_data:
+        summary += f"""
 ## 🔗 Link Health
 - **Total Links Checked:** {link_data['total_links_checked']}
 - **Working Links:** {link_data['working_links']}
 - **Broken Links:** {link_data['broken_links_count']}
+- **Unchecked (time budget):** {link_data.get('unchecked_links_count', 0)}
+- **Cached Results:** {link_data.get('cache_hits', 0)} hits / {link_data.get('cache_misses', 0)} misses
 - **Health Status:** {link_data['link_health']}
+"""
+    else:
+        summary += f"\n## 🔗 Link Health\n- {pending}\n"
+
+    if ai_report:
+        summary += f"""
+## 🤖 AI Analysis
+- **Report Source:** {'⚠️ Heuristic fallback' if ai_report.get('fallback') else '♻️ Cached' if ai_report.get('cache_status') == 'hit' else '✨ Fresh'}
+"""
+    else:
+        summary += f"\n## 🤖 AI Analysis\n- {pending}\n"
 
+    summary += f"""
 ## 📱 Mobile Friendliness
-- **Status:** {mobile_data['mobile_friendly']}
+- **Status:** {mobile_data['mobile_friendly'] if mobile_data else pending}
 
 ## ♿ Accessibility
-- **WCAG Compliance:** {accessibility_data['wcag_compliance']}
+- **WCAG Compliance:** {accessibility_data['wcag_compliance'] if accessibility_data else pending}
 """
-    
-    # Format AI Issues
+    return summary
+
+def format_ai_issues(ai_report):
+    """AI issues markdown"""
     ai_issues_text = "## ⚠️ AI Detected Issues\n\n"
     for issue in ai_report.get('issues', [])[:10]:
         ai_issues_text += f"- {issue}\n"
-    
-    # Format AI Suggestions
+    return ai_issues_text
+
+def format_ai_suggestions(ai_report):
+    """AI suggestions markdown"""
     ai_suggestions_text = "## ✅ AI Recommendations\n\n"
     for suggestion in ai_report.get('suggestions', [])[:10]:
         ai_suggestions_text += f"- {suggestion}\n"
-    
-    # Format Accessibility Issues
+    return ai_suggestions_text
+
+def format_accessibility(accessibility_data):
+    """Accessibility issues markdown"""
     accessibility_text = "## ♿ Accessibility Issues\n\n"
     for issue in accessibility_data.get('accessibility_issues', []):
         accessibility_text += f"{issue}\n\n"
-    
-    # Format Mobile Issues
+    return accessibility_text
+
+def format_mobile(mobile_data):
+    """Mobile issues markdown"""
     mobile_text = "## 📱 Mobile Issues\n\n"
     for issue in mobile_data.get('mobile_issues', []):
         mobile_text += f"{issue}\n\n"
-    
-    # Format Broken Links
+    return mobile_text
+
+def format_broken_links(link_data):
+    """Broken links markdown"""
     broken_links_text = "## 🔗 Broken Links Details\n\n"
     if link_data['broken_links_details']:
         for broken in link_data['broken_links_details']:
@@ -217,26 +250,122 @@ def audit_website(url, check_links=True):
             broken_links_text += f"  **Status:** {broken['status']}\n\n"
     else:
         broken_links_text += "✅ No broken links detected!\n"
+    return broken_links_text
+
+def _stage_job(stages):
+    # Job function running the UI's stage graph and publishing each finished stage
+    def run(job):
+        for event in iter_stages(stages, cancel_event=job.cancel_event):
+            job.publish(*event)
+    return run
+
+def audit_website(url, check_links=True):
+    """
+    Main audit function
+    Runs the audit as a stage graph and yields all outputs as each stage finishes:
+    the scan results show as soon as the page is fetched, while the checks, links,
+    AI analysis, history and PDF run in parallel and fill in as they complete
+    """
+    if not url or not is_valid_url(url):
+        yield ("❌ Invalid URL", None, None, None, None, None, None, None, None, None, None)
+        return
     
-    # Generate PDF
+    url = normalize_url(url)
+    view = dict.fromkeys(OUTPUT_NAMES)
+    view['summary'] = f"🔍 Scanning {url}..."
+    yield tuple(view[name] for name in OUTPUT_NAMES)
+    
+    # Fetch once, then scan, checks, links, resource sizing, CSS and AI in parallel; history and PDF once all are done
+    stages = audit_stages(url, check_links, use_ai=True) + [
+        Stage('saved', lambda **data: save_audit(url, **data), AUDIT_PARTS),
+        Stage('trend', lambda saved: create_trend_chart(url), ['saved']),
+        Stage('pdf', lambda **data: generate_pdf_report(url, **data), AUDIT_PARTS, fallback=lambda **data: None),
+    ]
+    
+    # Audits run on the shared job service's workers, so bursts queue up instead of
+    # running unbounded concurrent fetches and AI calls
     try:
-        pdf_path = generate_pdf_report(url, scan_data, ai_report, accessibility_data, mobile_data, link_data)
-    except:
-        pdf_path = None
-    
-    return (
-        summary,
-        ai_issues_text,
-        ai_suggestions_text,
-        accessibility_text,
-        mobile_text,
-        broken_links_text,
-        gauge_overall,
-        radar_chart,
-        metrics_chart,
-        trend_chart if trend_chart else None,
-        pdf_path
-    )
+        job = get_job_service().submit(_stage_job(stages), url, priority='high', stream=True)
+    except QueueFull:
+        yield ("❌ Too many audits in progress - please try again in a minute",
+               None, None, None, None, None, None, None, None, None, None)
+        return
+    
+    data = {}
+    report = {}
+    spans = {}
+    for event in job.stream(poll=1.0):
+        if event is None:
+            if job.status == 'queued':
+                view['summary'] = f"⏳ Waiting for a free audit slot for {url}..."
+                yield tuple(view[name] for name in OUTPUT_NAMES)
+            continue
+        name, status, value, elapsed = event
+        report[name] = {'status': status, 'elapsed': elapsed}
+        if name in ('document', 'scan') and status != 'ok':
+            error = "Unable to fetch URL" if name == 'document' else value
+            record_audit(stage_spans(report, data.get('document'), idle=idle_stages(check_links, True)),
+                         report, 'error')
+            yield (f"❌ Error: {error}", None, None, None, None, None, None, None, None, None, None)
+            return
+        # Stages that failed without a fallback show as a failed check, or render nothing
+        failed = isinstance(value, BaseException) or (value is None and status != 'ok')
+        if failed or (status in ('error', 'skipped') and name in AUDIT_PARTS):
+            output = OUTPUT_OF_STAGE.get(name)
+            if output and not (status == 'skipped' and str(view[output]).startswith("❌")):
+                view[output] = f"❌ Check failed: {value or status}"
+            continue
+        data[name] = value
+        
+        if name == 'scan':
+            with span('charts', spans):
+                view.update(
+                    ai_issues="## ⚠️ AI Detected Issues\n\n⏳ Analyzing...",
+                    ai_suggestions="## ✅ AI Recommendations\n\n⏳ Analyzing...",
+                    gauge=create_gauge_chart(value["overall_score"], "Overall Score"),
+                    metrics=create_metrics_bar_chart(value)
+                )
+            if 'link_data' not in data:
+                view['broken_links'] = "## 🔗 Broken Links Details\n\n⏳ Checking links..."
+        elif name == 'scan_data':
+            # Scores again, now with the full page weight
+            with span('charts', spans):
+                view['gauge'] = create_gauge_chart(value["overall_score"], "Overall Score")
+        elif name == 'accessibility_data':
+            view['accessibility'] = format_accessibility(value)
+        elif name in ('mobile', 'mobile_data'):
+            view['mobile'] = format_mobile(value)
+        elif name == 'link_data':
+            view['broken_links'] = format_broken_links(value)
+        elif name == 'ai_report':
+            view.update(ai_issues=format_ai_issues(value), ai_suggestions=format_ai_suggestions(value))
+        elif name in ('trend', 'pdf'):
+            view[name] = value
+        elif name not in ('resource_data', 'css_data'):
+            continue
+        
+        if 'scan' in data:
+            scan_data = data.get('scan_data') or data['scan']
+            accessibility_data = data.get('accessibility_data')
+            mobile_data = data.get('mobile_data')
+            view['summary'] = format_summary(url, scan_data, accessibility_data, mobile_data or data.get('mobile'),
+                                             data.get('link_data'), data.get('ai_report'), data.get('resource_data'),
+                                             data.get('css_data'))
+            if 'scan_data' in data and accessibility_data and mobile_data and view['radar'] is None:
+                with span('charts', spans):
+                    view['radar'] = create_radar_chart({
+                        'SEO': scan_data["seo_score"],
+                        'Performance': scan_data["performance_score"],
+                        'Accessibility': accessibility_data['accessibility_score'],
+                        'Security': scan_data["security_score"],
+                        'Mobile': mobile_data['mobile_score']
+                    })
+        yield tuple(view[name] for name in OUTPUT_NAMES)
+    
+    # The trend stage's time adds to the charts drawn above
+    add_span('charts', report.get('trend', {}).get('elapsed', 0), spans)
+    record_audit(stage_spans(report, data.get('document'), spans, idle_stages(check_links, True)), report,
+                 'ok' if job.status == 'done' else job.status)
 
 # Create Gradio Interface
 with gr.Blocks(title="AuditAI - Agentic Website Auditor", theme=gr.themes.Soft()) as demo:
@@ -316,4 +445,9 @@ with gr.Blocks(title="AuditAI - Agentic Website Auditor", theme=gr.themes.Soft()
     """)
 
 if __name__ == "__main__":
-    demo.launch(share=True)
+    # Queueing lets the audit generator stream partial results
+    serve_metrics()
+    # With AUDITAI_JOB_PORT set, batch tools submit to the UI's own job queue
+    # (batch_audit.py --service), so both share one bound
+    serve_jobs()
+    demo.queue().launch(share=True)
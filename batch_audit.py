@@ -0,0 +1,193 @@
+"""
+Headless bulk auditor
+
+Reads URLs (one per line) from a file or stdin and streams one JSON line per URL
+to the output file as each audit finishes. Network I/O runs on a thread pool,
+parsing and checks on a process pool. URLs that already have an ok result in the
+output file are skipped, so an interrupted run can simply be restarted and URLs
+that failed are retried. With --service, the audits are
+submitted to a job service's HTTP API instead (see job_service.py), which pushes
+back when its queue is full. With AUDITAI_JOB_PORT set, the Gradio app serves
+its own queue there, so batch audits sent to it wait behind the UI's; a
+standalone `python job_service.py` has a separate queue.
+
+    python batch_audit.py urls.txt -o results.jsonl
+    cat urls.txt | python batch_audit.py - -o results.jsonl --workers 32 --processes 8
+    python batch_audit.py urls.txt --service http://127.0.0.1:8700 --workers 8
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pipeline import run_audit
+from metrics import serve_metrics, write_metrics
+from job_service import JobClient
+from utils import normalize_url, is_valid_url
+
+def read_urls(source):
+    """Yields normalized URLs from an open file, skipping blanks and # comments"""
+    for line in source:
+        url = line.strip()
+        if not url or url.startswith("#"):
+            continue
+        yield normalize_url(url)
+
+def completed_urls(output_path):
+    """URLs that already have an ok result line in the output file (failed ones are retried)"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, 'r') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                if record.get('status') == 'ok':
+                    done.add(record['url'])
+            except (ValueError, KeyError, AttributeError):
+                continue
+    return done
+
+def service_audit(client, url, priority='low', **options):
+    """Runs one audit on a job service; waits out 429s and returns the audit result"""
+    job = client.result(client.submit(url, priority, **options)['id'])
+    if job.get('status') == 'done':
+        return job['result']
+    return dict(job.get('result') or {}, url=url, error=job.get('error') or f"Job {job.get('status')}")
+
+def audit_record(url, check_links, use_ai, executor, incremental=False, client=None, priority='low'):
+    """Runs one audit (on the job service, if a client is given) and flattens it into a JSON-serializable result line"""
+    start = time.time()
+    if not is_valid_url(url):
+        return {'url': url, 'status': 'error', 'error': "Invalid URL", 'elapsed': 0}
+    try:
+        if client is not None:
+            result = service_audit(client, url, priority, check_links=check_links, use_ai=use_ai,
+                                   incremental=incremental)
+        else:
+            result = run_audit(url, check_links=check_links, use_ai=use_ai, executor=executor,
+                               incremental=incremental)
+    except Exception as e:
+        result = {'url': url, 'error': f"{type(e).__name__}: {e}"}
+
+    record = {'url': url, 'status': 'error' if 'error' in result else 'ok'}
+    record.update(result)
+    record['elapsed'] = round(time.time() - start, 2)
+    if record['status'] == 'ok':
+        record['overall_score'] = result['scan_data'].get('overall_score', 0)
+    return record
+
+def run_batch(urls, output_path, workers=16, processes=None, check_links=True, use_ai=False,
+              resume=True, progress=None, incremental=False, service=None, priority='low'):
+    """
+    Audits URLs concurrently and appends one JSON line per URL to output_path
+    Keeps at most 2 * workers audits in flight, so memory stays flat for any batch size
+    With incremental, pages unchanged since their last audit reuse its results
+    With service (a job service base URL), the audits run there at the given priority
+    Returns summary dict with counts, elapsed time and throughput
+    """
+    done = completed_urls(output_path) if resume else set()
+    summary = {'audited': 0, 'ok': 0, 'errors': 0, 'skipped': 0, 'unchanged': 0}
+    start = time.time()
+    max_in_flight = workers * 2
+
+    client = JobClient(service) if service else None
+    process_pool = ProcessPoolExecutor(max_workers=processes) if processes != 0 and not client else None
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as thread_pool, open(output_path, 'a') as out:
+            in_flight = set()
+
+            def drain(return_when):
+                nonlocal in_flight
+                finished, in_flight = wait(in_flight, return_when=return_when)
+                for future in finished:
+                    record = future.result()
+                    out.write(json.dumps(record, default=str) + "\n")
+                    out.flush()
+                    summary['audited'] += 1
+                    summary['ok' if record['status'] == 'ok' else 'errors'] += 1
+                    summary['unchanged'] += bool(record.get('unchanged'))
+                    if progress:
+                        progress(record, summary)
+
+            for url in urls:
+                if url in done:
+                    summary['skipped'] += 1
+                    continue
+                done.add(url)
+                if len(in_flight) >= max_in_flight:
+                    drain(FIRST_COMPLETED)
+                in_flight.add(thread_pool.submit(audit_record, url, check_links, use_ai, process_pool,
+                                                 incremental, client, priority))
+
+            while in_flight:
+                drain(FIRST_COMPLETED)
+    finally:
+        if process_pool is not None:
+            process_pool.shutdown()
+
+    elapsed = time.time() - start
+    summary['elapsed'] = round(elapsed, 2)
+    summary['urls_per_second'] = round(summary['audited'] / elapsed, 2) if elapsed > 0 else 0
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Audit many URLs headlessly, streaming JSON lines")
+    parser.add_argument("input", help="File with one URL per line, or - for stdin")
+    parser.add_argument("-o", "--output", default="audit_results.jsonl", help="JSONL output file (appended)")
+    parser.add_argument("--workers", type=int, default=16, help="Concurrent audits (network threads)")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="Parser processes (default: CPU count, 0 = parse in the worker threads)")
+    parser.add_argument("--no-links", action="store_true", help="Skip broken link checking")
+    parser.add_argument("--ai", action="store_true", help="Also run the Gemini analysis for each URL")
+    parser.add_argument("--ai-backend", choices=("gemini", "stub"), default=None,
+                        help="AI backend (default: AUDITAI_AI_BACKEND); stub answers locally")
+    parser.add_argument("--no-resume", action="store_true", help="Re-audit URLs that already have an ok result in the output file")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Fetch conditionally and reuse the last results for unchanged pages")
+    parser.add_argument("--service", help="Submit the audits to the job service at this URL "
+                                          "(e.g. http://127.0.0.1:8700) instead of running them here")
+    parser.add_argument("--priority", choices=("high", "normal", "low"), default="low",
+                        help="Job priority on the service (default: low, so interactive audits go first)")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve Prometheus metrics on this port while running (default: AUDITAI_METRICS_PORT)")
+    parser.add_argument("--metrics-file", help="Write Prometheus metrics to this file when done")
+    args = parser.parse_args()
+
+    serve_metrics(args.metrics_port)
+
+    def progress(record, summary):
+        status = record.get('overall_score', record.get('error'))
+        print(f"[{summary['audited']}] {record['url']} -> {status} ({record['elapsed']}s)", file=sys.stderr)
+
+    if args.ai and args.ai_backend:
+        from ai_scheduler import configure_ai_scheduler
+        configure_ai_scheduler(backend=args.ai_backend)
+
+    source = sys.stdin if args.input == "-" else open(args.input, 'r')
+    try:
+        summary = run_batch(
+            read_urls(source), args.output,
+            workers=args.workers,
+            processes=args.processes,
+            check_links=not args.no_links,
+            use_ai=args.ai,
+            resume=not args.no_resume,
+            progress=progress,
+            incremental=args.incremental,
+            service=args.service,
+            priority=args.priority
+        )
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+    print(f"\n✅ Audited {summary['audited']} URLs ({summary['ok']} ok, {summary['errors']} errors, "
+          f"{summary['skipped']} already done, {summary['unchanged']} unchanged) in {summary['elapsed']}s "
+          f"- {summary['urls_per_second']} URLs/s", file=sys.stderr)
+    if args.metrics_file:
+        write_metrics(args.metrics_file)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Offline AI analysis throughput benchmark
+
+Runs synthetic pages through the AI scheduler with the local stub backend, first
+one request at a time (the old behaviour) and then batched and concurrent.
+
+    python -m benchmarks.ai_throughput
+    python -m benchmarks.ai_throughput --pages 200 --latency 0.5 --rpm 60 --batch-size 8
+"""
+import argparse
+import time
+from ai_backends import StubBackend
+from ai_scheduler import AIScheduler
+
+def synthetic_pages(count):
+    """Scan data for `count` distinct pages"""
+    return [{
+        'url': f"https://example.com/page-{i}",
+        'title': f"Example page {i}",
+        'meta_description': i % 3 != 0,
+        'h1_count': i % 3,
+        'headings_count': {'H1': i % 3, 'H2': 4, 'H3': 2},
+        'images_without_alt': i % 5,
+        'https': i % 4 != 0,
+        'page_size_mb': 0.5
+    } for i in range(count)]
+
+def run(pages, backend, **options):
+    """Analyzes every page; returns (elapsed seconds, scheduler stats)"""
+    scheduler = AIScheduler(backend=backend, **options)
+    start = time.perf_counter()
+    try:
+        reports = scheduler.analyze_many(pages, use_cache=False)
+    finally:
+        scheduler.close()
+    assert len(reports) == len(pages)
+    return time.perf_counter() - start, scheduler.stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline AI analysis throughput benchmark")
+    parser.add_argument("--pages", type=int, default=40, help="Synthetic pages to analyze")
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub latency per request in seconds")
+    parser.add_argument("--rpm", type=int, default=0, help="Requests per minute limit (0 = unlimited)")
+    parser.add_argument("--tpm", type=int, default=0, help="Tokens per minute limit (0 = unlimited)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight")
+    parser.add_argument("--batch-size", type=int, default=4, help="Pages per request")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    args = parser.parse_args()
+
+    pages = synthetic_pages(args.pages)
+    backend = StubBackend(latency=args.latency)
+    runs = [
+        ("sequential", dict(concurrency=1, batch_size=1)),
+        ("scheduled", dict(concurrency=args.concurrency, batch_size=args.batch_size)),
+    ]
+    for label, options in runs:
+        elapsed, stats = run(pages, backend, rpm=args.rpm, tpm=args.tpm, timeout=args.timeout, **options)
+        print(f"{label:<11} {elapsed:7.2f}s  {len(pages) / elapsed:7.1f} pages/s  "
+              f"{stats['requests']} requests, {stats['timeouts']} timeouts, {stats['errors']} errors")
+
+if __name__ == "__main__":
+    main()
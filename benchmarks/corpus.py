@@ -0,0 +1,84 @@
+"""
+Synthetic page corpus for the benchmark suite
+
+Pages are deterministic for a given seed, so runs on different machines or
+commits audit exactly the same HTML. Link targets use the paths served by
+benchmarks.server: /ok/, /slow/, /broken/ and /redirect/.
+"""
+import random
+
+# Page sizes of the default corpus, in KB (10 KB to 10 MB)
+SIZES_KB = (10, 100, 1024, 10240)
+
+# Share of generated links pointing at each kind of target
+LINK_MIX = {'ok': 0.7, 'slow': 0.1, 'broken': 0.1, 'redirect': 0.1}
+
+_WORDS = ("audit performance page website content search mobile layout image link "
+          "accessible semantic heading section article navigation render network "
+          "cache script style metric report score visitor browser server").split()
+
+def _sentence(rng, words=12):
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize() + "."
+
+def _link_kinds(rng, count, link_mix):
+    kinds = []
+    for kind, share in link_mix.items():
+        kinds += [kind] * round(count * share)
+    kinds += ['ok'] * (count - len(kinds))
+    rng.shuffle(kinds)
+    return kinds[:count]
+
+def generate_page(size_kb=100, links=50, images=20, forms=2, inline_styles=10, link_mix=None, seed=0):
+    """
+    Synthetic HTML page of about size_kb KB
+    links, images, forms and inline_styles are exact counts; about a third of the
+    images lack alt text and every other form has an unlabeled input. The rest of
+    the page is filled with paragraphs and headings up to the target size.
+    """
+    rng = random.Random(seed)
+    link_mix = link_mix or LINK_MIX
+    parts = [
+        "<!DOCTYPE html>\n<html lang=\"en\">\n<head>\n<meta charset=\"utf-8\">\n",
+        f"<title>Benchmark page {size_kb} KB</title>\n",
+        "<meta name=\"description\" content=\"Synthetic page for benchmarks\">\n",
+        "<meta name=\"viewport\" content=\"width=device-width, initial-scale=1\">\n",
+        "<style>@media (max-width: 600px) { nav { display: none; } }</style>\n",
+        "</head>\n<body>\n<nav><a href=\"#main\">Skip to content</a></nav>\n<main id=\"main\">\n<h1>Benchmark</h1>\n",
+    ]
+
+    for i, kind in enumerate(_link_kinds(rng, links, link_mix)):
+        parts.append(f"<p><a href=\"/{kind}/{i}\">{_sentence(rng, 3)}</a></p>\n")
+    for i in range(images):
+        alt = "" if i % 3 == 0 else f" alt=\"Image {i}\""
+        parts.append(f"<img src=\"/img/{i}.jpg\"{alt} width=\"320\" height=\"240\">\n")
+    for i in range(forms):
+        if i % 2:
+            parts.append(f"<form action=\"/ok/form{i}\"><input id=\"f{i}\" type=\"text\"><input type=\"submit\"></form>\n")
+        else:
+            parts.append(f"<form action=\"/ok/form{i}\"><label for=\"f{i}\">Field</label>"
+                         f"<input id=\"f{i}\" type=\"text\"><input type=\"submit\"></form>\n")
+    for i in range(inline_styles):
+        parts.append(f"<div style=\"font-size: {10 + i % 8}px; color: #333\">{_sentence(rng, 6)}</div>\n")
+
+    tail = "</main>\n<script src=\"/ok/app.js\"></script>\n</body>\n</html>\n"
+    target = size_kb * 1024 - len(tail)
+    size = sum(len(part) for part in parts)
+    section = 0
+    while size < target:
+        if section % 10 == 0:
+            block = f"<h2>Section {section}</h2>\n"
+        elif section % 10 == 5:
+            block = f"<h3>Subsection {section}</h3>\n"
+        else:
+            block = "<p>" + " ".join(_sentence(rng) for _ in range(5)) + "</p>\n"
+        parts.append(block)
+        size += len(block)
+        section += 1
+
+    parts.append(tail)
+    return "".join(parts)
+
+def generate_corpus(sizes_kb=SIZES_KB, seed=0, **features):
+    """Dict of page name (e.g. 'page_100kb') -> HTML, one page per size"""
+    return {f"page_{size}kb": generate_page(size, seed=seed + i, **features)
+            for i, size in enumerate(sizes_kb)}
@@ -0,0 +1,67 @@
+"""
+Cold-start import benchmark for the headless core
+
+Imports each core module in a fresh interpreter, checks that none of the heavy
+UI/AI dependencies were loaded and that the import fits the time budget.
+
+    python -m benchmarks.import_time                # default 0.5s budget
+    python -m benchmarks.import_time --budget 0.3
+
+Exits with status 1 if a module goes over budget or pulls in a heavy dependency.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Modules the headless audit path must be importable through
+CORE_MODULES = ('scanner', 'scoring', 'pipeline', 'batch_audit', 'crawler', 'history_tracker',
+                'ai_analyzer', 'ai_scheduler', 'report_generator')
+
+# Loaded lazily on first use, never at import time of the core
+HEAVY_MODULES = ('gradio', 'plotly', 'pandas', 'fpdf', 'google.generativeai')
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps({{"elapsed": elapsed, "heavy": heavy}}))
+"""
+
+def measure(module, rounds=3):
+    """Best-of-rounds cold import time and heavy modules loaded, each in a fresh interpreter"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    best = None
+    heavy = []
+    for _ in range(rounds):
+        output = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=root, capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        best = result["elapsed"] if best is None else min(best, result["elapsed"])
+        heavy = result["heavy"]
+    return best, heavy
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start import benchmark for the headless core")
+    parser.add_argument("--budget", type=float, default=0.5, help="Maximum import time per module in seconds")
+    parser.add_argument("--rounds", type=int, default=3, help="Fresh interpreters per module (best is kept)")
+    args = parser.parse_args()
+
+    failures = 0
+    for module in CORE_MODULES:
+        elapsed, heavy = measure(module, args.rounds)
+        ok = elapsed <= args.budget and not heavy
+        failures += not ok
+        note = f" loads {', '.join(heavy)}" if heavy else ""
+        print(f"{'✅' if ok else '❌'} {module:<18} {elapsed * 1000:7.1f} ms{note}")
+
+    print(f"\nBudget: {args.budget * 1000:.0f} ms per module")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+"""
+Parser backend parity check and benchmark
+
+Run from the project root:
+    python -m benchmarks.parser_backends            # parity check + benchmark
+    python -m benchmarks.parser_backends --check    # parity check only
+
+The parity corpus proves scan_website, check_accessibility and
+check_mobile_responsiveness give identical results on every installed backend.
+Exits with status 1 if any backend disagrees with html.parser.
+"""
+import argparse
+import sys
+import time
+from document import PageDocument
+from parsers import available_backends, parse_html, build_index
+from scanner import scan_website
+from accessibility_checker import check_accessibility
+from mobile_checker import check_mobile_responsiveness
+from css_analyzer import inline_css_data
+
+PARITY_URL = "https://shop.example.com/"
+
+# Well-formed pages covering every scanner and checker branch
+PARITY_CORPUS = {
+    "minimal": """<!DOCTYPE html>
+<html><head></head><body><p>Hello</p></body></html>""",
+
+    "good_page": """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>Widgets &amp; Gadgets | Shop</title>
+<meta name="description" content="Buy widgets">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<link rel="stylesheet" href="/css/site.css">
+<style>@media (max-width: 600px) { nav { display: none; } }</style>
+</head>
+<body>
+<a href="#main">Skip to content</a>
+<nav><a href="/">Home</a> <a href="https://shop.example.com/cart">Cart</a></nav>
+<main id="main">
+<h1>Widgets</h1>
+<h2>Featured</h2>
+<h3>New arrivals</h3>
+<p>First paragraph.</p><p>Second paragraph.</p><p>Third paragraph.</p>
+<img src="/w.jpg" alt="A widget" srcset="/w-2x.jpg 2x">
+<form action="/search"><label for="q">Search</label><input id="q" type="search"><input type="submit" value="Go"></form>
+<video src="/demo.mp4"><track kind="captions" src="/demo.vtt"></video>
+<p style="font-size: 1.2rem">Relative type</p>
+</main>
+<script src="/app.js"></script>
+</body>
+</html>""",
+
+    "problem_page": """<!DOCTYPE html>
+<html>
+<head>
+<title>Home</title>
+<meta name="viewport" content="width=1024">
+<style>body { margin: 0; }</style>
+</head>
+<body>
+<h1>One</h1><h1>Two</h1>
+<img src="a.png"><img src="b.png" alt="">
+<a href="http://partner.example.org/">Partner</a>
+<a href="/about">click here</a>
+<a href="mailto:team@example.com">Mail</a>
+<a>No href <span>Read More</span></a>
+<a href="/x" style="font-size: 9px">tiny</a>
+<button style="font-size: 10px">Buy</button>
+<form><input id="email" type="email"><select id="size"><option>S</option></select><input type="hidden" name="t"></form>
+<form><textarea id="note"></textarea><label for="other">Other</label></form>
+<table width="800px"><tr><td>Wide</td></tr></table>
+<embed type="application/x-shockwave-flash" src="old.swf">
+<video src="/v.mp4"></video>
+<script>var html = "<a href='/fake'>";</script>
+<div style="color: red">Inline</div>
+</body>
+</html>""",
+
+    "nested_forms_and_media": """<!DOCTYPE html>
+<html lang="de">
+<head><title>Kontakt</title><meta name="viewport" content="width=device-width"></head>
+<body>
+<nav><a href="#content">Zum Inhalt</a></nav>
+<form id="outer"><div><label for="name">Name</label><input id="name"></div>
+<fieldset><input id="tel" type="tel"><label for="tel">Telefon</label></fieldset>
+<input type="button" value="Senden"></form>
+<video><div><track kind="captions" src="de.vtt"></div></video>
+<picture><img src="p.jpg" sizes="50vw" alt="Bild"></picture>
+<object type="application/x-shockwave-flash" data="x.swf"></object>
+<p>Text</p>
+</body>
+</html>""",
+}
+
+def _document(html, backend):
+    return PageDocument(PARITY_URL, html=html, parser=backend)
+
+def _audit(html, backend):
+    document = _document(html, backend)
+    scan_data = scan_website(PARITY_URL, document)
+    for volatile in ("load_time", "timings"):
+        scan_data.pop(volatile, None)
+    return {
+        "scan": scan_data,
+        "accessibility": check_accessibility(document, PARITY_URL),
+        "mobile": check_mobile_responsiveness(document, scan_data.get("page_size_mb", 0), inline_css_data(document)),
+    }
+
+def check_parity(backends=None):
+    """
+    Compares every backend against html.parser on the parity corpus
+    Returns list of (page, backend, check) mismatches
+    """
+    backends = backends or available_backends()
+    mismatches = []
+    for name, html in PARITY_CORPUS.items():
+        expected = _audit(html, "html.parser")
+        for backend in backends:
+            if backend == "html.parser":
+                continue
+            actual = _audit(html, backend)
+            for check in expected:
+                if actual[check] != expected[check]:
+                    mismatches.append((name, backend, check))
+    return mismatches
+
+def _benchmark_page(target_mb):
+    # Repeat the corpus body until the page reaches the target size
+    body = "".join(html.split("<body>", 1)[1].rsplit("</body>", 1)[0] for html in PARITY_CORPUS.values())
+    repeats = max(1, int(target_mb * 1024 * 1024 / len(body)))
+    return "<!DOCTYPE html><html lang='en'><head><title>Bench</title></head><body>" + body * repeats + "</body></html>"
+
+def benchmark(backends=None, target_mb=2.0, rounds=3):
+    """
+    Times parse + index build for each backend
+    Returns dict of backend -> seconds per MB (best of rounds)
+    """
+    backends = backends or available_backends()
+    html = _benchmark_page(target_mb)
+    size_mb = len(html.encode("utf-8")) / (1024*1024)
+    results = {}
+    for backend in backends:
+        best = None
+        for _ in range(rounds):
+            start = time.perf_counter()
+            build_index(parse_html(html, backend))
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[backend] = best / size_mb
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Parser backend parity check and benchmark")
+    parser.add_argument("--check", action="store_true", help="Only run the parity check")
+    parser.add_argument("--size-mb", type=float, default=2.0, help="Benchmark page size in MB")
+    parser.add_argument("--rounds", type=int, default=3, help="Benchmark rounds per backend")
+    args = parser.parse_args()
+
+    backends = available_backends()
+    print(f"Backends: {', '.join(backends)}")
+
+    mismatches = check_parity(backends)
+    if mismatches:
+        for page, backend, check in mismatches:
+            print(f"❌ {backend} differs from html.parser on '{page}' ({check})")
+    else:
+        print(f"✅ Parity: {len(PARITY_CORPUS)} pages identical on every backend")
+
+    if not args.check:
+        print(f"\nParse + index time per MB ({args.size_mb} MB page, best of {args.rounds}):")
+        for backend, seconds_per_mb in benchmark(backends, args.size_mb, args.rounds).items():
+            print(f"  {backend:<12} {seconds_per_mb * 1000:8.1f} ms/MB")
+
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+Local HTTP stand-in for benchmarks
+
+Serves corpus pages and simulates the link targets real sites have:
+    /pages/<name>      corpus page (with ETag, so conditional requests get 304)
+    /ok/<id>           200
+    /slow/<id>         200 after slow_delay seconds
+    /broken/<id>       404
+    /redirect/<id>     302 to /ok/<id>
+
+    with BenchServer(corpus) as server:
+        run_audit(server.page_url("page_100kb"))
+"""
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._respond(send_body=True)
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+    def _respond(self, send_body):
+        server = self.server
+        kind, _, name = self.path.lstrip("/").partition("/")
+        headers = {}
+        if kind == "pages" and name in server.pages:
+            body, etag = server.pages[name]
+            if self.headers.get("If-None-Match") == etag:
+                status, body = 304, b""
+            else:
+                status = 200
+            headers = {"Content-Type": "text/html; charset=utf-8", "ETag": etag}
+        elif kind == "slow":
+            time.sleep(server.slow_delay)
+            status, body = 200, b"slow"
+        elif kind == "broken":
+            status, body = 404, b"not found"
+        elif kind == "redirect":
+            status, body = 302, b""
+            headers = {"Location": f"/ok/{name}"}
+        elif kind in ("ok", "img"):
+            status, body = 200, b"ok"
+        else:
+            status, body = 404, b"not found"
+
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body and body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class BenchServer:
+    """Threaded HTTP server on a free local port, running in a background thread"""
+    def __init__(self, pages=None, slow_delay=0.2):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.slow_delay = slow_delay
+        self.httpd.pages = {}
+        for name, html in (pages or {}).items():
+            self.add_page(name, html)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def add_page(self, name, html):
+        body = html.encode("utf-8")
+        self.httpd.pages[name] = (body, '"' + hashlib.sha1(body).hexdigest() + '"')
+
+    def page_url(self, name):
+        return f"{self.base_url}/pages/{name}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
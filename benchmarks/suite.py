@@ -0,0 +1,198 @@
+"""
+Offline benchmark suite
+
+Generates the synthetic corpus (10 KB to 10 MB), serves it from a local HTTP
+stand-in and times parsing, each checker, link checking and the end-to-end
+audit. Reports throughput, p50/p95 latency and peak Python memory (tracemalloc),
+and saves machine-readable results so runs can be compared.
+
+    python -m benchmarks.suite                          # full run
+    python -m benchmarks.suite --quick                  # 10 KB and 100 KB pages only
+    python -m benchmarks.suite --only parse scan --sizes 100 1024
+    python -m benchmarks.suite -o after.json --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from benchmarks.corpus import SIZES_KB, generate_corpus
+from benchmarks.server import BenchServer
+
+BENCHMARKS = ('parse', 'scan', 'accessibility', 'mobile', 'links', 'end_to_end')
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(samples)
+    rank = max(1, round(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+def _parsed(url, html):
+    from document import PageDocument
+    document = PageDocument(url, html=html)
+    document.index
+    return document
+
+def _cases(name, html, server):
+    """Zero-argument callables per benchmark for one corpus page; setup is done here"""
+    from document import PageDocument
+    from scanner import scan_website
+    from accessibility_checker import check_accessibility
+    from mobile_checker import check_mobile_responsiveness
+    from css_analyzer import inline_css_data
+    from link_checker import check_link_urls, get_link_cache
+    from resource_analyzer import get_resource_cache
+    from css_analyzer import get_css_cache
+    from pipeline import run_audit, page_hrefs
+
+    url = server.page_url(name)
+    document = _parsed(url, html)
+    hrefs = page_hrefs(document)
+
+    def end_to_end():
+        # Every run measures a cold audit, not cache hits from the previous one
+        for cache in (get_link_cache(), get_resource_cache(), get_css_cache()):
+            cache.clear()
+        result = run_audit(url)
+        if 'error' in result:
+            raise RuntimeError(result['error'])
+
+    return {
+        'parse': lambda: PageDocument(url, html=html).index,
+        'scan': lambda: scan_website(url, document),
+        'accessibility': lambda: check_accessibility(document, url),
+        'mobile': lambda: check_mobile_responsiveness(document, document.page_size_mb, inline_css_data(document)),
+        'links': lambda: check_link_urls(url, hrefs, use_cache=False),
+        'end_to_end': end_to_end,
+    }
+
+def measure(func, rounds=5, warmup=1):
+    """
+    Runs func warmup + rounds times, then once more under tracemalloc
+    Returns dict with p50/p95/mean latency in ms, runs per second and peak MB
+    """
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    mean = statistics.mean(samples)
+    return {
+        'rounds': rounds,
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'mean_ms': round(mean * 1000, 3),
+        'per_second': round(1 / mean, 2) if mean > 0 else None,
+        'peak_mb': round(peak / (1024 * 1024), 2),
+    }
+
+def run_suite(sizes_kb=SIZES_KB, only=None, rounds=5, slow_delay=0.2, progress=None, **features):
+    """
+    Runs the selected benchmarks on every corpus page
+    Returns list of result dicts (benchmark, page, size_kb, latency/throughput/memory)
+    """
+    import link_checker
+    import resource_analyzer
+    import css_analyzer
+    import page_cache
+    from parsers import get_parser_backend
+
+    # Keep the link-status, resource, stylesheet and page caches away from the real ones
+    cache_dir = tempfile.mkdtemp(prefix="auditai_bench_")
+    link_checker.LINK_CACHE_PATH = os.path.join(cache_dir, "links.db")
+    resource_analyzer.RESOURCE_CACHE_PATH = os.path.join(cache_dir, "resources.db")
+    css_analyzer.CSS_CACHE_PATH = os.path.join(cache_dir, "css.db")
+    page_cache.PAGE_CACHE_PATH = os.path.join(cache_dir, "pages.db")
+
+    corpus = generate_corpus(sizes_kb, **features)
+    results = []
+    with BenchServer(corpus, slow_delay=slow_delay) as server:
+        for (name, html), size_kb in zip(corpus.items(), sizes_kb):
+            cases = _cases(name, html, server)
+            for benchmark in only or BENCHMARKS:
+                stats = measure(cases[benchmark], rounds)
+                result = {'benchmark': benchmark, 'page': name, 'size_kb': size_kb,
+                          'parser': get_parser_backend(), **stats}
+                if benchmark == 'parse':
+                    result['mb_per_second'] = round(len(html.encode()) / (1024 * 1024) / (stats['mean_ms'] / 1000), 2)
+                results.append(result)
+                if progress:
+                    progress(result)
+    return results
+
+def compare(results, baseline):
+    """Rows of (benchmark, page, baseline p50, current p50, change %) for results in both runs"""
+    before = {(r['benchmark'], r['page']): r for r in baseline}
+    rows = []
+    for result in results:
+        old = before.get((result['benchmark'], result['page']))
+        if old and old['p50_ms']:
+            change = (result['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100
+            rows.append((result['benchmark'], result['page'], old['p50_ms'], result['p50_ms'], round(change, 1)))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark suite for the audit pipeline")
+    parser.add_argument("--sizes", type=int, nargs="+", default=None, help="Page sizes in KB")
+    parser.add_argument("--quick", action="store_true", help="Only the 10 KB and 100 KB pages, 3 rounds")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, help="Benchmarks to run")
+    parser.add_argument("--rounds", type=int, default=None, help="Timed runs per benchmark (default 5)")
+    parser.add_argument("--links", type=int, default=50, help="Links per page")
+    parser.add_argument("--images", type=int, default=20, help="Images per page")
+    parser.add_argument("--forms", type=int, default=2, help="Forms per page")
+    parser.add_argument("--inline-styles", type=int, default=10, help="Elements with inline styles per page")
+    parser.add_argument("--slow-delay", type=float, default=0.2, help="Seconds the /slow/ links take")
+    parser.add_argument("-o", "--output", help="JSON results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="Earlier JSON results to compare p50 latency against")
+    args = parser.parse_args()
+
+    sizes = args.sizes or ((10, 100) if args.quick else SIZES_KB)
+    rounds = args.rounds or (3 if args.quick else 5)
+
+    def progress(result):
+        print(f"{result['benchmark']:<14} {result['page']:<14} p50 {result['p50_ms']:>10.2f} ms  "
+              f"p95 {result['p95_ms']:>10.2f} ms  {result['per_second']:>9} /s  peak {result['peak_mb']:>8} MB",
+              file=sys.stderr)
+
+    results = run_suite(sizes, args.only, rounds, args.slow_delay, progress,
+                        links=args.links, images=args.images, forms=args.forms,
+                        inline_styles=args.inline_styles)
+
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), "results",
+                                         datetime.now().strftime("%Y%m%d_%H%M%S") + ".json")
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'created': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'rounds': rounds,
+            'results': results
+        }, f, indent=2)
+    print(f"\nResults saved to {output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        print(f"\n{'benchmark':<14} {'page':<14} {'before ms':>10} {'after ms':>10} {'change':>8}")
+        for benchmark, page, old, new, change in compare(results, baseline):
+            print(f"{benchmark:<14} {page:<14} {old:>10.2f} {new:>10.2f} {change:>+7.1f}%")
+
+if __name__ == "__main__":
+    main()
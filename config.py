@@ -0,0 +1,17 @@
+import os
+
+# Load .env once, before any module reads its settings
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+def setting(name, default):
+    """Environment setting cast to the type of its default"""
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    if isinstance(default, bool):
+        return value.lower() in ("1", "true", "yes", "on")
+    return type(default)(value)
@@ -0,0 +1,234 @@
+"""
+Multi-page site crawler
+
+Starts from a seed URL, follows same-origin links found while auditing each page
+and aggregates per-site scores alongside the worst pages. Pages stream through the
+audit pipeline one at a time per worker; only URLs are kept in the frontier, so
+memory stays bounded however large the crawl.
+
+    python crawler.py https://example.com --max-pages 500 --max-depth 3 -o pages.jsonl
+"""
+import argparse
+import heapq
+import json
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from urllib.parse import urljoin, urlsplit
+from urllib.robotparser import RobotFileParser
+import requests
+from http_client import get_session, USER_AGENT
+from pipeline import run_audit
+from metrics import serve_metrics, write_metrics
+from utils import canonicalize_url, normalize_url
+
+# Links to files that are not HTML pages
+SKIP_EXTENSIONS = ('.pdf', '.jpg', '.jpeg', '.png', '.gif', '.svg', '.webp', '.ico', '.css', '.js',
+                   '.zip', '.gz', '.mp3', '.mp4', '.webm', '.avi', '.mov', '.xml', '.json', '.woff', '.woff2')
+
+SCORE_KEYS = ('overall_score', 'seo_score', 'performance_score', 'accessibility_score',
+              'security_score', 'mobile_score')
+
+def load_robots(seed_url, timeout=10):
+    """
+    Fetches robots.txt for the seed's origin
+    Returns a RobotFileParser; a missing robots.txt allows everything
+    """
+    parts = urlsplit(seed_url)
+    robots = RobotFileParser(f"{parts.scheme}://{parts.netloc}/robots.txt")
+    try:
+        response = get_session().get(robots.url, timeout=timeout)
+    except requests.exceptions.RequestException:
+        robots.allow_all = True
+        return robots
+
+    if response.status_code in (401, 403):
+        robots.disallow_all = True
+    elif response.status_code >= 400:
+        robots.allow_all = True
+    else:
+        robots.parse(response.text.splitlines())
+    return robots
+
+def same_origin_links(page_url, hrefs, origin):
+    """Canonical same-origin page URLs linked from a page"""
+    for href in hrefs:
+        if href.startswith(('#', 'mailto:', 'tel:', 'javascript:')):
+            continue
+        full_url = urljoin(page_url, href)
+        if not full_url.startswith(('http://', 'https://')):
+            continue
+        canonical = canonicalize_url(full_url)
+        parts = urlsplit(canonical)
+        if (parts.scheme, parts.netloc) != origin:
+            continue
+        if parts.path.lower().endswith(SKIP_EXTENSIONS):
+            continue
+        yield canonical
+
+class SiteSummary:
+    """Running per-site aggregate: score means, error counts and the worst pages"""
+    def __init__(self, worst_count=10):
+        self.worst_count = worst_count
+        self.pages = 0
+        self.errors = 0
+        self.broken_links = 0
+        self.totals = dict.fromkeys(SCORE_KEYS, 0)
+        self._worst = []  # max-heap on score via negation, holding the lowest scores
+
+    def add(self, result, depth):
+        if 'error' in result:
+            self.errors += 1
+            return
+        self.pages += 1
+        scores = {
+            **{key: result['scan_data'].get(key, 0) for key in SCORE_KEYS},
+            'accessibility_score': result['accessibility_data']['accessibility_score'],
+            'mobile_score': result['mobile_data']['mobile_score'],
+        }
+        for key in SCORE_KEYS:
+            self.totals[key] += scores[key]
+        self.broken_links += result['link_data'].get('broken_links_count', 0)
+
+        entry = (-scores['overall_score'], self.pages, {'url': result['url'], 'depth': depth, **scores})
+        if len(self._worst) < self.worst_count:
+            heapq.heappush(self._worst, entry)
+        else:
+            heapq.heappushpop(self._worst, entry)
+
+    def as_dict(self):
+        return {
+            'pages_audited': self.pages,
+            'pages_failed': self.errors,
+            'broken_links': self.broken_links,
+            'site_scores': {key: round(total / self.pages, 2) if self.pages else 0
+                            for key, total in self.totals.items()},
+            'worst_pages': [page for _, _, page in sorted(self._worst, reverse=True)]
+        }
+
+def crawl_site(seed_url, max_pages=100, max_depth=3, workers=8, check_links=False,
+               respect_robots=True, worst_count=10, on_page=None, executor=None, incremental=False):
+    """
+    Crawls same-origin pages from seed_url and audits each one
+    Deduplicates by canonical URL, honors max_pages, max_depth and robots.txt,
+    and audits up to `workers` pages at a time. on_page(result, depth) is called
+    as each page finishes; CPU-bound analysis runs in executor when given. With
+    incremental, pages unchanged since their last audit reuse its results.
+    Returns dict with seed, per-site scores, worst pages and crawl stats
+    """
+    start = time.time()
+    seed = canonicalize_url(normalize_url(seed_url))
+    seed_parts = urlsplit(seed)
+    origin = (seed_parts.scheme, seed_parts.netloc)
+
+    robots = load_robots(seed) if respect_robots else None
+    crawl_delay = (robots.crawl_delay(USER_AGENT) or 0) if robots else 0
+
+    frontier = deque([(seed, 0)])
+    seen = {seed}
+    queued = 1        # pages queued for auditing (the seed included); only these count toward max_pages
+    blocked = 0
+    summary = SiteSummary(worst_count)
+
+    def enqueue(urls, depth):
+        nonlocal blocked, queued
+        for url in urls:
+            if queued >= max_pages:
+                return
+            if url in seen:
+                continue
+            seen.add(url)
+            if robots and not robots.can_fetch(USER_AGENT, url):
+                blocked += 1
+                continue
+            frontier.append((url, depth))
+            queued += 1
+
+    if robots and not robots.can_fetch(USER_AGENT, seed):
+        frontier.clear()
+        blocked += 1
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = {}
+        while frontier or in_flight:
+            while frontier and len(in_flight) < workers:
+                url, depth = frontier.popleft()
+                if crawl_delay:
+                    time.sleep(crawl_delay)
+                future = pool.submit(run_audit, url, check_links=check_links, use_ai=False, executor=executor,
+                                     include_hrefs=True, incremental=incremental)
+                in_flight[future] = (url, depth)
+
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                url, depth = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {'url': url, 'error': f"{type(e).__name__}: {e}"}
+
+                hrefs = result.pop('hrefs', [])
+                if depth < max_depth:
+                    enqueue(same_origin_links(url, hrefs, origin), depth + 1)
+
+                summary.add(result, depth)
+                if on_page:
+                    on_page(result, depth)
+
+    return {
+        'seed': seed,
+        **summary.as_dict(),
+        'pages_discovered': len(seen),
+        'blocked_by_robots': blocked,
+        'elapsed': round(time.time() - start, 2)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl and audit a site from a seed URL")
+    parser.add_argument("seed", help="Seed URL; only same-origin pages are crawled")
+    parser.add_argument("--max-pages", type=int, default=100, help="Stop after this many pages")
+    parser.add_argument("--max-depth", type=int, default=3, help="Maximum link depth from the seed")
+    parser.add_argument("--workers", type=int, default=8, help="Pages audited concurrently")
+    parser.add_argument("--check-links", action="store_true", help="Also check each page for broken links")
+    parser.add_argument("--ignore-robots", action="store_true", help="Do not honor robots.txt")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Fetch conditionally and reuse the last results for unchanged pages")
+    parser.add_argument("-o", "--output", help="Write one JSON line per page to this file")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve Prometheus metrics on this port while running (default: AUDITAI_METRICS_PORT)")
+    parser.add_argument("--metrics-file", help="Write Prometheus metrics to this file when done")
+    args = parser.parse_args()
+
+    serve_metrics(args.metrics_port)
+
+    out = open(args.output, 'a') if args.output else None
+
+    def on_page(result, depth):
+        if out:
+            out.write(json.dumps({**result, 'depth': depth}, default=str) + "\n")
+            out.flush()
+        status = result['scan_data'].get('overall_score') if 'scan_data' in result else result['error']
+        print(f"[depth {depth}] {result['url']} -> {status}", file=sys.stderr)
+
+    try:
+        site = crawl_site(
+            args.seed,
+            max_pages=args.max_pages,
+            max_depth=args.max_depth,
+            workers=args.workers,
+            check_links=args.check_links,
+            respect_robots=not args.ignore_robots,
+            on_page=on_page,
+            incremental=args.incremental
+        )
+    finally:
+        if out:
+            out.close()
+
+    print(json.dumps(site, indent=2))
+    if args.metrics_file:
+        write_metrics(args.metrics_file)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+import hashlib
+import re
+import sqlite3
+import time
+import requests
+from urllib.parse import urljoin
+from config import setting
+from disk_cache import DiskCache
+from document import as_document, read_body
+from http_client import get_session
+from probe_engine import probe_urls
+from utils import canonicalize_url
+
+# Linked stylesheets are fetched concurrently over the shared session and parsed
+# once into a compact rule summary (media queries, font-size units, selectors)
+CSS_CONCURRENCY = setting("AUDITAI_CSS_CONCURRENCY", 8)
+CSS_PER_HOST = setting("AUDITAI_CSS_PER_HOST", 4)
+CSS_TIMEOUT = setting("AUDITAI_CSS_TIMEOUT", 5.0)
+CSS_TIME_BUDGET = setting("AUDITAI_CSS_TIME_BUDGET", 20.0)
+CSS_MAX_BYTES = setting("AUDITAI_CSS_MAX_KB", 2048) * 1024
+
+# Parsed sheets shared across audits: stylesheet URL -> content hash, and content
+# hash -> parsed sheet, so framework CSS used by many pages is parsed once and a
+# changed sheet under the same URL is picked up after the URL entry expires
+CSS_CACHE_PATH = setting("AUDITAI_CSS_CACHE", "css_cache.db")
+CSS_CACHE_MAX_ENTRIES = setting("AUDITAI_CSS_CACHE_MAX", 20000)
+CSS_URL_TTL = setting("AUDITAI_CSS_CACHE_TTL", 24 * 3600)
+CSS_SHEET_TTL = setting("AUDITAI_CSS_SHEET_TTL", 30 * 24 * 3600)
+FAILED_CSS_TTL = 600
+
+# @import is followed this many levels deep
+IMPORT_DEPTH = 2
+
+RELATIVE_UNITS = ('em', 'rem', '%', 'vw', 'vh', 'vmin', 'vmax', 'ch', 'ex')
+# Font sizes below these are too small to read or tap on a phone
+SMALL_FONT_SIZES = {'px': 11, 'pt': 8}
+
+# At-rules whose block holds ordinary style rules
+_GROUPING_RULES = ('media', 'supports', 'layer', 'container', 'document', 'scope')
+
+_COMMENT = re.compile(r'/\*.*?\*/', re.DOTALL)
+_BLOCK_CHARS = re.compile(r'[{};]')
+_FONT_SIZE = re.compile(r'(?:^|[;{\s])font-size\s*:\s*([^;}]+)', re.IGNORECASE)
+_SIZE_VALUE = re.compile(r'(\d*\.?\d+)\s*(px|rem|em|%|pt|vw|vh|vmin|vmax|ch|ex)', re.IGNORECASE)
+_IMPORT_URL = re.compile(r'@import\s+(?:url\(\s*)?[\'"]?([^\'")\s;]+)', re.IGNORECASE)
+_RESPONSIVE_FEATURE = re.compile(r'width|orientation|aspect-ratio', re.IGNORECASE)
+_FUNCTIONAL_PSEUDO = re.compile(r'(?<!\\)::?[\w-]+\((?:[^()]|\([^()]*\))*\)')
+_PSEUDO = re.compile(r'(?<!\\)::?[\w-]+')
+_ATTRIBUTE = re.compile(r'\[[^\]]*\]')
+_COMPOUND_TOKEN = re.compile(r'([#.])((?:[\w-]|\\.)+)|^([a-zA-Z][\w-]*)')
+
+_css_cache = None
+
+def get_css_cache():
+    """Shared on-disk stylesheet cache, opened on first use"""
+    global _css_cache
+    if _css_cache is None:
+        _css_cache = DiskCache(CSS_CACHE_PATH, max_entries=CSS_CACHE_MAX_ENTRIES)
+    return _css_cache
+
+def _blocks(css):
+    # Top-level (prelude, body) pairs; statements ending in ';' (e.g. @import) have body None
+    depth = 0
+    start = body_start = 0
+    prelude = ''
+    for match in _BLOCK_CHARS.finditer(css):
+        char, pos = match.group(), match.start()
+        if char == '{':
+            if depth == 0:
+                prelude, body_start = css[start:pos], pos + 1
+            depth += 1
+        elif char == '}':
+            if depth == 0:
+                start = pos + 1  # stray closing brace
+                continue
+            depth -= 1
+            if depth == 0:
+                yield prelude.strip(), css[body_start:pos]
+                start = pos + 1
+        elif depth == 0:
+            yield css[start:pos].strip(), None
+            start = pos + 1
+
+def font_size_unit(value):
+    """(unit, number) of a font-size value; unit is 'var' or 'keyword' when it has no length"""
+    value = value.strip().lower()
+    match = _SIZE_VALUE.search(value)
+    if match:
+        return match.group(2).lower(), float(match.group(1))
+    return ('var' if 'var(' in value else 'keyword'), None
+
+def is_small_font_size(unit, number):
+    limit = SMALL_FONT_SIZES.get(unit)
+    return limit is not None and number is not None and number < limit
+
+def declared_font_sizes(declarations):
+    """(unit, number) of every font-size in a declaration block or style attribute"""
+    return [font_size_unit(value) for value in _FONT_SIZE.findall(declarations)]
+
+def selector_tokens(selector):
+    """
+    Tag names, #ids and .classes an element path must have for selector to match;
+    pseudo-classes and attribute selectors are ignored
+    """
+    selector = _ATTRIBUTE.sub(' ', _PSEUDO.sub('', _FUNCTIONAL_PSEUDO.sub('', selector)))
+    tokens = []
+    for compound in re.split(r'\s*[\s>+~]\s*', selector.strip()):
+        for prefix, name, tag in _COMPOUND_TOKEN.findall(compound):
+            if tag:
+                tokens.append(tag.lower())
+            elif name:
+                tokens.append(prefix + name.replace('\\', ''))
+    return tokens
+
+def _is_responsive(media):
+    return bool(_RESPONSIVE_FEATURE.search(media))
+
+def parse_stylesheet(css):
+    """
+    Parses CSS text into a compact rule summary
+    Returns dict with the rule count, media queries, font-size units (and how many
+    are too small), @font-face count, @import URLs and, for selectors that need
+    particular tags, ids or classes, those tokens
+    """
+    sheet = {'rules': 0, 'media_queries': [], 'font_sizes': {}, 'small_font_sizes': 0,
+             'font_faces': 0, 'imports': [], 'selectors': []}
+    _parse_block(_COMMENT.sub('', css), sheet)
+    return sheet
+
+def _parse_block(css, sheet):
+    for prelude, body in _blocks(css):
+        if prelude.startswith('@'):
+            name = prelude[1:].split(None, 1)[0].lower() if len(prelude) > 1 else ''
+            if body is None:
+                if name == 'import':
+                    sheet['imports'] += _IMPORT_URL.findall(prelude)
+            elif name in _GROUPING_RULES:
+                if name == 'media':
+                    sheet['media_queries'].append(' '.join(prelude[6:].split()))
+                _parse_block(body, sheet)
+            elif name == 'font-face':
+                sheet['font_faces'] += 1
+            # @keyframes, @page and the like hold no style rules
+            continue
+        if body is None or not prelude:
+            continue
+
+        sheet['rules'] += 1
+        for unit, number in declared_font_sizes(body):
+            sheet['font_sizes'][unit] = sheet['font_sizes'].get(unit, 0) + 1
+            if is_small_font_size(unit, number):
+                sheet['small_font_sizes'] += 1
+        for selector in prelude.split(','):
+            tokens = selector_tokens(selector)
+            if tokens:
+                sheet['selectors'].append([' '.join(selector.split())[:120], tokens])
+
+def collect_styles(page, url=None):
+    """
+    Styles of a page for analyze_css: linked stylesheet URLs, inline <style> blocks,
+    font sizes set in style attributes, and the tags, ids and classes the page has
+    (to tell unused selectors)
+    Accepts a PageDocument or a BeautifulSoup tree; the result is picklable
+    """
+    document = as_document(page, url)
+    url = url or document.url or ''
+    index = document.index
+
+    links = []
+    seen = set()
+    for link in index.by_attr_value('rel', 'stylesheet', 'link'):
+        href = (link.get('href') or '').strip()
+        full_url = urljoin(url, href) if href else ''
+        if not full_url.startswith(('http://', 'https://')):
+            continue
+        canonical = canonicalize_url(full_url)
+        if canonical not in seen:
+            seen.add(canonical)
+            links.append({'url': full_url, 'media': link.get('media', '')})
+
+    inline = [{'css': style.get_text(), 'media': style.get('media', '')} for style in index.find_all('style')]
+
+    attr_font_sizes = {}
+    small_touch_targets = 0
+    for elem in index.with_attr('style'):
+        small = False
+        for unit, number in declared_font_sizes(elem['style']):
+            attr_font_sizes[unit] = attr_font_sizes.get(unit, 0) + 1
+            small = small or is_small_font_size(unit, number)
+        if small and elem.name in ('a', 'button'):
+            small_touch_targets += 1
+
+    tokens = set(index.tags)
+    tokens.update('#' + value for value in index.values.get('id', ()))
+    tokens.update('.' + value for value in index.values.get('class', ()))
+    return {'links': links, 'inline': inline, 'attr_font_sizes': attr_font_sizes,
+            'small_touch_targets': small_touch_targets, 'tokens': sorted(tokens)}
+
+def _sheet_hash(css_bytes):
+    return hashlib.sha256(css_bytes).hexdigest()
+
+def fetch_stylesheet(sheet_url, timeout=CSS_TIMEOUT):
+    """
+    Downloads one stylesheet (up to AUDITAI_CSS_MAX_KB)
+    Returns dict with status and, when it loaded, the CSS text, its hash and size
+    """
+    try:
+        response = get_session().get(sheet_url, timeout=timeout, stream=True)
+        if response.status_code >= 400:
+            response.close()
+            return {'status': response.status_code}
+        body = read_body(response, max_bytes=CSS_MAX_BYTES)
+    except requests.exceptions.RequestException as e:
+        return {'status': 'Error', 'error': str(e)[:50]}
+    return {'status': response.status_code, 'css': body['text'], 'hash': body['hash'], 'bytes': body['size']}
+
+def _cached(keys, use_cache):
+    if not use_cache or not keys:
+        return {}
+    try:
+        return get_css_cache().get_many(keys)
+    except sqlite3.Error:
+        return {}
+
+def _store(items, use_cache):
+    if not use_cache or not items:
+        return
+    try:
+        get_css_cache().set_many(items)
+    except sqlite3.Error:
+        pass
+
+def _load_sheets(urls, timeout, max_concurrency, per_host_limit, time_budget, use_cache):
+    # {url: {'hash', 'bytes'} or {'status', 'error'}}, {hash: parsed sheet}, unchecked URLs, cache hits
+    url_keys = {'url:' + canonicalize_url(sheet_url): sheet_url for sheet_url in urls}
+    entries = {url_keys[key]: entry for key, entry in _cached(list(url_keys), use_cache).items()}
+    hashes = {entry['hash'] for entry in entries.values() if 'hash' in entry}
+    sheets = {key[6:]: sheet for key, sheet in _cached(['sheet:' + h for h in hashes], use_cache).items()}
+    # A URL entry whose parsed sheet was evicted is fetched again
+    hits = {sheet_url: entry for sheet_url, entry in entries.items()
+            if 'hash' not in entry or entry['hash'] in sheets}
+
+    def load(sheet_url):
+        fetched = fetch_stylesheet(sheet_url, timeout)
+        if 'css' not in fetched:
+            return fetched, None
+        sheet = sheets.get(fetched['hash'])
+        if sheet is None:
+            sheet = _cached(['sheet:' + fetched['hash']], use_cache).get('sheet:' + fetched['hash'])
+        parsed = sheet is None
+        if parsed:
+            sheet = parse_stylesheet(fetched['css'])
+        return {'hash': fetched['hash'], 'bytes': fetched['bytes'], 'status': fetched['status']}, \
+            (sheet, parsed)
+
+    probed = probe_urls([sheet_url for sheet_url in urls if sheet_url not in hits], load,
+                        max_concurrency=max_concurrency, per_host_limit=per_host_limit,
+                        time_budget=time_budget)
+
+    url_items = []
+    sheet_items = []
+    for sheet_url, (entry, loaded) in probed['results'].items():
+        failed = 'hash' not in entry
+        url_items.append(('url:' + canonicalize_url(sheet_url), entry, FAILED_CSS_TTL if failed else CSS_URL_TTL))
+        if loaded:
+            sheet, parsed = loaded
+            sheets[entry['hash']] = sheet
+            if parsed:
+                sheet_items.append(('sheet:' + entry['hash'], sheet, CSS_SHEET_TTL))
+    _store(url_items + sheet_items, use_cache)
+
+    results = dict(hits)
+    results.update((sheet_url, entry) for sheet_url, (entry, _) in probed['results'].items())
+    return results, sheets, probed['unchecked'], len(hits)
+
+def _inline_sheets(inline, use_cache):
+    # Inline <style> blocks go through the parsed-sheet cache too (sites inline the same critical CSS)
+    hashes = [_sheet_hash(block['css'].encode('utf-8')) for block in inline]
+    cached = _cached(sorted({'sheet:' + h for h in hashes}), use_cache)
+    sheets = []
+    new_items = {}
+    for block, digest in zip(inline, hashes):
+        sheet = cached.get('sheet:' + digest) or new_items.get(digest)
+        if sheet is None:
+            sheet = parse_stylesheet(block['css'])
+            new_items[digest] = sheet
+        sheets.append(sheet)
+    _store([('sheet:' + digest, sheet, CSS_SHEET_TTL) for digest, sheet in new_items.items()], use_cache)
+    return sheets
+
+def analyze_css(url, styles, fetch=True, timeout=CSS_TIMEOUT, max_concurrency=CSS_CONCURRENCY,
+                per_host_limit=CSS_PER_HOST, time_budget=CSS_TIME_BUDGET, use_cache=True):
+    """
+    Builds the page's CSS rule index from collect_styles() output
+    Fetches linked stylesheets (and their @imports) concurrently unless fetch is
+    False, reusing parsed sheets from the cache by URL and content hash
+    Returns dict with counts of linked and imported stylesheets (loaded, failed and
+    not fetched), media queries (and whether any is
+    responsive), font-size units across sheets and style attributes, small font
+    and touch target counts, and selectors that match nothing on the page
+    """
+    sheets = _inline_sheets(styles['inline'], use_cache)
+    # media="(max-width: ...)" on <link>/<style> counts; plain media types like "screen" do not
+    media_queries = [entry['media'] for entry in styles['inline'] + styles['links'] if '(' in entry['media']]
+
+    loaded = {}
+    unchecked = []
+    cache_hits = 0
+    sheet_bytes = 0
+    pending = [link['url'] for link in styles['links']]
+    if not fetch:
+        unchecked, pending = pending, []
+    # One budget for the linked sheets and every level of @imports below them
+    deadline = time.monotonic() + time_budget
+    for _ in range(IMPORT_DEPTH + 1):
+        if not pending:
+            break
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            unchecked += pending
+            break
+        results, parsed, missed, hits = _load_sheets(pending, timeout, max_concurrency, per_host_limit,
+                                                     remaining, use_cache)
+        loaded.update(results)
+        unchecked += missed
+        cache_hits += hits
+        pending = []
+        for sheet_url, entry in results.items():
+            if 'hash' not in entry or entry['hash'] not in parsed:
+                continue
+            sheet = parsed[entry['hash']]
+            sheets.append(sheet)
+            sheet_bytes += entry['bytes']
+            for ref in sheet['imports']:
+                import_url = urljoin(sheet_url, ref)
+                if import_url.startswith(('http://', 'https://')) and import_url not in loaded:
+                    pending.append(import_url)
+
+    font_sizes = dict(styles['attr_font_sizes'])
+    selectors = {}
+    for sheet in sheets:
+        media_queries += sheet['media_queries']
+        for unit, count in sheet['font_sizes'].items():
+            font_sizes[unit] = font_sizes.get(unit, 0) + count
+        for selector, tokens in sheet['selectors']:
+            selectors.setdefault(selector, tokens)
+
+    page_tokens = set(styles['tokens'])
+    unused = [selector for selector, tokens in selectors.items()
+              if any(token not in page_tokens for token in tokens)]
+    distinct_media = list(dict.fromkeys(media_queries))
+    return {
+        'stylesheets': len(loaded) + len(unchecked),
+        'stylesheets_loaded': sum('hash' in entry for entry in loaded.values()),
+        'failed_count': sum('hash' not in entry for entry in loaded.values()),
+        'unchecked_count': len(unchecked),
+        'cache_hits': cache_hits,
+        'inline_blocks': len(styles['inline']),
+        'sheets_parsed': len(sheets),
+        'css_bytes': sheet_bytes + sum(len(block['css']) for block in styles['inline']),
+        'rules': sum(sheet['rules'] for sheet in sheets),
+        'media_queries': distinct_media[:20],
+        'media_query_count': len(distinct_media),
+        'responsive': any(_is_responsive(media) for media in distinct_media),
+        'font_sizes': font_sizes,
+        'relative_font_sizes': any(unit in RELATIVE_UNITS for unit in font_sizes),
+        'small_font_sizes': sum(sheet['small_font_sizes'] for sheet in sheets),
+        'small_touch_targets': styles['small_touch_targets'],
+        'font_faces': sum(sheet['font_faces'] for sheet in sheets),
+        'selector_count': len(selectors),
+        'unused_selector_count': len(unused),
+        'unused_selectors': unused[:10]
+    }
+
+def inline_css_data(page, url=None):
+    """CSS index of the page's inline styles only, without fetching or caching anything"""
+    return analyze_css(url, collect_styles(page, url), fetch=False, use_cache=False)
@@ -0,0 +1,111 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+class DiskCache:
+    """
+    On-disk key/value cache backed by SQLite, with a TTL per entry and LRU eviction
+    once max_entries is exceeded. Values are stored as JSON. Each thread gets its own
+    connection and WAL mode lets concurrent audits and processes share one file.
+    """
+    def __init__(self, path, max_entries=10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._init_lock:
+                if not self._initialized:
+                    conn.execute("""CREATE TABLE IF NOT EXISTS cache (
+                        key TEXT PRIMARY KEY,
+                        value TEXT NOT NULL,
+                        expires_at REAL NOT NULL,
+                        last_access REAL NOT NULL)""")
+                    conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_last_access ON cache (last_access)")
+                    self._initialized = True
+        return conn
+
+    def get(self, key):
+        """Cached value for key, or None if missing or expired"""
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        """Returns dict of key -> value for the keys that are cached and fresh"""
+        keys = list(keys)
+        if not keys:
+            return {}
+        conn = self._connect()
+        now = time.time()
+        found = {}
+        # Stay under SQLite's bound-parameter limit
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT key, value FROM cache WHERE key IN ({marks}) AND expires_at > ?",
+                (*chunk, now)
+            ).fetchall()
+            for key, value in rows:
+                found[key] = json.loads(value)
+            if rows:
+                hit_marks = ",".join("?" * len(rows))
+                conn.execute(f"UPDATE cache SET last_access = ? WHERE key IN ({hit_marks})",
+                             (now, *[key for key, _ in rows]))
+        return found
+
+    def set(self, key, value, ttl):
+        """Stores value for ttl seconds"""
+        self.set_many([(key, value, ttl)])
+
+    def set_many(self, items):
+        """Stores (key, value, ttl) tuples in one transaction, then evicts least recently used entries"""
+        items = list(items)
+        if not items:
+            return
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                [(key, json.dumps(value), now + ttl, now) for key, value, ttl in items]
+            )
+            self._evict(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _evict(self, conn):
+        count = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        if count > self.max_entries:
+            # Expired entries go first, then the least recently used
+            conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+            count = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        if count > self.max_entries:
+            conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY last_access LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def delete(self, key):
+        self._connect().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        self._connect().execute("DELETE FROM cache")
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
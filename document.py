@@ -0,0 +1,281 @@
+import codecs
+import hashlib
+import re
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+import statistics
+import time
+from config import setting
+from utils import safe_request
+from http_client import NETWORK_PHASES, response_timings
+from parsers import parse_html, build_index, get_parser_backend, StreamTreeBuilder
+
+# Fetches per audited page; with more than one, timings are the median of fresh-connection samples
+TIMING_SAMPLES = setting("AUDITAI_TIMING_SAMPLES", 1)
+
+# Timed phases of a fetch: network phases, body download and the whole fetch
+FETCH_PHASES = NETWORK_PHASES + ('download', 'fetch')
+
+# Page bodies are read in chunks and cut off at this size, so one huge page
+# cannot exhaust memory; truncated documents are flagged
+MAX_BODY_BYTES = int(setting("AUDITAI_MAX_BODY_MB", 10.0) * 1024 * 1024)
+CHUNK_SIZE = 64 * 1024
+
+_META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+
+class PageDocument:
+    """
+    A fetched page shared by the scanner and every checker of one audit.
+    Carries the HTTP response, raw bytes, headers, timings and parsed tree
+    so a page is downloaded and parsed exactly once per audit.
+    """
+    def __init__(self, url, response=None, soup=None, timings=None, parser=None, html=None, body=None):
+        self.url = url
+        self.response = response
+        self._text = html
+        self._content = None
+        self.encoding = "utf-8"
+        self.truncated = False
+        if body is not None:
+            # Streamed by read_body: the raw bytes were not kept
+            self._text = body['text']
+            self.encoding = body['encoding']
+            self.truncated = body['truncated']
+            self.size = body['size']
+            self._content_hash = body['hash']
+        else:
+            if html is None:
+                self._content = response.content if response is not None else b""
+            self.size = len(self.content)
+            self._content_hash = None
+        self.headers = CaseInsensitiveDict(response.headers if response is not None else {})
+        self.status_code = response.status_code if response is not None else None
+        self.timings = timings or {}
+        self.timing_stats = None
+        self.parser = parser or get_parser_backend()
+        self._tree = soup
+        self._index = None
+
+    @property
+    def text(self):
+        if self._text is not None:
+            return self._text
+        return self.response.text if self._content is not None and self.response is not None else ""
+
+    @property
+    def content(self):
+        """Body bytes; for streamed documents, the decoded text encoded again"""
+        if self._content is not None:
+            return self._content
+        return self.text.encode(self.encoding, errors="replace")
+
+    @property
+    def content_hash(self):
+        """SHA-256 of the body as received (up to the size cap for truncated pages)"""
+        if self._content_hash is None:
+            self._content_hash = hashlib.sha256(self.content).hexdigest()
+        return self._content_hash
+
+    @property
+    def tree(self):
+        """Parsed tree from the configured parser backend, built on first access"""
+        if self._tree is None:
+            start = time.perf_counter()
+            self._tree = parse_html(self.text, self.parser)
+            self.timings["parse"] = time.perf_counter() - start
+        return self._tree
+
+    @property
+    def index(self):
+        """Single-pass tag index shared by the scanner and checkers"""
+        if self._index is None:
+            tree = self.tree
+            start = time.perf_counter()
+            self._index = build_index(tree)
+            self.timings["index"] = time.perf_counter() - start
+        return self._index
+
+    def __getstate__(self):
+        # Ship raw page data only, so documents can cross process boundaries;
+        # the receiving process parses again on first access
+        state = self.__dict__.copy()
+        state["_text"] = self.text
+        state["_content"] = None
+        state["response"] = None
+        state["_tree"] = None
+        state["_index"] = None
+        return state
+
+    @property
+    def not_modified(self):
+        """True if the server answered a conditional request with 304 Not Modified"""
+        return self.status_code == 304
+
+    @property
+    def page_size_mb(self):
+        return self.size / (1024*1024)
+
+    @property
+    def parse_time(self):
+        """Seconds spent parsing and indexing the page so far"""
+        return self.timings.get("parse", 0) + self.timings.get("index", 0)
+
+def _body_encoding(response, head):
+    # Charset from the Content-Type header, else a <meta charset> in the first 4 KB, else UTF-8
+    headers = CaseInsensitiveDict(response.headers)
+    if "charset" in headers.get("Content-Type", "").lower():
+        encoding = get_encoding_from_headers(headers)
+    else:
+        match = _META_CHARSET.search(head)
+        encoding = match.group(1).decode("ascii", "ignore") if match else "utf-8"
+    try:
+        return codecs.lookup(encoding or "utf-8").name
+    except LookupError:
+        return "utf-8"
+
+def read_body(response, max_bytes=None, feed=None):
+    """
+    Reads a streamed response body in chunks, decoding as it goes
+    Stops at max_bytes (default AUDITAI_MAX_BODY_MB) and closes the connection.
+    Decoded chunks are passed to feed(text) when given (e.g. an incremental
+    parser) instead of being kept, so the body is never held in memory whole
+    Returns dict with text (None when fed), size in bytes, SHA-256 hash of
+    the bytes read, encoding and truncated
+    """
+    max_bytes = MAX_BODY_BYTES if max_bytes is None else max_bytes
+    digest = hashlib.sha256()
+    parts = []
+    size = 0
+    truncated = False
+    encoding = decoder = None
+    head = b""  # bytes held back until there are enough to sniff a <meta charset>
+
+    def emit(data, final=False):
+        text = decoder.decode(data, final)
+        if feed:
+            feed(text)
+        else:
+            parts.append(text)
+
+    try:
+        for chunk in response.iter_content(CHUNK_SIZE):
+            if size + len(chunk) > max_bytes:
+                chunk = chunk[:max_bytes - size]
+                truncated = True
+            size += len(chunk)
+            digest.update(chunk)
+            if decoder is None:
+                head += chunk
+                if len(head) < 4096 and not truncated:
+                    continue
+                encoding = _body_encoding(response, head)
+                decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+                chunk, head = head, b""
+            emit(chunk)
+            if truncated:
+                break
+    finally:
+        response.close()
+
+    if decoder is None:
+        encoding = _body_encoding(response, head)
+        decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    emit(head, final=True)
+    return {'text': None if feed else ''.join(parts), 'size': size, 'hash': digest.hexdigest(),
+            'encoding': encoding, 'truncated': truncated}
+
+def _fetch(url, timeout, headers, feed=None):
+    # One timed fetch: (response, body, timings) or (None, None, None)
+    start = time.perf_counter()
+    response = safe_request(url, timeout=timeout, headers=headers, stream=True)
+    if not response:
+        return None, None, None
+    headers_done = time.perf_counter()
+    try:
+        body = read_body(response, feed=feed)
+    except requests.exceptions.RequestException:
+        return None, None, None
+    end = time.perf_counter()
+
+    timings = response_timings(response)
+    if not any(timings.values()):
+        timings['ttfb'] = headers_done - start  # timings unavailable, e.g. another adapter
+    timings.update(download=end - headers_done, fetch=end - start)
+    return response, body, timings
+
+class _TimedFeed:
+    # Feeds decoded chunks to the stream parser, timing only the parsing
+    def __init__(self):
+        self.builder = StreamTreeBuilder()
+        self.elapsed = 0.0
+
+    def __call__(self, text):
+        start = time.perf_counter()
+        self.builder.feed(text)
+        self.elapsed += time.perf_counter() - start
+
+    def close(self):
+        start = time.perf_counter()
+        root = self.builder.close()
+        self.elapsed += time.perf_counter() - start
+        return root
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[max(1, min(len(ordered), round(pct / 100 * len(ordered)))) - 1]
+
+def fetch_document(url, timeout=10, parser=None, parse=True, headers=None, samples=None):
+    """
+    Fetches and parses a page once
+    Timings has DNS, connect, TLS, time to first byte, download and total fetch
+    seconds. With samples > 1 (default AUDITAI_TIMING_SAMPLES) the page is fetched
+    that many times on fresh connections; timings are then the medians and
+    timing_stats has the median and p95 of each phase
+    The body is streamed and capped at AUDITAI_MAX_BODY_MB (truncated is set
+    when cut off). With the stream parser backend the page is parsed while it
+    downloads and the decoded text is not kept
+    Pass parse=False to defer parsing, e.g. to another process, and conditional
+    headers (If-None-Match/If-Modified-Since) to allow a 304 Not Modified answer,
+    in which case the document has no content, not_modified is set and it is not parsed
+    Returns PageDocument, or None if the URL could not be fetched
+    """
+    samples = max(1, samples or TIMING_SAMPLES)
+    parser = parser or get_parser_backend()
+    if samples > 1:
+        # Connection: close makes every sample pay for DNS, connect and TLS again
+        headers = dict(headers or {}, Connection="close")
+
+    runs = []
+    feed = None
+    for sample in range(samples):
+        # Only the last sample's body is kept, so only it is parsed as it streams
+        if parse and parser == 'stream' and sample == samples - 1:
+            feed = _TimedFeed()
+        response, body, timings = _fetch(url, timeout, headers, feed)
+        if response is None:
+            return None
+        runs.append(timings)
+
+    if samples > 1:
+        stats = {phase: {'median': statistics.median(run[phase] for run in runs),
+                         'p95': _percentile([run[phase] for run in runs], 95)}
+                 for phase in FETCH_PHASES}
+        timings = {phase: stats[phase]['median'] for phase in FETCH_PHASES}
+
+    soup = None
+    if feed and response.status_code != 304:
+        soup = feed.close()
+        timings['parse'] = feed.elapsed
+    document = PageDocument(url, response, soup=soup, timings=timings, parser=parser, body=body)
+    if samples > 1:
+        document.timing_stats = stats
+    if parse and not document.not_modified:
+        document.tree
+    return document
+
+def as_document(page, url=None):
+    """Wraps a bare BeautifulSoup tree so checkers accept either form"""
+    if isinstance(page, PageDocument):
+        return page
+    return PageDocument(url, soup=page)
@@ -0,0 +1,122 @@
+from collections import defaultdict
+from bs4 import Tag
+
+# Attributes indexed by presence and by value
+INDEXED_ATTRS = ('id', 'class', 'style', 'srcset', 'sizes', 'rel', 'type', 'href', 'for', 'role',
+                 'aria-label', 'aria-labelledby', 'aria-describedby')
+
+_INDEXED = frozenset(INDEXED_ATTRS)
+
+HEADING_TAGS = ('h1', 'h2', 'h3', 'h4', 'h5', 'h6')
+FORM_CONTROLS = ('input', 'select', 'textarea')
+
+def _tag_children(node):
+    return [child for child in node.contents if isinstance(child, Tag)]
+
+class TagIndex:
+    """
+    Elements of a parsed page bucketed by tag name, built in one walk of the tree.
+    Indexes the attributes the checkers query and precomputes anchor text, heading
+    levels in document order and which form controls sit inside a <label>, so the
+    scanner and checkers never need another full-tree find_all.
+    children(node) lists a node's child elements; the default walks BeautifulSoup trees.
+    """
+    def __init__(self, soup, children=_tag_children):
+        self.children = children
+        self.tags = defaultdict(list)
+        self.attrs = defaultdict(list)
+        self.values = defaultdict(lambda: defaultdict(list))
+        self.anchor_texts = []
+        self.headings = []    # heading levels in document order
+        self.controls = []    # {'control', 'wrapped'} for every form control
+        self.videos = []
+        self._walk(soup)
+
+    def _walk(self, soup):
+        open_videos = []
+        open_labels = []
+        stack = [iter(self.children(soup))]
+        parents = [None]
+
+        while stack:
+            for child in stack[-1]:
+                self._add(child, open_videos, open_labels)
+                stack.append(iter(self.children(child)))
+                parents.append(child)
+                break
+            else:
+                stack.pop()
+                tag = parents.pop()
+                if tag is None:
+                    continue
+                if tag.name == 'video':
+                    open_videos.pop()
+                elif tag.name == 'label':
+                    open_labels.pop()
+
+    def _add(self, tag, open_videos, open_labels):
+        name = tag.name
+        self.tags[name].append(tag)
+
+        for attr, value in tag.attrs.items():
+            if attr not in _INDEXED or value is None:
+                continue
+            self.attrs[attr].append(tag)
+            if isinstance(value, list):
+                for token in value:
+                    self.values[attr][token].append(tag)
+                if len(value) > 1:
+                    self.values[attr][' '.join(value)].append(tag)
+            else:
+                self.values[attr][value].append(tag)
+
+        if name == 'a':
+            self.anchor_texts.append(tag.get_text())
+        elif name in FORM_CONTROLS:
+            self.controls.append({'control': tag, 'wrapped': bool(open_labels)})
+        elif name in HEADING_TAGS:
+            self.headings.append(int(name[1]))
+        elif name == 'track':
+            if tag.get('kind') == 'captions':
+                for video in open_videos:
+                    video['has_captions'] = True
+
+        if name == 'video':
+            video = {'video': tag, 'has_captions': False}
+            self.videos.append(video)
+            open_videos.append(video)
+        elif name == 'label':
+            open_labels.append(tag)
+
+    def find_all(self, name):
+        """All elements with the given tag name, in document order"""
+        return self.tags.get(name, [])
+
+    def find(self, name):
+        """First element with the given tag name, or None"""
+        elements = self.tags.get(name)
+        return elements[0] if elements else None
+
+    def count(self, name):
+        return len(self.tags.get(name, []))
+
+    def with_attr(self, attr, name=None):
+        """Elements carrying an indexed attribute, optionally limited to one tag name"""
+        elements = self.attrs.get(attr, [])
+        if name is None:
+            return elements
+        return [elem for elem in elements if elem.name == name]
+
+    def by_attr_value(self, attr, value, name=None):
+        """Elements whose indexed attribute equals value (or contains it, for multi-valued attributes)"""
+        elements = self.values[attr].get(value, []) if attr in self.values else []
+        if name is None:
+            return elements
+        return [elem for elem in elements if elem.name == name]
+
+    def find_by_attr(self, name, attr, value):
+        """First element of a tag bucket whose attribute equals value"""
+        for elem in self.tags.get(name, []):
+            if elem.get(attr) == value:
+                return elem
+        return None
@@ -0,0 +1,339 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+
+# Audit entry fields, in the order history_tracker builds them
+ENTRY_FIELDS = ('timestamp', 'url', 'overall_score', 'seo_score', 'performance_score',
+                'accessibility_score', 'security_score', 'mobile_score', 'load_time',
+                'page_size_mb', 'broken_links', 'https', 'ai_cache')
+
+# Trend chart series -> score column, rolled up per day, week and month
+TREND_CATEGORIES = {
+    'Overall': 'overall_score',
+    'SEO': 'seo_score',
+    'Performance': 'performance_score',
+    'Accessibility': 'accessibility_score',
+    'Security': 'security_score',
+    'Mobile': 'mobile_score'
+}
+ROLLUP_PERIODS = ('day', 'week', 'month')
+
+# SQLite bucket expressions matching _bucket_start(); weeks start on Monday
+_BUCKET_SQL = {
+    'day': "substr(timestamp, 1, 10)",
+    'week': "date(substr(timestamp, 1, 10), '-6 days', 'weekday 1')",
+    'month': "substr(timestamp, 1, 7) || '-01'"
+}
+
+def _bucket_start(timestamp, period):
+    """First day (ISO date) of the rollup bucket holding an ISO timestamp"""
+    day = timestamp[:10]
+    if period == 'day':
+        return day
+    if period == 'month':
+        return day[:7] + '-01'
+    parsed = date.fromisoformat(day)
+    return (parsed - timedelta(days=parsed.weekday())).isoformat()
+
+def _bucket_end(bucket, period):
+    """First day (ISO date) after the rollup bucket starting on `bucket`"""
+    start = date.fromisoformat(bucket)
+    if period == 'day':
+        return (start + timedelta(days=1)).isoformat()
+    if period == 'week':
+        return (start + timedelta(days=7)).isoformat()
+    return (start.replace(year=start.year + 1, month=1) if start.month == 12
+            else start.replace(month=start.month + 1)).isoformat()
+
+def _iso(value):
+    if value is None or isinstance(value, str):
+        return value
+    return value.isoformat()
+
+class HistoryStore:
+    """
+    Audit history in SQLite (WAL mode), indexed by (url, timestamp)
+    Inserts are append-only; retention is by age and/or entries per URL instead
+    of rewriting a whole file. Each thread gets its own connection.
+    """
+    def __init__(self, path, retention_days=0, max_per_url=0):
+        self.path = path
+        self.retention_days = retention_days
+        self.max_per_url = max_per_url
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._init_lock:
+                if not self._initialized:
+                    self._create_schema(conn)
+                    self._initialized = True
+        return conn
+
+    def _create_schema(self, conn):
+        conn.execute("""CREATE TABLE IF NOT EXISTS audits (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            url TEXT NOT NULL,
+            overall_score NUMERIC,
+            seo_score NUMERIC,
+            performance_score NUMERIC,
+            accessibility_score NUMERIC,
+            security_score NUMERIC,
+            mobile_score NUMERIC,
+            load_time NUMERIC,
+            page_size_mb NUMERIC,
+            broken_links INTEGER,
+            https INTEGER,
+            ai_cache TEXT)""")
+        # Databases created before AI cache tracking lack the column
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(audits)")]
+        if 'ai_cache' not in columns:
+            conn.execute("ALTER TABLE audits ADD COLUMN ai_cache TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_audits_url_timestamp ON audits (url, timestamp)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_audits_timestamp ON audits (timestamp)")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+        stats = ",\n            ".join(f"{column}_min NUMERIC, {column}_sum NUMERIC, {column}_max NUMERIC"
+                                     for column in TREND_CATEGORIES.values())
+        conn.execute(f"""CREATE TABLE IF NOT EXISTS rollups (
+            url TEXT NOT NULL,
+            period TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            {stats},
+            PRIMARY KEY (url, period, bucket))""")
+
+        # Backfill rollups for audits stored before rollups existed
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if not conn.execute("SELECT 1 FROM meta WHERE key = 'rollups_built'").fetchone():
+                self._rebuild_rollups(conn)
+                conn.execute("INSERT INTO meta (key, value) VALUES ('rollups_built', ?)",
+                             (datetime.now().isoformat(),))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _rebuild_rollups(self, conn):
+        conn.execute("DELETE FROM rollups")
+        columns = ", ".join(f"{column}_min, {column}_sum, {column}_max" for column in TREND_CATEGORIES.values())
+        aggregates = ", ".join(f"MIN({column}), SUM({column}), MAX({column})" for column in TREND_CATEGORIES.values())
+        for period in ROLLUP_PERIODS:
+            conn.execute(f"""INSERT INTO rollups (url, period, bucket, count, {columns})
+                SELECT url, '{period}', {_BUCKET_SQL[period]} AS bucket, COUNT(*), {aggregates}
+                FROM audits GROUP BY url, bucket""")
+
+    def _refresh_rollups(self, conn, buckets):
+        # Recomputes (url, period, bucket) rollups from the audits left in them
+        columns = ", ".join(f"{column}_min, {column}_sum, {column}_max" for column in TREND_CATEGORIES.values())
+        aggregates = ", ".join(f"MIN({column}), SUM({column}), MAX({column})" for column in TREND_CATEGORIES.values())
+        for url, period, bucket in buckets:
+            conn.execute("DELETE FROM rollups WHERE url = ? AND period = ? AND bucket = ?", (url, period, bucket))
+            conn.execute(f"""INSERT INTO rollups (url, period, bucket, count, {columns})
+                SELECT url, '{period}', ?, COUNT(*), {aggregates}
+                FROM audits WHERE url = ? AND timestamp >= ? AND timestamp < ? GROUP BY url""",
+                         (bucket, url, bucket, _bucket_end(bucket, period)))
+
+    def _update_rollups(self, conn, entries):
+        columns = list(TREND_CATEGORIES.values())
+        names = ", ".join(f"{column}_min, {column}_sum, {column}_max" for column in columns)
+        updates = ", ".join(
+            f"{column}_min = MIN({column}_min, excluded.{column}_min), "
+            f"{column}_sum = {column}_sum + excluded.{column}_sum, "
+            f"{column}_max = MAX({column}_max, excluded.{column}_max)"
+            for column in columns
+        )
+        rows = []
+        for entry in entries:
+            values = []
+            for column in columns:
+                value = entry.get(column) or 0
+                values += [value, value, value]
+            for period in ROLLUP_PERIODS:
+                rows.append((entry['url'], period, _bucket_start(entry['timestamp'], period), 1, *values))
+        conn.executemany(
+            f"""INSERT INTO rollups (url, period, bucket, count, {names})
+                VALUES ({', '.join('?' * (4 + 3 * len(columns)))})
+                ON CONFLICT (url, period, bucket) DO UPDATE SET count = count + 1, {updates}""",
+            rows
+        )
+
+    def _row_to_entry(self, row):
+        entry = {field: row[field] for field in ENTRY_FIELDS}
+        entry['https'] = bool(entry['https'])
+        return entry
+
+    def migrate_json(self, json_path):
+        """
+        One-time import of the legacy JSON history file
+        The file is renamed to <name>.migrated afterwards; returns rows imported
+        """
+        conn = self._connect()
+        if not os.path.exists(json_path):
+            return 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+                conn.execute("COMMIT")
+                return 0
+            try:
+                with open(json_path, 'r') as f:
+                    entries = json.load(f)
+            except (OSError, ValueError):
+                entries = []
+            self._insert(conn, entries)
+            self._update_rollups(conn, entries)
+            conn.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', ?)",
+                         (datetime.now().isoformat(),))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        os.replace(json_path, json_path + ".migrated")
+        return len(entries)
+
+    def _insert(self, conn, entries):
+        conn.executemany(
+            f"INSERT INTO audits ({', '.join(ENTRY_FIELDS)}) VALUES ({', '.join('?' * len(ENTRY_FIELDS))})",
+            [tuple(int(entry.get(field, False)) if field == 'https' else entry.get(field)
+                   for field in ENTRY_FIELDS) for entry in entries]
+        )
+
+    def append(self, entry):
+        """Inserts one audit entry and applies retention"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._insert(conn, [entry])
+            self._update_rollups(conn, [entry])
+            self._apply_retention(conn, entry['url'])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _delete_audits(self, conn, where, params):
+        # Deletes audits and takes them out of their rollup buckets, so trends
+        # never include pruned audits
+        days = conn.execute(f"SELECT DISTINCT url, substr(timestamp, 1, 10) AS day FROM audits WHERE {where}",
+                            params).fetchall()
+        if not days:
+            return
+        conn.execute(f"DELETE FROM audits WHERE {where}", params)
+        self._refresh_rollups(conn, {(row['url'], period, _bucket_start(row['day'], period))
+                                     for row in days for period in ROLLUP_PERIODS})
+
+    def _apply_retention(self, conn, url):
+        if self.retention_days:
+            cutoff = (datetime.now() - timedelta(days=self.retention_days)).isoformat()
+            self._delete_audits(conn, "timestamp < ?", (cutoff,))
+        if self.max_per_url:
+            # Timestamp of the oldest entry to keep for this URL, found through the index
+            row = conn.execute(
+                "SELECT timestamp FROM audits WHERE url = ? ORDER BY timestamp DESC LIMIT 1 OFFSET ?",
+                (url, self.max_per_url - 1)
+            ).fetchone()
+            if row:
+                self._delete_audits(conn, "url = ? AND timestamp < ?", (url, row['timestamp']))
+
+    def site_history(self, url, limit=10):
+        """Latest `limit` entries for a URL, oldest first"""
+        rows = self._connect().execute(
+            "SELECT * FROM audits WHERE url = ? ORDER BY timestamp DESC, id DESC LIMIT ?",
+            (url, limit)
+        ).fetchall()
+        return [self._row_to_entry(row) for row in reversed(rows)]
+
+    def all_entries(self, limit=None):
+        """Latest entries across all sites, oldest first"""
+        query = "SELECT * FROM audits ORDER BY timestamp DESC, id DESC"
+        rows = self._connect().execute(query + " LIMIT ?", (limit,)).fetchall() if limit \
+            else self._connect().execute(query).fetchall()
+        return [self._row_to_entry(row) for row in reversed(rows)]
+
+    def trend(self, url, start=None, end=None, points=60):
+        """
+        Score trend for a URL between start and end (datetimes, dates or ISO strings)
+        Uses raw audits when they fit in `points`, otherwise the finest daily/weekly/
+        monthly rollup, merged further so at most `points` values are returned
+        Returns dict with dates, mean scores, min/max per category and granularity
+        """
+        conn = self._connect()
+        start, end = _iso(start), _iso(end)
+        if end and len(end) == 10:
+            end += 'T23:59:59.999999'  # A bare end date includes that whole day
+        day_start = start[:10] if start else '0000-00-00'
+        day_end = end[:10] if end else '9999-99-99'
+
+        total, day_buckets = conn.execute(
+            "SELECT COALESCE(SUM(count), 0), COUNT(*) FROM rollups "
+            "WHERE url = ? AND period = 'day' AND bucket BETWEEN ? AND ?",
+            (url, day_start, day_end)
+        ).fetchone()
+        if not total:
+            return None
+
+        if total <= points:
+            return self._raw_trend(conn, url, start, end)
+
+        buckets = day_buckets
+        for period in ROLLUP_PERIODS:
+            if period != 'day':
+                first = _bucket_start(day_start, period) if start else day_start
+                buckets = conn.execute(
+                    "SELECT COUNT(*) FROM rollups WHERE url = ? AND period = ? AND bucket BETWEEN ? AND ?",
+                    (url, period, first, day_end)
+                ).fetchone()[0]
+            if buckets <= points or period == ROLLUP_PERIODS[-1]:
+                break
+
+        first = _bucket_start(day_start, period) if start else day_start
+        rows = conn.execute(
+            "SELECT * FROM rollups WHERE url = ? AND period = ? AND bucket BETWEEN ? AND ? ORDER BY bucket",
+            (url, period, first, day_end)
+        ).fetchall()
+        return self._downsample(rows, points, period)
+
+    def _raw_trend(self, conn, url, start, end):
+        rows = conn.execute(
+            "SELECT * FROM audits WHERE url = ? AND timestamp BETWEEN ? AND ? ORDER BY timestamp, id",
+            (url, start or '', end or '\uffff')
+        ).fetchall()
+        return {
+            'dates': [row['timestamp'] for row in rows],
+            'scores': {name: [row[column] for row in rows] for name, column in TREND_CATEGORIES.items()},
+            'min': {name: [row[column] for row in rows] for name, column in TREND_CATEGORIES.items()},
+            'max': {name: [row[column] for row in rows] for name, column in TREND_CATEGORIES.items()},
+            'granularity': 'raw'
+        }
+
+    def _downsample(self, rows, points, period):
+        # Merge runs of adjacent buckets: count-weighted mean, min of mins, max of maxes
+        group_size = -(-len(rows) // points)
+        trend = {'dates': [], 'scores': {}, 'min': {}, 'max': {}, 'granularity': period}
+        for name in TREND_CATEGORIES:
+            trend['scores'][name], trend['min'][name], trend['max'][name] = [], [], []
+
+        for i in range(0, len(rows), group_size):
+            group = rows[i:i + group_size]
+            count = sum(row['count'] for row in group)
+            trend['dates'].append(group[0]['bucket'])
+            for name, column in TREND_CATEGORIES.items():
+                trend['scores'][name].append(round(sum(row[f"{column}_sum"] for row in group) / count, 2))
+                trend['min'][name].append(min(row[f"{column}_min"] for row in group))
+                trend['max'][name].append(max(row[f"{column}_max"] for row in group))
+        if group_size > 1:
+            trend['granularity'] = f"{group_size} {period}s"
+        return trend
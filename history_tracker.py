@@ -1,23 +1,31 @@
-import json
-import os
 from datetime import datetime
+from config import setting
+from history_store import HistoryStore
 
-HISTORY_FILE = "audit_history.json"
+HISTORY_FILE = "audit_history.json"  # Legacy JSON history, migrated once into HISTORY_DB
+HISTORY_DB = setting("AUDITAI_HISTORY_DB", "audit_history.db")
 
-def load_history():
-    """Load audit history from JSON file"""
-    if os.path.exists(HISTORY_FILE):
-        try:
-            with open(HISTORY_FILE, 'r') as f:
-                return json.load(f)
-        except:
-            return []
-    return []
+# Retention: 0 keeps everything
+HISTORY_RETENTION_DAYS = setting("AUDITAI_HISTORY_RETENTION_DAYS", 0)
+HISTORY_MAX_PER_URL = setting("AUDITAI_HISTORY_MAX_PER_URL", 0)
+
+_store = None
+
+def get_store():
+    """Shared history store, opened (and migrated from JSON) on first use"""
+    global _store
+    if _store is None:
+        store = HistoryStore(HISTORY_DB, HISTORY_RETENTION_DAYS, HISTORY_MAX_PER_URL)
+        store.migrate_json(HISTORY_FILE)
+        _store = store
+    return _store
+
+def load_history(limit=None):
+    """Load audit history, oldest first"""
+    return get_store().all_entries(limit)
 
 def save_audit(url, scan_data, ai_report, accessibility_data, mobile_data, link_data):
     """Save current audit to history"""
-    history = load_history()
-    
     audit_entry = {
         'timestamp': datetime.now().isoformat(),
         'url': url,
@@ -30,32 +38,32 @@ def save_audit(url, scan_data, ai_report, accessibility_data, mobile_data, link_
         'load_time': scan_data.get('load_time', 0),
         'page_size_mb': scan_data.get('page_size_mb', 0),
         'broken_links': link_data.get('broken_links_count', 0),
-        'https': scan_data.get('https', False)
+        'https': scan_data.get('https', False),
+        'ai_cache': (ai_report or {}).get('cache_status')
     }
-    
-    history.append(audit_entry)
-    
-    # Keep only last 100 audits
-    history = history[-100:]
-    
-    with open(HISTORY_FILE, 'w') as f:
-        json.dump(history, f, indent=2)
-    
+
+    get_store().append(audit_entry)
+
     return audit_entry
 
 def get_site_history(url, limit=10):
     """Get history for a specific site"""
-    history = load_history()
-    site_history = [entry for entry in history if entry['url'] == url]
-    return site_history[-limit:]
+    return get_store().site_history(url, limit)
+
+def get_trend_data(url, start=None, end=None, points=None):
+    """
+    Get trend data for charts
+    Without arguments returns the last 20 audits; with a time range and/or points,
+    returns precomputed rollups downsampled to at most `points` values (default 60)
+    """
+    if start is not None or end is not None or points is not None:
+        return get_store().trend(url, start, end, points or 60)
 
-def get_trend_data(url):
-    """Get trend data for charts"""
     site_history = get_site_history(url, limit=20)
-    
+
     if not site_history:
         return None
-    
+
     dates = [entry['timestamp'][:10] for entry in site_history]
     scores = {
         'Overall': [entry['overall_score'] for entry in site_history],
@@ -65,5 +73,5 @@ def get_trend_data(url):
         'Security': [entry['security_score'] for entry in site_history],
         'Mobile': [entry['mobile_score'] for entry in site_history]
     }
-    
+
     return {'dates': dates, 'scores': scores}
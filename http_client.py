@@ -0,0 +1,171 @@
+import socket
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.connection import allowed_gai_family
+from urllib3.util.retry import Retry
+from config import setting
+
+USER_AGENT = "AI-Site-Auditor"
+
+# Pool and retry settings, overridable from the environment or configure_http_client()
+_config = {
+    "pool_connections": setting("AUDITAI_POOL_HOSTS", 50),    # hosts with a cached pool
+    "pool_maxsize": setting("AUDITAI_POOL_MAXSIZE", 10),      # keep-alive connections per host
+    "retries": setting("AUDITAI_HTTP_RETRIES", 2),
+    "backoff_factor": setting("AUDITAI_HTTP_BACKOFF", 0.3),
+}
+
+_session = None
+_lock = threading.Lock()
+
+# Network phases recorded per response, in seconds; phases of a reused keep-alive
+# connection are 0
+NETWORK_PHASES = ('dns', 'connect', 'tls', 'ttfb')
+
+class _TimedConnection:
+    """
+    Connection mixin recording DNS, TCP connect and TLS handshake times of new
+    connections and the time to first byte of each request (monotonic clock)
+    """
+    timings = {}
+    _connected_at = 0.0
+    _request_start = 0.0
+
+    def _new_conn(self):
+        # Resolve separately, so DNS and TCP connect are timed apart; then try the
+        # addresses in order, like create_connection does
+        host = self._dns_host
+        start = time.perf_counter()
+        try:
+            addresses = [info[4][0] for info in
+                         socket.getaddrinfo(host.strip("[]"), self.port, allowed_gai_family(), socket.SOCK_STREAM)]
+        except OSError:
+            addresses = []  # let urllib3 resolve again and raise its own error
+        resolved = time.perf_counter()
+        candidates = addresses or [host]
+        try:
+            for i, address in enumerate(candidates):
+                self._dns_host = address
+                try:
+                    sock = super()._new_conn()
+                    break
+                except Exception:
+                    if i == len(candidates) - 1:
+                        raise
+        finally:
+            self._dns_host = host
+        self._connected_at = time.perf_counter()
+        self.timings = {'dns': resolved - start, 'connect': self._connected_at - resolved}
+        return sock
+
+    def request(self, *args, **kwargs):
+        self._request_start = time.perf_counter()
+        return super().request(*args, **kwargs)
+
+    def getresponse(self, *args, **kwargs):
+        response = super().getresponse(*args, **kwargs)
+        # Plain HTTP connects inside request(), so count from whichever came last
+        ttfb = time.perf_counter() - max(self._request_start, self._connected_at)
+        response.timings = dict(self.timings, ttfb=ttfb)
+        self.timings = {}
+        return response
+
+class TimedHTTPConnection(_TimedConnection, HTTPConnection):
+    pass
+
+class TimedHTTPSConnection(_TimedConnection, HTTPSConnection):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        self._connected_at = time.perf_counter()
+        handshake = self._connected_at - start - self.timings.get('dns', 0) - self.timings.get('connect', 0)
+        self.timings = dict(self.timings, tls=max(0.0, handshake))
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose pools use the timed connections"""
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+def response_timings(response):
+    """
+    DNS, connect, TLS and TTFB seconds of a requests response, summed over its redirects
+    Phases the connection did not go through (e.g. on a reused connection) are 0
+    """
+    totals = dict.fromkeys(NETWORK_PHASES, 0.0)
+    for hop in (*response.history, response):
+        raw = hop.raw
+        # urllib3 1.x wraps the http.client response the timings were set on
+        timings = getattr(raw, 'timings', None) or getattr(getattr(raw, '_original_response', None), 'timings', {})
+        for phase, seconds in timings.items():
+            totals[phase] += seconds
+    return totals
+
+def _build_session(config):
+    retry = Retry(
+        total=config["retries"],
+        backoff_factor=config["backoff_factor"],
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"HEAD", "GET", "OPTIONS"}),
+        raise_on_status=False,
+        respect_retry_after_header=False
+    )
+    adapter = TimedHTTPAdapter(
+        pool_connections=config["pool_connections"],
+        pool_maxsize=config["pool_maxsize"],
+        max_retries=retry
+    )
+    session = requests.Session()
+    session.headers["User-Agent"] = USER_AGENT
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def get_session():
+    """
+    Shared HTTP session with per-host keep-alive connection pools and retry/backoff
+    Safe to use from many threads; the scanner, link checker and other fetchers
+    all go through it so connections to the same host are reused
+    """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _build_session(_config)
+    return _session
+
+def configure_http_client(pool_connections=None, pool_maxsize=None, retries=None, backoff_factor=None):
+    """Changes pool/retry settings; the shared session is rebuilt on next use"""
+    global _session
+    with _lock:
+        updates = {
+            "pool_connections": pool_connections,
+            "pool_maxsize": pool_maxsize,
+            "retries": retries,
+            "backoff_factor": backoff_factor,
+        }
+        _config.update({key: value for key, value in updates.items() if value is not None})
+        old_session, _session = _session, None
+    if old_session is not None:
+        old_session.close()
+
+def close_http_client():
+    """Closes all pooled connections"""
+    global _session
+    with _lock:
+        old_session, _session = _session, None
+    if old_session is not None:
+        old_session.close()
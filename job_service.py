@@ -0,0 +1,466 @@
+"""
+Local audit job service
+
+Audits run on a fixed pool of worker threads fed by a bounded priority queue, so
+a burst of requests queues up (or is turned away once the queue is full) instead
+of starting unbounded concurrent fetches and AI calls. Finished jobs and their
+results are kept for AUDITAI_JOB_RETENTION seconds.
+
+The Gradio UI submits its audits to the shared in-process service and serves the
+HTTP API for it when AUDITAI_JOB_PORT is set, so batch tools submitting there
+share the UI's queue. Without the UI, run the service on its own:
+
+    POST   /jobs              {"url": ..., "priority": "high|normal|low", "check_links": true,
+                               "use_ai": false, "incremental": false}
+                              -> 202 job status, 429 with Retry-After when the queue is full
+    GET    /jobs              service stats
+    GET    /jobs/<id>         job status (with the stages finished so far)
+    GET    /jobs/<id>/result  200 audit result once done, 202 job status before
+    DELETE /jobs/<id>         cancel
+
+    python job_service.py --port 8700 --workers 4 --queue-size 64
+"""
+import argparse
+import itertools
+import json
+import queue
+import sys
+import threading
+import time
+import uuid
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError
+from config import setting
+from pipeline import run_audit
+from utils import normalize_url, is_valid_url
+
+JOB_WORKERS = setting("AUDITAI_JOB_WORKERS", 4)
+JOB_QUEUE_SIZE = setting("AUDITAI_JOB_QUEUE_SIZE", 32)
+JOB_RETENTION = setting("AUDITAI_JOB_RETENTION", 3600)        # seconds finished jobs are kept
+JOB_MAX_RETAINED = setting("AUDITAI_JOB_MAX_RETAINED", 1000)  # finished jobs kept at most
+JOB_PORT = setting("AUDITAI_JOB_PORT", 0)                     # 0 = no endpoint in the UI
+
+# Port of a standalone service (python job_service.py) when AUDITAI_JOB_PORT is not set
+DEFAULT_PORT = 8700
+
+PRIORITIES = {'high': 0, 'normal': 1, 'low': 2}
+FINISHED = ('done', 'error', 'cancelled')
+
+# Seconds clients are told to wait before retrying a rejected submission
+RETRY_AFTER = 5
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+class Job:
+    """
+    One queued unit of work: func(job) runs on a worker and returns the result.
+    func reports progress with job.publish(name, status, value, elapsed); a
+    streaming job also hands every published event to the consumer of stream()
+    """
+    def __init__(self, func, label='', priority='normal', stream=False):
+        self.id = uuid.uuid4().hex[:12]
+        self.func = func
+        self.label = label
+        self.priority = priority
+        self.status = 'queued'
+        self.submitted = time.time()
+        self.started = self.finished = None
+        self.stages = {}      # stage name -> status, in finishing order
+        self.result = None
+        self.error = None
+        self.cancel_event = threading.Event()
+        self._done = threading.Event()
+        self._events = queue.Queue() if stream else None
+        self._on_cancel = None  # set by the service to release a queued job's slot
+
+    def publish(self, name, status, value=None, elapsed=0):
+        self.stages[name] = status
+        if self._events is not None:
+            self._events.put((name, status, value, elapsed))
+
+    def stream(self, poll=None):
+        """
+        Yields (name, status, value, elapsed) as the job publishes them, until it finishes
+        With poll, yields None every poll seconds while nothing happens (e.g. while queued).
+        Closing the generator before the job finishes (e.g. the client went away) cancels it
+        """
+        try:
+            while True:
+                try:
+                    event = self._events.get(timeout=poll)
+                except queue.Empty:
+                    yield None
+                    continue
+                if event is None:
+                    return
+                yield event
+        finally:
+            if not self.done:
+                self.cancel()
+
+    def cancel(self):
+        """Asks a running job to stop; a queued job finishes as cancelled at once"""
+        self.cancel_event.set()
+        if self._on_cancel is not None:
+            self._on_cancel(self)
+
+    def wait(self, timeout=None):
+        """True once the job has finished"""
+        return self._done.wait(timeout)
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def _finish(self, status, result=None, error=None):
+        self.status = status
+        self.result = result
+        self.error = error
+        self.finished = time.time()
+        self.func = None
+        if self._events is not None:
+            self._events.put(None)
+        self._done.set()
+
+    def as_dict(self):
+        """JSON-serializable job status (without the result)"""
+        return {
+            'id': self.id,
+            'label': self.label,
+            'priority': self.priority,
+            'status': self.status,
+            'submitted': self.submitted,
+            'started': self.started,
+            'finished': self.finished,
+            'stages': dict(self.stages),
+            'error': self.error
+        }
+
+class JobService:
+    """
+    Bounded priority queue of jobs served by a fixed pool of worker threads
+    submit() raises QueueFull when queue_size jobs are already waiting; jobs of
+    a higher priority run first, in submission order within a priority
+    """
+    def __init__(self, workers=JOB_WORKERS, queue_size=JOB_QUEUE_SIZE, retention=JOB_RETENTION,
+                 max_retained=JOB_MAX_RETAINED):
+        self.queue_size = max(1, queue_size)
+        self.retention = retention
+        self.max_retained = max_retained
+        self.stats = {'submitted': 0, 'rejected': 0, 'done': 0, 'error': 0, 'cancelled': 0}
+        # Jobs cancelled while queued stay in the heap until a worker skips them, so
+        # the bound is on live queued jobs, counted here rather than by the queue
+        self._queue = queue.PriorityQueue()
+        self._order = itertools.count()
+        self._jobs = {}       # id -> job, in submission order
+        self._queued = 0
+        self._running = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._workers = [threading.Thread(target=self._work, name=f'audit-job-{i}', daemon=True)
+                         for i in range(max(1, workers))]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, func, label='', priority='normal', stream=False):
+        """Queues func(job); returns the Job, or raises QueueFull"""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority '{priority}', expected one of {tuple(PRIORITIES)}")
+        job = Job(func, label, priority, stream)
+        job._on_cancel = self._cancel_queued
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Job service is closed")
+            self._purge()
+            if self._queued >= self.queue_size:
+                self.stats['rejected'] += 1
+                raise QueueFull(f"Job queue is full ({self.queue_size} waiting)")
+            self._queued += 1
+            self._queue.put_nowait((PRIORITIES[priority], next(self._order), job))
+            self._jobs[job.id] = job
+            self.stats['submitted'] += 1
+        return job
+
+    def submit_audit(self, url, priority='normal', **options):
+        """Queues run_audit(url, **options); the job's result is the audit result"""
+        def audit(job):
+            return run_audit(url, cancel_event=job.cancel_event, on_stage=job.publish, **options)
+        return self.submit(audit, url, priority)
+
+    def get(self, job_id):
+        """Job by id, or None if unknown or no longer retained"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """
+        Cancels a queued or running job; returns the job, or None if unknown
+        A queued job finishes as cancelled at once and frees its queue slot
+        """
+        job = self.get(job_id)
+        if job is not None and not job.done:
+            job.cancel()
+        return job
+
+    def _cancel_queued(self, job):
+        with self._lock:
+            queued = job.status == 'queued'
+            if queued:
+                job.status = 'cancelled'
+                self._queued -= 1
+        if queued:
+            self._record(job, 'cancelled')
+
+    def summary(self):
+        """Queue depth, running jobs, retained jobs and counters"""
+        with self._lock:
+            return dict(self.stats, queued=self._queued, running=self._running,
+                        retained=len(self._jobs), workers=len(self._workers),
+                        queue_size=self.queue_size)
+
+    def close(self):
+        """Rejects new jobs and stops the workers once the jobs already queued are done"""
+        with self._lock:
+            self._closed = True
+        # The heap is unbounded, so the stop markers (queued after every job) never block
+        for _ in self._workers:
+            self._queue.put_nowait((float('inf'), next(self._order), None))
+        for worker in self._workers:
+            worker.join()
+
+    def _work(self):
+        while True:
+            _, _, job = self._queue.get()
+            if job is None:
+                return
+            with self._lock:
+                if job.status != 'queued':
+                    continue      # cancelled while queued
+                self._queued -= 1
+                self._running += 1
+                job.status = 'running'
+            job.started = time.time()
+            try:
+                result = job.func(job)
+            except Exception as e:
+                self._record(job, 'error', error=f"{type(e).__name__}: {e}")
+            else:
+                if job.cancel_event.is_set():
+                    self._record(job, 'cancelled', result)
+                elif isinstance(result, dict) and 'error' in result:
+                    self._record(job, 'error', result, result['error'])
+                else:
+                    self._record(job, 'done', result)
+            finally:
+                with self._lock:
+                    self._running -= 1
+
+    def _record(self, job, status, result=None, error=None):
+        job._finish(status, result, error)
+        with self._lock:
+            self.stats[status] += 1
+            self._purge()
+
+    def _purge(self):
+        # Drop finished jobs past their retention, oldest first, and beyond max_retained
+        finished = [job for job in self._jobs.values() if job.done]
+        expired = time.time() - self.retention
+        excess = len(finished) - self.max_retained
+        for job in finished:
+            if job.finished < expired or excess > 0:
+                del self._jobs[job.id]
+                excess -= 1
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_job_service():
+    """Shared job service configured from the AUDITAI_JOB_* settings, started on first use"""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = JobService()
+    return _service
+
+def serve_jobs(service=None, port=None, host="127.0.0.1"):
+    """
+    Serves the job API on http://host:port/jobs from a background thread
+    Returns the server (call shutdown() to stop it), or None if no port is set or
+    the port is taken (a warning is printed instead of failing the caller's startup)
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    service = service or get_job_service()
+    port = JOB_PORT if port is None else port
+    if not port:
+        return None
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, payload, headers=None):
+            body = json.dumps(payload, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _job(self):
+            # (job, wants result) for /jobs/<id>[/result], else (None, False) after a 404
+            parts = self.path.split("?")[0].strip("/").split("/")
+            if len(parts) in (2, 3) and parts[0] == "jobs" and parts[2:] in ([], ["result"]):
+                job = service.get(parts[1])
+                if job is not None:
+                    return job, parts[2:] == ["result"]
+            self._send(404, {'error': "Unknown job"})
+            return None, False
+
+        def do_GET(self):
+            if self.path.split("?")[0].rstrip("/") == "/jobs":
+                self._send(200, service.summary())
+                return
+            job, wants_result = self._job()
+            if job is None:
+                return
+            if wants_result and job.done:
+                self._send(200, dict(job.as_dict(), result=job.result))
+            else:
+                self._send(202 if wants_result else 200, job.as_dict())
+
+        def do_POST(self):
+            if self.path.split("?")[0].rstrip("/") != "/jobs":
+                self._send(404, {'error': "Not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                request = json.loads(self.rfile.read(length) or b"{}")
+                url = normalize_url(str(request['url']).strip())
+            except (ValueError, KeyError, TypeError):
+                self._send(400, {'error': "Expected a JSON body with a url"})
+                return
+            if not is_valid_url(url):
+                self._send(400, {'error': "Invalid URL"})
+                return
+            priority = request.get('priority', 'normal')
+            if not isinstance(priority, str):
+                self._send(400, {'error': f"priority must be one of {tuple(PRIORITIES)}"})
+                return
+            try:
+                job = service.submit_audit(
+                    url, priority,
+                    check_links=bool(request.get('check_links', True)),
+                    use_ai=bool(request.get('use_ai', False)),
+                    incremental=bool(request.get('incremental', False))
+                )
+            except ValueError as e:
+                self._send(400, {'error': str(e)})
+                return
+            except QueueFull as e:
+                self._send(429, {'error': str(e)}, {"Retry-After": str(RETRY_AFTER)})
+                return
+            self._send(202, job.as_dict(), {"Location": f"/jobs/{job.id}"})
+
+        def do_DELETE(self):
+            job, wants_result = self._job()
+            if job is None:
+                return
+            self._send(200, service.cancel(job.id).as_dict())
+
+        def log_message(self, format, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer((host, port), Handler)
+    except OSError as e:
+        print(f"⚠️ Job API not started on {host}:{port}: {e}", file=sys.stderr)
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="jobs", daemon=True).start()
+    return server
+
+class JobClient:
+    """Client for a job service's HTTP API; submissions retry while the queue is full"""
+    def __init__(self, base_url, timeout=10):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _call(self, method, path, payload=None):
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        request = Request(self.base_url + path, data=data, method=method,
+                          headers={"Content-Type": "application/json"})
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                return response.status, json.loads(response.read() or b"{}"), response.headers
+        except HTTPError as e:
+            with e:
+                return e.code, json.loads(e.read() or b"{}"), e.headers
+
+    def submit(self, url, priority='normal', max_wait=None, **options):
+        """
+        Submits an audit; returns the job status dict
+        While the service answers 429, waits Retry-After seconds and tries again
+        (up to max_wait seconds in total, forever if None), then raises QueueFull
+        """
+        deadline = None if max_wait is None else time.time() + max_wait
+        while True:
+            status, payload, headers = self._call("POST", "/jobs", dict(options, url=url, priority=priority))
+            if status == 202:
+                return payload
+            if status != 429:
+                raise ValueError(payload.get('error', f"HTTP {status}"))
+            delay = float(headers.get("Retry-After") or RETRY_AFTER)
+            if deadline is not None and time.time() + delay > deadline:
+                raise QueueFull(payload.get('error', "Job queue is full"))
+            time.sleep(delay)
+
+    def status(self, job_id):
+        return self._call("GET", f"/jobs/{job_id}")[1]
+
+    def result(self, job_id, poll=1.0, timeout=None):
+        """Waits for a job to finish; returns its status dict with the result"""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            status, payload, _ = self._call("GET", f"/jobs/{job_id}/result")
+            if status != 202:
+                return payload
+            if deadline is not None and time.time() >= deadline:
+                raise TimeoutError(f"Job {job_id} still {payload['status']}")
+            time.sleep(poll)
+
+    def cancel(self, job_id):
+        return self._call("DELETE", f"/jobs/{job_id}")[1]
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the audit job service")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=JOB_PORT or DEFAULT_PORT,
+                        help=f"Port of the job API (default: AUDITAI_JOB_PORT or {DEFAULT_PORT})")
+    parser.add_argument("--workers", type=int, default=JOB_WORKERS, help="Audits run at once")
+    parser.add_argument("--queue-size", type=int, default=JOB_QUEUE_SIZE,
+                        help="Jobs waiting at most; more are rejected with 429")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve Prometheus metrics on this port (default: AUDITAI_METRICS_PORT)")
+    args = parser.parse_args()
+    if not args.port:
+        parser.error("--port must be set")
+
+    from metrics import serve_metrics
+    serve_metrics(args.metrics_port)
+
+    global _service
+    _service = JobService(workers=args.workers, queue_size=args.queue_size)
+    server = serve_jobs(_service, args.port, args.host)
+    if server is None:
+        sys.exit(1)
+    print(f"Job service on http://{args.host}:{server.server_address[1]}/jobs "
+          f"({args.workers} workers, queue of {args.queue_size})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
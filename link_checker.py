@@ -1,74 +1,159 @@
+import sqlite3
 import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from config import setting
+from document import as_document
+from disk_cache import DiskCache
+from http_client import get_session
+from probe_engine import probe_urls
+from utils import canonicalize_url
+from urllib.parse import urljoin
 
-def check_broken_links(url, soup, max_links=50, timeout=5):
+# Link-status cache shared across audits, keyed by canonical URL
+LINK_CACHE_PATH = setting("AUDITAI_LINK_CACHE", "link_cache.db")
+LINK_CACHE_MAX_ENTRIES = setting("AUDITAI_LINK_CACHE_MAX", 50000)
+HEALTHY_LINK_TTL = setting("AUDITAI_LINK_TTL_OK", 24 * 3600)
+BROKEN_LINK_TTL = setting("AUDITAI_LINK_TTL_BROKEN", 3600)
+# Timeouts, connection errors, rate limiting and gateway errors may pass, so they are retried sooner
+TRANSIENT_LINK_TTL = setting("AUDITAI_LINK_TTL_TRANSIENT", 300)
+TRANSIENT_STATUSES = ('Error', 429, 502, 503, 504)
+
+_link_cache = None
+
+def get_link_cache():
+    """Shared on-disk link-status cache, opened on first use"""
+    global _link_cache
+    if _link_cache is None:
+        _link_cache = DiskCache(LINK_CACHE_PATH, max_entries=LINK_CACHE_MAX_ENTRIES)
+    return _link_cache
+
+def check_single_link(full_url, timeout=5):
+    """
+    Probes one URL with HEAD, falling back to a 0-byte ranged GET whose body is never read
+    Returns dict with broken flag and status
+    """
+    session = get_session()
+    try:
+        response = session.head(full_url, timeout=timeout, allow_redirects=True)
+
+        # If HEAD fails, try a ranged GET and stream only the headers
+        if response.status_code >= 400:
+            with session.get(full_url, timeout=timeout, stream=True,
+                             headers={"Range": "bytes=0-0"}) as ranged:
+                status = ranged.status_code
+        else:
+            status = response.status_code
+
+        # 416 means the resource exists but is empty
+        if status >= 400 and status != 416:
+            return {'broken': True, 'status': status}
+        else:
+            return {'broken': False}
+    except requests.exceptions.RequestException as e:
+        return {'broken': True, 'status': 'Error', 'error': str(e)[:50]}
+
+def _link_ttl(result):
+    if not result['broken']:
+        return HEALTHY_LINK_TTL
+    return TRANSIENT_LINK_TTL if result.get('status') in TRANSIENT_STATUSES else BROKEN_LINK_TTL
+
+def check_broken_links(url, page, max_links=None, timeout=5, max_concurrency=32,
+                       per_host_limit=8, time_budget=60, use_cache=True):
     """
     Checks for broken links on the page
-    Returns dict with broken links, total links checked, and status
+    Accepts a PageDocument or a BeautifulSoup tree
+    Checks every link (or the first max_links), deduplicated by canonical URL,
+    consulting the link-status cache first and stopping after time_budget seconds
+    Returns dict with broken links, total links checked, unchecked links, cache stats and status
+    """
+    index = as_document(page, url).index
+    hrefs = [link.get('href') for link in index.with_attr('href', 'a')]
+    return check_link_urls(url, hrefs, max_links, timeout, max_concurrency,
+                           per_host_limit, time_budget, use_cache)
+
+def check_link_urls(url, hrefs, max_links=None, timeout=5, max_concurrency=32,
+                    per_host_limit=8, time_budget=60, use_cache=True):
+    """
+    Checks already extracted hrefs, resolved against the page URL
+    Same result as check_broken_links, for callers that parsed the page elsewhere
     """
-    broken_links = []
-    working_links = 0
     skipped_links = 0
-    
-    # Extract all links
-    all_links = soup.find_all('a', href=True)
-    links_to_check = []
-    
-    for link in all_links[:max_links]:  # Limit to avoid overwhelming
-        href = link.get('href')
-        
+    duplicate_links = 0
+
+    if max_links is not None:
+        hrefs = hrefs[:max_links]
+    links_to_check = {}
+
+    for href in hrefs:
         # Skip anchors, mailto, tel, javascript
         if href.startswith(('#', 'mailto:', 'tel:', 'javascript:')):
             skipped_links += 1
             continue
-        
+
         # Convert relative URLs to absolute
         full_url = urljoin(url, href)
-        
-        # Only check HTTP/HTTPS
+
+        # Only check HTTP/HTTPS, once per canonical URL
         if full_url.startswith(('http://', 'https://')):
-            links_to_check.append((href, full_url))
-    
-    # Check links in parallel for speed
-    def check_single_link(link_data):
-        original_href, full_url = link_data
-        try:
-            response = requests.head(full_url, timeout=timeout, allow_redirects=True,
-                                    headers={"User-Agent": "AI-Site-Auditor"})
-            
-            # If HEAD fails, try GET
-            if response.status_code >= 400:
-                response = requests.get(full_url, timeout=timeout, 
-                                       headers={"User-Agent": "AI-Site-Auditor"})
-            
-            if response.status_code >= 400:
-                return {'broken': True, 'url': original_href, 'status': response.status_code}
-            else:
-                return {'broken': False}
-        except requests.exceptions.RequestException as e:
-            return {'broken': True, 'url': original_href, 'status': 'Error', 'error': str(e)[:50]}
-    
-    # Use ThreadPoolExecutor for parallel checking
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        futures = {executor.submit(check_single_link, link): link for link in links_to_check}
-        
-        for future in as_completed(futures):
-            result = future.result()
-            if result['broken']:
-                broken_links.append(result)
+            canonical = canonicalize_url(full_url)
+            if canonical in links_to_check:
+                duplicate_links += 1
             else:
-                working_links += 1
-    
-    total_checked = len(links_to_check)
+                links_to_check[canonical] = href
+
+    # Reuse fresh cached statuses, probe only the misses
+    cached = {}
+    if use_cache:
+        try:
+            cached = get_link_cache().get_many(links_to_check)
+        except sqlite3.Error:
+            cached = {}
+    to_probe = [canonical for canonical in links_to_check if canonical not in cached]
+
+    # Probe concurrently under total and per-host limits
+    probed = probe_urls(
+        to_probe,
+        lambda full_url: check_single_link(full_url, timeout),
+        max_concurrency=max_concurrency,
+        per_host_limit=per_host_limit,
+        time_budget=time_budget
+    )
+
+    if use_cache and probed['results']:
+        try:
+            get_link_cache().set_many(
+                (canonical, result, _link_ttl(result))
+                for canonical, result in probed['results'].items()
+            )
+        except sqlite3.Error:
+            pass
+
+    results = {**cached, **probed['results']}
+    broken_links = []
+    working_links = 0
+    for canonical, href in links_to_check.items():
+        result = results.get(canonical)
+        if result is None:
+            continue
+        if result['broken']:
+            broken_links.append({'url': href, **result})
+        else:
+            working_links += 1
+
+    unchecked_links = [links_to_check[canonical] for canonical in probed['unchecked']]
+    total_checked = len(results)
     broken_count = len(broken_links)
-    
+
     return {
         'total_links_checked': total_checked,
         'working_links': working_links,
         'broken_links_count': broken_count,
         'broken_links_details': broken_links[:10],  # Limit details to first 10
         'skipped_links': skipped_links,
+        'duplicate_links': duplicate_links,
+        'unchecked_links_count': len(unchecked_links),
+        'unchecked_links': unchecked_links,
+        'cache_hits': len(cached),
+        'cache_misses': len(to_probe),
+        'check_time': round(probed['elapsed'], 2),
         'link_health': 'Excellent' if broken_count == 0 else 'Good' if broken_count <= 2 else 'Needs Attention'
     }
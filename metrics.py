@@ -0,0 +1,252 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from config import setting
+
+# Timing spans per audit and aggregated latency histograms in Prometheus text format.
+# Every audit result carries its spans in seconds ('fetch', 'parse', 'scan',
+# 'accessibility', 'mobile', 'resources', 'css', 'links', 'ai', plus 'history', 'charts'
+# and 'pdf' in the UI); the histograms are served on AUDITAI_METRICS_PORT and/or
+# written to AUDITAI_METRICS_FILE (e.g. for node_exporter's textfile collector).
+
+METRICS_FILE = setting("AUDITAI_METRICS_FILE", "")
+METRICS_PORT = setting("AUDITAI_METRICS_PORT", 0)  # 0 = no endpoint
+
+# Measure peak Python memory per audit with tracemalloc (slows audits down)
+TRACE_MEMORY = setting("AUDITAI_TRACE_MEMORY", False)
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Audit stage name -> span name
+STAGE_SPANS = {
+    'document': 'fetch',
+    'analysis': 'analysis',
+    'scan': 'scan',
+    'accessibility_data': 'accessibility',
+    'mobile': 'mobile',
+    'resource_data': 'resources',
+    'css_data': 'css',
+    'link_data': 'links',
+    'ai_report': 'ai',
+    'saved': 'history',
+    'trend': 'charts',
+    'pdf': 'pdf',
+}
+
+_current = ContextVar('auditai_spans', default=None)
+
+def add_span(name, seconds, spans=None):
+    """Adds seconds to a span of spans, or of the spans being collected; repeated spans add up"""
+    spans = _current.get() if spans is None else spans
+    if spans is not None:
+        spans[name] = round(spans.get(name, 0) + seconds, 4)
+
+@contextmanager
+def span(name, spans=None):
+    """Times the block as span `name` (see add_span)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_span(name, time.perf_counter() - start, spans)
+
+@contextmanager
+def collect_spans():
+    """Collects the spans recorded in this context (not in threads it starts) into a dict"""
+    spans = {}
+    token = _current.set(spans)
+    try:
+        yield spans
+    finally:
+        _current.reset(token)
+
+def stage_spans(report, document=None, spans=None, idle=()):
+    """
+    Spans of an audit from its stage report (stage name -> status and elapsed)
+    The fetch stage is split into fetch and parse using the document's timings;
+    spans already present (e.g. from the process-pool analysis) take precedence.
+    Stages in idle only stand in for work that was turned off and get no span
+    """
+    spans = dict(spans or {})
+    if document is not None and 'fetch' in document.timings:
+        spans.setdefault('fetch', round(document.timings['fetch'], 4))
+        if document.parse_time:
+            spans.setdefault('parse', round(document.parse_time, 4))
+    for stage, info in report.items():
+        name = STAGE_SPANS.get(stage)
+        if name and name not in spans and stage not in idle and info['status'] not in ('skipped', 'cancelled'):
+            spans[name] = info['elapsed']
+    return spans
+
+_tracked = 0
+_started_tracing = False
+_tracked_lock = threading.Lock()
+
+@contextmanager
+def track_memory():
+    """
+    Yields a dict whose peak_mb is set, when the block ends, to the peak Python
+    memory allocated during it above what was allocated at its start (None unless
+    AUDITAI_TRACE_MEMORY is on). The tracemalloc peak is process-wide: it is reset
+    when a block starts while no other is tracked (also if the caller was already
+    tracing), and not again until all overlapping blocks have ended, so each of them
+    reports the peak since the first one started, an upper bound of its own. Work
+    done in other processes is not counted. Tracing started here stops with the
+    last block; a trace started by the caller keeps running
+    """
+    global _tracked, _started_tracing
+    usage = {'peak_mb': None}
+    if not TRACE_MEMORY:
+        yield usage
+        return
+    with _tracked_lock:
+        if not _tracked:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                _started_tracing = True
+            tracemalloc.reset_peak()
+        _tracked += 1
+        baseline = tracemalloc.get_traced_memory()[0]
+    try:
+        yield usage
+    finally:
+        with _tracked_lock:
+            peak = tracemalloc.get_traced_memory()[1]
+            _tracked -= 1
+            if not _tracked and _started_tracing:
+                tracemalloc.stop()
+                _started_tracing = False
+        usage['peak_mb'] = round(max(0, peak - baseline) / (1024 * 1024), 3)
+
+class Histogram:
+    """Cumulative latency histogram in the Prometheus layout"""
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+        self.total += seconds
+        self.count += 1
+
+class MetricsRegistry:
+    """Thread-safe span histograms, audit and stage failure counters"""
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.spans = {}
+        self.audits = {}      # outcome -> count
+        self.failures = {}    # (span, status) -> count
+        self.lock = threading.Lock()
+
+    def observe(self, name, seconds):
+        with self.lock:
+            if name not in self.spans:
+                self.spans[name] = Histogram(self.buckets)
+            self.spans[name].observe(seconds)
+
+    def record_audit(self, spans, report=None, outcome='ok'):
+        for name, seconds in spans.items():
+            self.observe(name, seconds)
+        with self.lock:
+            self.audits[outcome] = self.audits.get(outcome, 0) + 1
+            for stage, info in (report or {}).items():
+                if info['status'] in ('error', 'timeout'):
+                    key = (STAGE_SPANS.get(stage, stage), info['status'])
+                    self.failures[key] = self.failures.get(key, 0) + 1
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = [
+            "# HELP auditai_span_seconds Time spent in each part of an audit",
+            "# TYPE auditai_span_seconds histogram",
+        ]
+        with self.lock:
+            for name in sorted(self.spans):
+                histogram = self.spans[name]
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f'auditai_span_seconds_bucket{{span="{name}",le="{bound}"}} {count}')
+                lines.append(f'auditai_span_seconds_bucket{{span="{name}",le="+Inf"}} {histogram.count}')
+                lines.append(f'auditai_span_seconds_sum{{span="{name}"}} {round(histogram.total, 6)}')
+                lines.append(f'auditai_span_seconds_count{{span="{name}"}} {histogram.count}')
+
+            lines += ["# HELP auditai_audits_total Audits run, by outcome",
+                      "# TYPE auditai_audits_total counter"]
+            for outcome in sorted(self.audits):
+                lines.append(f'auditai_audits_total{{outcome="{outcome}"}} {self.audits[outcome]}')
+
+            lines += ["# HELP auditai_stage_failures_total Audit stages that failed or timed out",
+                      "# TYPE auditai_stage_failures_total counter"]
+            for (name, status) in sorted(self.failures):
+                lines.append(f'auditai_stage_failures_total{{span="{name}",status="{status}"}} '
+                             f'{self.failures[(name, status)]}')
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+def record_audit(spans, report=None, outcome='ok'):
+    """Adds one audit's spans and stage failures to the histograms (and the metrics file, if set)"""
+    REGISTRY.record_audit(spans, report, outcome)
+    if METRICS_FILE:
+        write_metrics(METRICS_FILE)
+
+_write_lock = threading.Lock()
+
+def write_metrics(path=None):
+    """Writes the metrics to a file atomically, so scrapers never read a partial file"""
+    path = path or METRICS_FILE
+    directory = os.path.dirname(os.path.abspath(path))
+    with _write_lock:
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".metrics_", suffix=".prom")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(REGISTRY.render())
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+def serve_metrics(port=None, host="127.0.0.1"):
+    """
+    Serves the metrics on http://host:port/metrics from a background thread
+    Returns the server (call shutdown() to stop it), or None if no port is set or
+    the port is taken (a warning is printed instead of failing the caller's startup)
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    port = METRICS_PORT if port is None else port
+    if not port:
+        return None
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = REGISTRY.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer((host, port), Handler)
+    except OSError as e:
+        print(f"⚠️ Metrics endpoint not started on {host}:{port}: {e}", file=sys.stderr)
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
@@ -1,15 +1,67 @@
-from bs4 import BeautifulSoup
+from document import as_document
 
-def check_mobile_responsiveness(soup, page_size_mb):
+def page_weight_issue(page_size_mb):
+    """(issue, penalty) for a page weighing page_size_mb, or (None, 0) if it is light enough"""
+    if page_size_mb > 3:
+        return f"❌ Page size ({page_size_mb:.2f}MB) too large for mobile - should be <3MB", 15
+    if page_size_mb > 1.5:
+        return f"⚠️ Page size ({page_size_mb:.2f}MB) could be optimized for mobile", 5
+    return None, 0
+
+def css_issues(css_data):
+    """(issues, penalty) of the checks answered by the page's CSS index (see css_analyzer)"""
+    issues = []
+    penalty = 0
+    if css_data['small_touch_targets'] > 0:
+        issues.append(f"⚠️ {css_data['small_touch_targets']} elements may have small touch targets")
+        penalty += 10
+
+    # Only judge media queries when some CSS was actually read
+    if css_data['sheets_parsed'] and not css_data['responsive']:
+        issues.append("⚠️ No responsive media queries detected in stylesheets")
+        penalty += 10
+
+    if not css_data['relative_font_sizes']:
+        issues.append("⚠️ Consider using relative font sizes (em, rem, %) for better mobile scaling")
+        penalty += 5
+    elif css_data['small_font_sizes']:
+        issues.append(f"⚠️ {css_data['small_font_sizes']} CSS rules set font sizes too small to read on mobile")
+        penalty += 5
+    return issues, penalty
+
+def add_css_checks(mobile_data, css_data):
+    """Mobile result with the CSS checks applied, for results computed with css_data=None"""
+    issues = [issue for issue in mobile_data['mobile_issues'] if not issue.startswith("✅")]
+    css_found, penalty = css_issues(css_data)
+    return dict(mobile_data, **_mobile_result(mobile_data['mobile_score'] - penalty, issues + css_found))
+
+def add_page_weight(mobile_data, page_weight_mb):
+    """
+    Mobile result with the page weight check applied, for results computed with
+    page_size_mb=None (e.g. before the page's subresources were sized)
+    """
+    issues = [issue for issue in mobile_data['mobile_issues'] if not issue.startswith("✅")]
+    score = mobile_data['mobile_score']
+    issue, penalty = page_weight_issue(page_weight_mb)
+    if issue:
+        issues.append(issue)
+        score -= penalty
+    return dict(mobile_data, **_mobile_result(score, issues), page_weight_mb=round(page_weight_mb, 3))
+
+def check_mobile_responsiveness(page, page_size_mb=None, css_data=None):
     """
     Checks mobile-friendliness and responsive design
+    Accepts a PageDocument or a BeautifulSoup tree; page_size_mb should be the full
+    page weight and css_data the page's CSS index from css_analyzer. Pass None to
+    leave those checks out and apply them later with add_page_weight / add_css_checks
     Returns dict with mobile issues and score
     """
+    index = as_document(page).index
     issues = []
     score = 100
     
     # Check viewport meta tag
-    viewport = soup.find('meta', attrs={'name': 'viewport'})
+    viewport = index.find_by_attr('meta', 'name', 'viewport')
     if not viewport:
         issues.append("❌ Missing viewport meta tag - critical for mobile devices")
         score -= 25
@@ -23,65 +75,43 @@ def check_mobile_responsiveness(soup, page_size_mb):
             score -= 5
     
     # Check for responsive images
-    images = soup.find_all('img')
+    images = index.find_all('img')
     responsive_images = [img for img in images if img.get('srcset') or img.get('sizes')]
     if images and len(responsive_images) == 0:
         issues.append("⚠️ No responsive images detected (consider using srcset)")
         score -= 10
     
     # Check page size for mobile
-    if page_size_mb > 3:
-        issues.append(f"❌ Page size ({page_size_mb:.2f}MB) too large for mobile - should be <3MB")
-        score -= 15
-    elif page_size_mb > 1.5:
-        issues.append(f"⚠️ Page size ({page_size_mb:.2f}MB) could be optimized for mobile")
-        score -= 5
+    if page_size_mb is not None:
+        issue, penalty = page_weight_issue(page_size_mb)
+        if issue:
+            issues.append(issue)
+            score -= penalty
     
     # Check for mobile-unfriendly elements
-    flash = soup.find_all(['embed', 'object'], type='application/x-shockwave-flash')
+    flash = [elem for elem in index.by_attr_value('type', 'application/x-shockwave-flash')
+             if elem.name in ('embed', 'object')]
     if flash:
         issues.append("❌ Flash content detected - not supported on mobile devices")
         score -= 20
     
     # Check for fixed width elements
-    tables = soup.find_all('table')
+    tables = index.find_all('table')
     for table in tables:
         if table.get('width') and 'px' in str(table.get('width')):
             issues.append("⚠️ Fixed-width tables detected - may not be mobile-friendly")
             score -= 5
             break
     
-    # Check for touch-friendly elements
-    buttons = soup.find_all('button')
-    links = soup.find_all('a')
-    small_touch_targets = 0
-    for elem in buttons + links:
-        style = elem.get('style', '')
-        if 'font-size' in style and any(size in style for size in ['8px', '9px', '10px']):
-            small_touch_targets += 1
-    
-    if small_touch_targets > 0:
-        issues.append(f"⚠️ {small_touch_targets} elements may have small touch targets")
-        score -= 10
-    
-    # Check for media queries in stylesheets
-    styles = soup.find_all('style')
-    links_css = soup.find_all('link', rel='stylesheet')
-    has_media_queries = False
-    for style in styles:
-        if '@media' in style.get_text():
-            has_media_queries = True
-            break
-    
-    if not has_media_queries and len(styles) > 0:
-        issues.append("⚠️ No media queries detected in inline styles")
-        score -= 10
-    
-    # Check font sizes
-    if not soup.find_all(style=lambda x: x and 'font-size' in x and any(unit in x for unit in ['em', 'rem', '%'])):
-        issues.append("⚠️ Consider using relative font sizes (em, rem, %) for better mobile scaling")
-        score -= 5
+    # Media queries, touch target and font sizes from the CSS index
+    if css_data is not None:
+        css_found, penalty = css_issues(css_data)
+        issues += css_found
+        score -= penalty
     
+    return _mobile_result(score, issues)
+
+def _mobile_result(score, issues):
     return {
         'mobile_score': max(0, score),
         'mobile_issues': issues if issues else ["✅ Good mobile responsiveness"],
@@ -0,0 +1,56 @@
+import sqlite3
+from config import setting
+from disk_cache import DiskCache
+from utils import canonicalize_url
+
+# Last audit of each page, keyed by canonical URL: HTTP validators (ETag,
+# Last-Modified), a hash of the body and the results, so an unchanged page
+# can be re-audited with one conditional request
+PAGE_CACHE_PATH = setting("AUDITAI_PAGE_CACHE", "page_cache.db")
+PAGE_CACHE_MAX_ENTRIES = setting("AUDITAI_PAGE_CACHE_MAX", 20000)
+PAGE_CACHE_TTL = setting("AUDITAI_PAGE_CACHE_TTL", 30 * 24 * 3600)
+
+_page_cache = None
+
+def get_page_cache():
+    """Shared on-disk page cache, opened on first use"""
+    global _page_cache
+    if _page_cache is None:
+        _page_cache = DiskCache(PAGE_CACHE_PATH, max_entries=PAGE_CACHE_MAX_ENTRIES)
+    return _page_cache
+
+def previous_audit(url):
+    """Cached entry for the page's last audit, or None"""
+    try:
+        return get_page_cache().get(canonicalize_url(url))
+    except sqlite3.Error:
+        return None
+
+def conditional_headers(entry):
+    """If-None-Match / If-Modified-Since headers from a cached entry"""
+    headers = {}
+    if entry and entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry and entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+def is_unchanged(entry, document):
+    """True if the fetched document is the page cached in entry (304, or same body)"""
+    if not entry:
+        return False
+    return document.not_modified or document.content_hash == entry['content_hash']
+
+def remember_audit(document, results, parse_time=0):
+    """Stores the page's validators, body hash, parse time and audit results"""
+    entry = {
+        'etag': document.headers.get('ETag'),
+        'last_modified': document.headers.get('Last-Modified'),
+        'content_hash': document.content_hash,
+        'parse_time': parse_time,
+        'results': results
+    }
+    try:
+        get_page_cache().set(canonicalize_url(document.url), entry, PAGE_CACHE_TTL)
+    except sqlite3.Error:
+        pass
@@ -0,0 +1,237 @@
+from html.parser import HTMLParser
+from importlib.util import find_spec
+from bs4 import BeautifulSoup, Tag
+from bs4.builder import HTMLTreeBuilder
+from dom_index import TagIndex
+from config import setting
+
+# Parser backends, fastest last. "html.parser" needs nothing beyond BeautifulSoup;
+# "stream" is a lightweight tree fed chunk by chunk while the page downloads.
+PARSER_BACKENDS = ('html.parser', 'stream', 'lxml', 'selectolax')
+DEFAULT_PARSER = 'html.parser'
+
+_parser_backend = setting("AUDITAI_PARSER", DEFAULT_PARSER)
+
+def _installed(module):
+    # Checks without importing, so configuring a backend costs no import time
+    try:
+        return find_spec(module) is not None
+    except ImportError:
+        return False
+
+def available_backends():
+    """Parser backends that can be used in this environment"""
+    backends = ['html.parser', 'stream']
+    if _installed('lxml'):
+        backends.append('lxml')
+    if _installed('selectolax.lexbor'):
+        backends.append('selectolax')
+    return backends
+
+def set_parser_backend(name):
+    """Selects the parser backend used by the scanner and every checker"""
+    global _parser_backend
+    if name not in PARSER_BACKENDS:
+        raise ValueError(f"Unknown parser backend '{name}', expected one of {PARSER_BACKENDS}")
+    if name not in available_backends():
+        raise ValueError(f"Parser backend '{name}' is not installed")
+    _parser_backend = name
+
+def get_parser_backend():
+    """Configured parser backend, falling back to html.parser if it is not installed"""
+    if _parser_backend in available_backends():
+        return _parser_backend
+    return DEFAULT_PARSER
+
+def parse_html(text, backend=None):
+    """
+    Parses HTML with the given (or configured) backend
+    Returns a BeautifulSoup tree, a StreamElement root for the stream backend,
+    or a LexborHTMLParser for the selectolax backend
+    """
+    backend = backend or get_parser_backend()
+    if backend == 'stream':
+        builder = StreamTreeBuilder()
+        builder.feed(text)
+        return builder.close()
+    if backend == 'selectolax':
+        from selectolax.lexbor import LexborHTMLParser
+        return LexborHTMLParser(text)
+    return BeautifulSoup(text, backend)
+
+def build_index(tree):
+    """Builds the shared TagIndex from a tree returned by parse_html"""
+    if isinstance(tree, Tag):
+        return TagIndex(tree)
+    if isinstance(tree, StreamElement):
+        return TagIndex(tree, children=_stream_children)
+    return TagIndex(tree, children=_selectolax_children)
+
+def _multi_valued(name):
+    # Attributes BeautifulSoup splits into lists, e.g. class and rel
+    list_attrs = HTMLTreeBuilder.DEFAULT_CDATA_LIST_ATTRIBUTES
+    return list_attrs['*'] | list_attrs.get(name, set())
+
+def _selectolax_children(node):
+    if isinstance(node, SelectolaxElement):
+        nodes = node.node.iter(include_text=False)
+    else:
+        nodes = [node.root] if node.root is not None else []
+    return [SelectolaxElement(child) for child in nodes if child.tag[0] not in '-!_#']
+
+class SelectolaxElement:
+    """
+    Read-only view of a selectolax node with the subset of the BeautifulSoup Tag
+    API used by the checkers (name, get, [], get_text, string)
+    """
+    __slots__ = ('node', 'name', 'attrs')
+
+    def __init__(self, node):
+        self.node = node
+        self.name = node.tag
+        self.attrs = self._convert_attrs(node)
+
+    def _convert_attrs(self, node):
+        # Match BeautifulSoup: valueless attributes are '', multi-valued ones are lists
+        multi = _multi_valued(self.name)
+        attrs = {}
+        for key, value in node.attributes.items():
+            value = value if value is not None else ''
+            if key in multi:
+                value = value.split()
+            attrs[key] = value
+        return attrs
+
+    def get(self, key, default=None):
+        return self.attrs.get(key, default)
+
+    def __getitem__(self, key):
+        return self.attrs[key]
+
+    def get_text(self):
+        # Like Tag.get_text(), skip script/style text nested inside other elements
+        parts = []
+        stack = [iter(self.node.iter(include_text=True))]
+        while stack:
+            for child in stack[-1]:
+                if child.tag == '-text':
+                    parts.append(child.text_content)
+                elif child.tag[0] not in '-!_#' and child.tag not in ('script', 'style', 'template'):
+                    stack.append(iter(child.iter(include_text=True)))
+                    break
+            else:
+                stack.pop()
+        return ''.join(parts)
+
+    @property
+    def string(self):
+        children = list(self.node.iter(include_text=True))
+        if len(children) != 1:
+            return None
+        child = children[0]
+        if child.tag == '-text':
+            return child.text_content
+        if child.tag[0] in '-!_#':
+            return None
+        return SelectolaxElement(child).string
+
+def _stream_children(node):
+    return [child for child in node.children if isinstance(child, StreamElement)]
+
+class StreamElement:
+    """
+    Element of the stream backend's tree, with the subset of the BeautifulSoup
+    Tag API used by the checkers (name, get, [], get_text, string)
+    Children are StreamElements and text strings
+    """
+    __slots__ = ('name', 'attrs', 'children')
+
+    def __init__(self, name, attrs=None):
+        self.name = name
+        self.attrs = attrs or {}
+        self.children = []
+
+    def get(self, key, default=None):
+        return self.attrs.get(key, default)
+
+    def __getitem__(self, key):
+        return self.attrs[key]
+
+    def get_text(self):
+        # Like Tag.get_text(), skip script/style text nested inside other elements
+        parts = []
+        stack = [iter(self.children)]
+        while stack:
+            for child in stack[-1]:
+                if isinstance(child, str):
+                    parts.append(child)
+                elif child.name not in ('script', 'style', 'template'):
+                    stack.append(iter(child.children))
+                    break
+            else:
+                stack.pop()
+        return ''.join(parts)
+
+    @property
+    def string(self):
+        if len(self.children) != 1:
+            return None
+        child = self.children[0]
+        return child if isinstance(child, str) else child.string
+
+class StreamTreeBuilder(HTMLParser):
+    """
+    Builds a StreamElement tree incrementally: feed() decoded chunks as they
+    arrive, close() returns the root. Only elements, attributes and text are
+    kept (no comments, doctype or source positions), and unclosed p/li/option/
+    table cells are closed when a sibling opens, as browsers do
+    """
+    VOID_ELEMENTS = frozenset(('area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link',
+                               'meta', 'param', 'source', 'track', 'wbr'))
+    # Tag -> open tags it implicitly closes
+    IMPLIED_END = {
+        'p': ('p',), 'li': ('li',), 'option': ('option',), 'dt': ('dt', 'dd'), 'dd': ('dt', 'dd'),
+        'tr': ('tr', 'td', 'th'), 'td': ('td', 'th'), 'th': ('td', 'th'),
+    }
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = StreamElement('[document]')
+        self.open = [self.root]
+
+    def handle_starttag(self, tag, attrs):
+        implied = self.IMPLIED_END.get(tag)
+        if implied and self.open[-1].name in implied:
+            self.open.pop()
+        multi = _multi_valued(tag)
+        converted = {}
+        for key, value in attrs:
+            value = value if value is not None else ''
+            converted[key] = value.split() if key in multi else value
+        element = StreamElement(tag, converted)
+        self.open[-1].children.append(element)
+        if tag not in self.VOID_ELEMENTS:
+            self.open.append(element)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in self.VOID_ELEMENTS:
+            self.open.pop()
+
+    def handle_endtag(self, tag):
+        # Close up to the matching open element; stray end tags are ignored
+        for depth in range(len(self.open) - 1, 0, -1):
+            if self.open[depth].name == tag:
+                del self.open[depth:]
+                return
+
+    def handle_data(self, data):
+        children = self.open[-1].children
+        if children and isinstance(children[-1], str):
+            children[-1] += data  # text split across feed() chunks
+        else:
+            children.append(data)
+
+    def close(self):
+        super().close()
+        return self.root
@@ -0,0 +1,300 @@
+from document import fetch_document
+from scanner import scan_website, page_timings
+from accessibility_checker import check_accessibility
+from mobile_checker import check_mobile_responsiveness, add_css_checks, add_page_weight
+from css_analyzer import collect_styles, analyze_css
+from link_checker import check_link_urls
+from resource_analyzer import collect_resources, analyze_resources, html_only_resource_data
+from scoring import add_category_scores
+from stages import Stage, run_stages
+from page_cache import previous_audit, conditional_headers, is_unchanged, remember_audit
+from metrics import add_span, collect_spans, record_audit, span, stage_spans, track_memory
+
+# Headless audit pipeline shared by the batch runner and other non-UI entry points
+
+def analyze_document(document):
+    """
+    CPU-bound part of an audit: parse, scan, accessibility and mobile checks, scores
+    Takes and returns only picklable data so it can run in a process pool
+    Returns dict with scan_data, accessibility_data, mobile_data (both before the
+    page weight and linked CSS are known), the page's hrefs, subresources and styles,
+    and the spans of each step
+    """
+    with collect_spans() as spans:
+        with span('parse'):
+            document.index
+        with span('scan'):
+            scan_data = scan_website(document.url, document)
+        if "error" in scan_data:
+            return {'scan_data': scan_data, 'spans': spans}
+
+        with span('accessibility'):
+            accessibility_data = check_accessibility(document, document.url)
+        with span('mobile'):
+            mobile_data = check_mobile_responsiveness(document)
+        add_category_scores(scan_data)
+
+    return {
+        'scan_data': scan_data,
+        'accessibility_data': accessibility_data,
+        'mobile_data': mobile_data,
+        'hrefs': page_hrefs(document),
+        'resources': collect_resources(document),
+        'styles': collect_styles(document),
+        'spans': spans
+    }
+
+def page_hrefs(document):
+    """hrefs of the page's links, in document order"""
+    return [link.get('href') for link in document.index.with_attr('href', 'a')]
+
+def skipped_link_data():
+    """Link result used when link checking is turned off"""
+    return {'total_links_checked': 0, 'working_links': 0, 'broken_links_count': 0,
+            'broken_links_details': [], 'unchecked_links_count': 0, 'link_health': 'Skipped'}
+
+def unavailable_link_data():
+    """Link result used when link checking failed or ran out of time"""
+    return dict(skipped_link_data(), link_health='Unavailable')
+
+# Seconds before a stage is given up on, on top of the fetch, link-check, sizing and
+# stylesheet time limits of their own; a timed-out link check, resource sizing, CSS
+# analysis or AI call falls back to a default result
+STAGE_TIMEOUTS = {'document': 60, 'resource_data': 60, 'css_data': 60, 'link_data': 120, 'ai_report': 180}
+
+def _fetch_stage(url, parse, document=None):
+    def fetch():
+        page = document or fetch_document(url, parse=parse)
+        if page is None:
+            raise ConnectionError("Unable to fetch URL")
+        if parse:
+            # Build the index up front, so the parallel checks only read it
+            page.index
+        return page
+    return fetch
+
+def _scan_stage(document):
+    scan_data = scan_website(document.url, document)
+    if "error" in scan_data:
+        raise ValueError(scan_data['error'])
+    return add_category_scores(scan_data)
+
+def _analysis_result(key):
+    def extract(analysis):
+        if "error" in analysis['scan_data']:
+            raise ValueError(analysis['scan_data']['error'])
+        return analysis[key]
+    return extract
+
+def _ai_stage(scan):
+    from ai_analyzer import analyze_with_ai
+    return analyze_with_ai(scan)
+
+def _ai_fallback(scan):
+    from ai_analyzer import fallback_report
+    return fallback_report(scan)
+
+def weigh_scan(scan, resource_data):
+    """Scan data with the full page weight added and the scores depending on it updated"""
+    scan_data = dict(scan, page_weight_mb=resource_data['total_mb'], resource_count=resource_data['resource_count'])
+    return add_category_scores(scan_data)
+
+def audit_stages(url, check_links=True, use_ai=False, executor=None, document=None):
+    """
+    Stage graph of one audit; stage names match the keys of the audit result
+    Once the page is fetched, the scan, accessibility and mobile checks, the link
+    check, the subresource sizing and the stylesheet analysis run in parallel, and
+    the AI analysis starts as soon as the scan is done. 'scan' and 'mobile' are the
+    results before the page weight is known; 'scan_data' and 'mobile_data' add it
+    once the subresources are sized ('mobile_data' also adds the CSS checks). With a process executor the CPU-bound analysis runs
+    there as one stage. Pass an already fetched document to skip the fetch.
+    """
+    document = Stage('document', _fetch_stage(url, executor is None, document),
+                     timeout=STAGE_TIMEOUTS['document'])
+    if executor is None:
+        stages = [
+            document,
+            Stage('scan', _scan_stage, ['document']),
+            Stage('accessibility_data', lambda document: check_accessibility(document, document.url), ['document']),
+            Stage('mobile', lambda document: check_mobile_responsiveness(document), ['document']),
+            Stage('hrefs', page_hrefs, ['document']),
+            Stage('resources', lambda document: collect_resources(document), ['document']),
+            Stage('styles', lambda document: collect_styles(document), ['document']),
+        ]
+    else:
+        stages = [
+            document,
+            Stage('analysis', analyze_document, ['document'], kind='process'),
+            Stage('scan', _analysis_result('scan_data'), ['analysis']),
+            Stage('accessibility_data', _analysis_result('accessibility_data'), ['analysis']),
+            Stage('mobile', _analysis_result('mobile_data'), ['analysis']),
+            Stage('hrefs', _analysis_result('hrefs'), ['analysis']),
+            Stage('resources', _analysis_result('resources'), ['analysis']),
+            Stage('styles', _analysis_result('styles'), ['analysis']),
+        ]
+
+    stages += [
+        Stage('resource_data', lambda document, resources: analyze_resources(url, resources, document.size),
+              ['document', 'resources'], timeout=STAGE_TIMEOUTS['resource_data'],
+              fallback=lambda document, resources: html_only_resource_data(document.size, resources)),
+        Stage('css_data', lambda styles: analyze_css(url, styles), ['styles'],
+              timeout=STAGE_TIMEOUTS['css_data'], fallback=lambda styles: analyze_css(url, styles, fetch=False)),
+        Stage('scan_data', weigh_scan, ['scan', 'resource_data']),
+        Stage('mobile_data', lambda mobile, css_data, resource_data:
+              add_page_weight(add_css_checks(mobile, css_data), resource_data['total_mb']),
+              ['mobile', 'css_data', 'resource_data']),
+    ]
+
+    if check_links:
+        stages.append(Stage('link_data', lambda hrefs: check_link_urls(url, hrefs), ['hrefs'],
+                            timeout=STAGE_TIMEOUTS['link_data'], fallback=lambda hrefs: unavailable_link_data()))
+    else:
+        stages.append(Stage('link_data', skipped_link_data))
+    if use_ai:
+        stages.append(Stage('ai_report', _ai_stage, ['scan'],
+                            timeout=STAGE_TIMEOUTS['ai_report'], fallback=_ai_fallback))
+    else:
+        stages.append(Stage('ai_report', lambda: None))
+    return stages
+
+def idle_stages(check_links=True, use_ai=False):
+    """Stages of audit_stages() that only fill in a placeholder result, as the work is turned off"""
+    return tuple(name for name, off in (('link_data', not check_links), ('ai_report', not use_ai)) if off)
+
+def _reusable_ai_report(ai_report):
+    # Fallback reports are never reused, so the next audit asks the model again
+    return ai_report if ai_report and not ai_report.get('fallback') else None
+
+def reuse_audit(url, previous, document, check_links=True, use_ai=False, include_hrefs=False):
+    """
+    Audit result for a page unchanged since its last audit
+    Reuses the previous checker, score, page weight, CSS and AI results and refreshes
+    only the load time, network timings and the scores depending on them; links are
+    re-checked from the stored hrefs (normally straight from the link-status cache)
+    """
+    results = previous['results']
+    scan_data = dict(results['scan_data'])
+    scan_data['load_time'] = round(document.timings['fetch'], 2)
+    scan_data['timings'] = page_timings(document, previous.get('parse_time', 0))
+    scan_data.pop('timings_p95', None)
+    add_category_scores(scan_data)
+
+    with collect_spans() as spans:
+        add_span('fetch', document.timings['fetch'])
+        if check_links:
+            with span('links'):
+                link_data = check_link_urls(url, results['hrefs'])
+        else:
+            link_data = skipped_link_data()
+        ai_report = None
+        if use_ai:
+            with span('ai'):
+                ai_report = _reusable_ai_report(results.get('ai_report')) or _ai_stage(scan_data)
+
+    if not document.not_modified:
+        # Same body under new validators: store them so the next check can get a 304
+        stored_ai = _reusable_ai_report(ai_report) or _reusable_ai_report(results.get('ai_report'))
+        remember_audit(document, dict(results, ai_report=stored_ai), previous.get('parse_time', 0))
+
+    result = {
+        'url': url,
+        'scan_data': scan_data,
+        'accessibility_data': results['accessibility_data'],
+        'mobile_data': results['mobile_data'],
+        'resource_data': results.get('resource_data'),
+        'css_data': results.get('css_data'),
+        'link_data': link_data,
+        'ai_report': ai_report,
+        'unchanged': True,
+        'stages': {'document': {'status': 'ok', 'elapsed': round(document.timings['fetch'], 3)}},
+        'spans': spans
+    }
+    if include_hrefs:
+        result['hrefs'] = results['hrefs']
+    return result
+
+def _audit_error(report):
+    # Error message of an audit whose fetch or checks did not finish, else None
+    if any(stage['status'] == 'cancelled' for stage in report.values()):
+        return "Audit cancelled"
+    if report['document']['status'] != 'ok':
+        return "Unable to fetch URL"
+    for name in ('scan', 'accessibility_data', 'mobile', 'scan_data', 'mobile_data'):
+        if report[name]['status'] != 'ok':
+            failed = report.get('analysis', report[name])
+            return failed.get('error', report[name].get('error', failed['status']))
+    return None
+
+def body_memory(document):
+    """Memory report of an audit's page body: size read in MB and whether it was truncated"""
+    return {'body_mb': round(document.page_size_mb, 3), 'truncated': document.truncated}
+
+def run_audit(url, check_links=True, use_ai=False, executor=None, include_hrefs=False, cancel_event=None,
+              incremental=False, on_stage=None):
+    """
+    Audits one URL without the UI, running independent stages in parallel
+    CPU-bound analysis runs in executor (e.g. a ProcessPoolExecutor) when given;
+    setting cancel_event stops the audit, and on_stage(name, status, value, elapsed)
+    is called as each stage finishes
+    With incremental, the page is fetched conditionally (ETag/Last-Modified) and, if
+    it has not changed since its last audit, the previous results are reused
+    Returns dict with url, scan_data, accessibility_data, mobile_data, resource_data,
+    css_data, link_data, ai_report, per-stage status/timings, timing spans and memory (body size,
+    truncation and, with AUDITAI_TRACE_MEMORY, the peak) (plus the page's hrefs if
+    include_hrefs, and unchanged=True for reused results), or url and error if the
+    page could not be audited; spans also feed the metrics histograms
+    """
+    with track_memory() as usage:
+        result = _run_audit(url, check_links, use_ai, executor, include_hrefs, cancel_event, incremental, on_stage)
+    if 'memory' in result:
+        result['memory']['peak_mb'] = usage['peak_mb']
+    return result
+
+def _run_audit(url, check_links, use_ai, executor, include_hrefs, cancel_event, incremental, on_stage):
+    document = previous = None
+    if incremental:
+        previous = previous_audit(url)
+        document = fetch_document(url, parse=False, headers=conditional_headers(previous))
+        if document is not None and document.not_modified and not previous:
+            document = fetch_document(url, parse=False)
+        if document is None:
+            record_audit({}, outcome='error')
+            return {'url': url, 'error': "Unable to fetch URL"}
+        if is_unchanged(previous, document):
+            result = reuse_audit(url, previous, document, check_links, use_ai, include_hrefs)
+            result['memory'] = body_memory(document)
+            record_audit(result['spans'], result['stages'], 'unchanged')
+            return result
+
+    results, report = run_stages(audit_stages(url, check_links, use_ai, executor, document),
+                                 process_executor=executor, cancel_event=cancel_event, on_stage=on_stage)
+    spans = stage_spans(report, results.get('document'), (results.get('analysis') or {}).get('spans'),
+                        idle_stages(check_links, use_ai))
+
+    error = _audit_error(report)
+    if error:
+        record_audit(spans, report, 'error')
+        return {'url': url, 'error': error}
+
+    result = {
+        'url': url,
+        'scan_data': results['scan_data'],
+        'accessibility_data': results['accessibility_data'],
+        'mobile_data': results['mobile_data'],
+        'resource_data': results['resource_data'],
+        'css_data': results['css_data'],
+        'link_data': results['link_data'],
+        'ai_report': results['ai_report'],
+        'stages': report,
+        'spans': spans,
+        'memory': body_memory(results['document'])
+    }
+    record_audit(spans, report)
+    if incremental:
+        stored = {name: results[name] for name in
+                  ('scan_data', 'accessibility_data', 'mobile_data', 'resource_data', 'css_data', 'hrefs')}
+        stored['ai_report'] = _reusable_ai_report(results['ai_report'])
+        remember_audit(document, stored, results['scan_data']['timings']['parse'])
+    if include_hrefs:
+        result['hrefs'] = results['hrefs']
+    return result
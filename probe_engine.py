@@ -0,0 +1,59 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+def _run(coro):
+    # Run the coroutine to completion from sync code, even if a loop is already running here
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+async def _probe_all(urls, probe, max_concurrency, per_host_limit, time_budget):
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=max_concurrency)
+    total_limit = asyncio.Semaphore(max_concurrency)
+    host_limits = {}
+    results = {}
+
+    async def probe_one(url):
+        host = urlsplit(url).netloc
+        if host not in host_limits:
+            host_limits[host] = asyncio.Semaphore(per_host_limit)
+        async with host_limits[host]:
+            async with total_limit:
+                results[url] = await loop.run_in_executor(executor, probe, url)
+
+    tasks = [asyncio.ensure_future(probe_one(url)) for url in urls]
+    try:
+        if tasks:
+            done, pending = await asyncio.wait(tasks, timeout=time_budget)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+    finally:
+        # Drop queued probes; in-flight ones finish on their own request timeout
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return results
+
+def probe_urls(urls, probe, max_concurrency=32, per_host_limit=8, time_budget=None):
+    """
+    Runs a blocking probe(url) for every URL on an asyncio scheduler
+    Caps total and per-host concurrency separately and stops at time_budget seconds
+    Probes still queued then are dropped; a probe already running cannot be
+    interrupted, so it keeps its worker thread until its own request timeout and
+    its result is discarded (the URL is reported as unchecked)
+    Returns dict with results {url: probe result}, unchecked URLs and elapsed time
+    """
+    start = time.time()
+    urls = list(urls)
+    results = _run(_probe_all(urls, probe, max_concurrency, per_host_limit, time_budget))
+    return {
+        'results': results,
+        'unchecked': [url for url in urls if url not in results],
+        'elapsed': time.time() - start
+    }
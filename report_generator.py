@@ -1,26 +1,94 @@
-from fpdf import FPDF
-from datetime import datetime
+"""
+PDF audit reports
+
+Reports render in memory; generate_pdf_report writes them to a managed temp
+directory whose old files are pruned automatically. Batch mode renders reports
+for many audits (e.g. batch_audit.py output) on a process pool:
+
+    python report_generator.py audit_results.jsonl -o reports/ --processes 8
+"""
+import argparse
+import hashlib
 import json
+import os
+import re
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from config import setting
 
-class PDFReport(FPDF):
-    def header(self):
-        self.set_font('Arial', 'B', 16)
-        self.cell(0, 10, 'AuditAI - Website Audit Report', 0, 1, 'C')
-        self.set_font('Arial', 'I', 10)
-        self.cell(0, 5, f'Generated on {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}', 0, 1, 'C')
-        self.ln(5)
+# Reports for the UI live here and are removed once older than REPORT_TTL seconds
+REPORT_DIR = setting("AUDITAI_REPORT_DIR", os.path.join(tempfile.gettempdir(), "auditai_reports"))
+REPORT_TTL = setting("AUDITAI_REPORT_TTL", 3600)
 
-    def footer(self):
-        self.set_y(-15)
-        self.set_font('Arial', 'I', 8)
-        self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
+# The core PDF fonts are latin-1 only; status emojis become text markers
+_EMOJI_MARKERS = {'❌': '[X]', '⚠️': '[!]', '✅': '[OK]', 'ℹ️': '[i]'}
 
-def generate_pdf_report(url, scan_data, ai_report, accessibility_data, mobile_data, link_data):
+def _pdf_text(text):
+    text = str(text)
+    for emoji, marker in _EMOJI_MARKERS.items():
+        text = text.replace(emoji, marker)
+    return text.encode('latin-1', 'replace').decode('latin-1')
+
+_TIMING_LABELS = (('dns', 'DNS'), ('connect', 'Connect'), ('tls', 'TLS'), ('ttfb', 'TTFB'),
+                  ('download', 'Download'), ('parse', 'Parse'))
+
+def _timing_text(scan_data):
+    timings = scan_data.get('timings')
+    if not timings:
+        return 'N/A'
+    return ', '.join(f"{label} {timings.get(key, 0) * 1000:.0f}" for key, label in _TIMING_LABELS)
+
+_pdf_report_class = None
+
+def _pdf_report():
+    """PDFReport class, defined on first use so importing this module does not load fpdf"""
+    global _pdf_report_class
+    if _pdf_report_class is None:
+        from fpdf import FPDF, FPDF_VERSION
+        legacy_output = FPDF_VERSION.startswith('1.')
+
+        class PDFReport(FPDF):
+            def header(self):
+                self.set_font('Arial', 'B', 16)
+                self.cell(0, 10, 'AuditAI - Website Audit Report', 0, 1, 'C')
+                self.set_font('Arial', 'I', 10)
+                self.cell(0, 5, f'Generated on {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}', 0, 1, 'C')
+                self.ln(5)
+
+            def footer(self):
+                self.set_y(-15)
+                self.set_font('Arial', 'I', 8)
+                self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
+
+            def cell(self, w, h=0, txt='', *args, **kwargs):
+                return super().cell(w, h, _pdf_text(txt), *args, **kwargs)
+
+            def multi_cell(self, w, h, txt='', *args, **kwargs):
+                return super().multi_cell(w, h, _pdf_text(txt), *args, **kwargs)
+
+            def to_bytes(self):
+                # fpdf 1.x returns a latin-1 str for dest='S'; fpdf2 returns a bytearray
+                data = self.output(dest='S') if legacy_output else self.output()
+                return data.encode('latin-1') if isinstance(data, str) else bytes(data)
+
+        _pdf_report_class = PDFReport
+    return _pdf_report_class
+
+def __getattr__(name):
+    if name == 'PDFReport':
+        return _pdf_report()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def render_pdf_report(url, scan_data, ai_report, accessibility_data, mobile_data, link_data):
     """
-    Generates a comprehensive PDF audit report
-    Returns: PDF file path
+    Renders a comprehensive PDF audit report in memory
+    Returns: PDF bytes
     """
-    pdf = PDFReport()
+    ai_report = ai_report or {}
+    pdf = _pdf_report()()
     pdf.add_page()
     pdf.set_auto_page_break(auto=True, margin=15)
     
@@ -67,7 +135,10 @@ def generate_pdf_report(url, scan_data, ai_report, accessibility_data, mobile_da
     pdf.set_font('Arial', '', 11)
     metrics = [
         ('Load Time', f"{scan_data.get('load_time', 0)} seconds"),
+        ('Timing (ms)', _timing_text(scan_data)),
         ('Page Size', f"{scan_data.get('page_size_mb', 0):.2f} MB"),
+        ('Page Weight (all resources)', f"{scan_data['page_weight_mb']:.2f} MB"
+                                        if scan_data.get('page_weight_mb') is not None else 'N/A'),
         ('HTTPS Enabled', 'Yes' if scan_data.get('https') else 'No'),
         ('Status Code', str(scan_data.get('status_code', 'N/A'))),
         ('Total Links', str(scan_data.get('links_count', 0))),
@@ -155,9 +226,136 @@ def generate_pdf_report(url, scan_data, ai_report, accessibility_data, mobile_da
     for suggestion in ai_report.get('suggestions', [])[:20]:
         pdf.multi_cell(0, 6, f'- {suggestion}')
     
-    # Save PDF
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"audit_report_{timestamp}.pdf"
-    pdf.output(filename)
-    
-    return filename
+    return pdf.to_bytes()
+
+def _report_name(url):
+    # Readable and stable per URL, so re-rendering replaces the previous report
+    slug = re.sub(r'[^A-Za-z0-9.-]+', '_', url.split('//', 1)[-1]).strip('_')[:80]
+    return f"{slug}-{hashlib.sha1(url.encode()).hexdigest()[:8]}.pdf"
+
+def cleanup_reports(max_age=None, directory=None):
+    """Removes reports older than max_age seconds (default REPORT_TTL); returns how many"""
+    directory = directory or REPORT_DIR
+    cutoff = time.time() - (REPORT_TTL if max_age is None else max_age)
+    removed = 0
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.name.endswith('.pdf') and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+def save_pdf_report(pdf_bytes, url, directory=None):
+    """Writes a rendered report to a uniquely named file in the report directory"""
+    directory = directory or REPORT_DIR
+    os.makedirs(directory, exist_ok=True)
+    cleanup_reports(directory=directory)
+    prefix = f"audit_report_{_report_name(url)[:-4]}_"
+    with tempfile.NamedTemporaryFile('wb', suffix='.pdf', prefix=prefix, dir=directory, delete=False) as f:
+        f.write(pdf_bytes)
+    return f.name
+
+def open_pdf_report(url, scan_data, ai_report, accessibility_data, mobile_data, link_data):
+    """Report in an anonymous temporary file, deleted when the returned handle is closed"""
+    handle = tempfile.TemporaryFile(suffix='.pdf')
+    handle.write(render_pdf_report(url, scan_data, ai_report, accessibility_data, mobile_data, link_data))
+    handle.seek(0)
+    return handle
+
+def generate_pdf_report(url, scan_data, ai_report, accessibility_data, mobile_data, link_data):
+    """
+    Generates a comprehensive PDF audit report
+    Returns: path of a PDF file in REPORT_DIR, removed automatically after REPORT_TTL seconds
+    """
+    pdf_bytes = render_pdf_report(url, scan_data, ai_report, accessibility_data, mobile_data, link_data)
+    return save_pdf_report(pdf_bytes, url)
+
+def render_audit_report(audit, output_dir):
+    """Renders one audit result (as returned by run_audit) to output_dir; returns the path"""
+    pdf_bytes = render_pdf_report(audit['url'], audit['scan_data'], audit.get('ai_report'),
+                                  audit['accessibility_data'], audit['mobile_data'], audit['link_data'])
+    path = os.path.join(output_dir, _report_name(audit['url']))
+    with open(path, 'wb') as f:
+        f.write(pdf_bytes)
+    return path
+
+def render_reports(audits, output_dir, processes=None, progress=None):
+    """
+    Renders reports for many audit results on a process pool
+    Audits without results (errors) are skipped; at most 4 reports per process are
+    in flight, so any number of audits can be streamed through
+    Returns summary dict with rendered/failed/skipped counts and elapsed time
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    summary = {'rendered': 0, 'failed': 0, 'skipped': 0}
+    start = time.time()
+
+    processes = processes or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        max_in_flight = processes * 4
+        in_flight = {}
+
+        def drain(return_when):
+            finished, _ = wait(in_flight, return_when=return_when)
+            for future in finished:
+                url = in_flight.pop(future)
+                try:
+                    record = {'url': url, 'path': future.result()}
+                    summary['rendered'] += 1
+                except Exception as e:
+                    record = {'url': url, 'error': f"{type(e).__name__}: {e}"}
+                    summary['failed'] += 1
+                if progress:
+                    progress(record, summary)
+
+        for audit in audits:
+            if 'error' in audit or 'scan_data' not in audit:
+                summary['skipped'] += 1
+                continue
+            if len(in_flight) >= max_in_flight:
+                drain(FIRST_COMPLETED)
+            in_flight[pool.submit(render_audit_report, audit, output_dir)] = audit['url']
+
+        while in_flight:
+            drain(FIRST_COMPLETED)
+
+    summary['elapsed'] = round(time.time() - start, 2)
+    return summary
+
+def read_audits(source):
+    """Yields audit results from a batch_audit.py JSONL file"""
+    for line in source:
+        try:
+            yield json.loads(line)
+        except ValueError:
+            continue
+
+def main():
+    parser = argparse.ArgumentParser(description="Render PDF reports for batch audit results")
+    parser.add_argument("input", help="JSONL results from batch_audit.py, or - for stdin")
+    parser.add_argument("-o", "--output", default="reports", help="Directory to write the PDF reports to")
+    parser.add_argument("--processes", type=int, default=None, help="Rendering processes (default: CPU count)")
+    args = parser.parse_args()
+
+    def progress(record, summary):
+        done = summary['rendered'] + summary['failed']
+        print(f"[{done}] {record['url']} -> {record.get('path', record.get('error'))}", file=sys.stderr)
+
+    source = sys.stdin if args.input == "-" else open(args.input, 'r')
+    try:
+        summary = render_reports(read_audits(source), args.output, args.processes, progress)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+    print(f"\n✅ Rendered {summary['rendered']} reports ({summary['failed']} failed, "
+          f"{summary['skipped']} audits without results) in {summary['elapsed']}s", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+import re
+import sqlite3
+import requests
+from urllib.parse import urljoin, urlsplit
+from config import setting
+from disk_cache import DiskCache
+from document import as_document
+from http_client import get_session
+from probe_engine import probe_urls
+from utils import canonicalize_url
+
+# Subresource page weight: every script, stylesheet, image, font and iframe the page
+# loads, sized concurrently from response headers (no bodies are downloaded unless
+# the server sends no length at all)
+RESOURCE_CONCURRENCY = setting("AUDITAI_RESOURCE_CONCURRENCY", 32)
+RESOURCE_PER_HOST = setting("AUDITAI_RESOURCE_PER_HOST", 6)
+RESOURCE_TIMEOUT = setting("AUDITAI_RESOURCE_TIMEOUT", 5.0)
+RESOURCE_TIME_BUDGET = setting("AUDITAI_RESOURCE_TIME_BUDGET", 30.0)
+
+# Bodies without any length are counted up to this many bytes (sizes that hit the
+# cap are lower bounds); kept small, as up to RESOURCE_CONCURRENCY bodies stream at once
+STREAM_LIMIT_BYTES = int(setting("AUDITAI_RESOURCE_STREAM_LIMIT_MB", 2.0) * 1024 * 1024)
+
+# Resource sizes shared across audits, keyed by canonical URL, so the stylesheets and
+# scripts every page of a site loads are sized once
+RESOURCE_CACHE_PATH = setting("AUDITAI_RESOURCE_CACHE", "resource_cache.db")
+RESOURCE_CACHE_MAX_ENTRIES = setting("AUDITAI_RESOURCE_CACHE_MAX", 50000)
+RESOURCE_CACHE_TTL = setting("AUDITAI_RESOURCE_CACHE_TTL", 24 * 3600)
+FAILED_RESOURCE_TTL = setting("AUDITAI_RESOURCE_CACHE_TTL_FAILED", 600)
+
+RESOURCE_TYPES = ('html', 'script', 'stylesheet', 'image', 'font', 'iframe')
+FONT_EXTENSIONS = ('.woff2', '.woff', '.ttf', '.otf', '.eot')
+
+_CSS_URL = re.compile(r'url\(\s*[\'"]?([^\'")]+)[\'"]?\s*\)')
+
+_resource_cache = None
+
+def get_resource_cache():
+    """Shared on-disk resource size cache, opened on first use"""
+    global _resource_cache
+    if _resource_cache is None:
+        _resource_cache = DiskCache(RESOURCE_CACHE_PATH, max_entries=RESOURCE_CACHE_MAX_ENTRIES)
+    return _resource_cache
+
+def _link_type(link):
+    rel = link.get('rel') or []
+    if isinstance(rel, str):
+        rel = rel.split()
+    rel = [token.lower() for token in rel]
+    href = link.get('href', '').split('?')[0].lower()
+    if 'stylesheet' in rel:
+        return 'stylesheet'
+    if 'icon' in rel or 'apple-touch-icon' in rel:
+        return 'image'
+    if 'preload' in rel or 'prefetch' in rel:
+        kind = (link.get('as') or '').lower()
+        if kind == 'style':
+            return 'stylesheet'
+        if kind in ('script', 'image', 'font'):
+            return kind
+    if href.endswith(FONT_EXTENSIONS):
+        return 'font'
+    return None
+
+def collect_resources(page, url=None):
+    """
+    Subresources the page loads, as (absolute URL, type) pairs deduplicated by
+    canonical URL; types are script, stylesheet, image, font and iframe
+    Fonts are found in <link> tags and inline @font-face rules
+    Accepts a PageDocument or a BeautifulSoup tree
+    """
+    document = as_document(page, url)
+    url = url or document.url
+    index = document.index
+    found = []
+
+    for script in index.find_all('script'):
+        found.append((script.get('src'), 'script'))
+    for link in index.find_all('link'):
+        found.append((link.get('href'), _link_type(link)))
+    for img in index.find_all('img'):
+        found.append((img.get('src'), 'image'))
+    for video in index.find_all('video'):
+        found.append((video.get('poster'), 'image'))
+    for iframe in index.find_all('iframe'):
+        found.append((iframe.get('src'), 'iframe'))
+    for style in index.find_all('style'):
+        for ref in _CSS_URL.findall(style.get_text()):
+            if ref.split('?')[0].lower().endswith(FONT_EXTENSIONS):
+                found.append((ref, 'font'))
+
+    resources = []
+    seen = set()
+    for ref, kind in found:
+        if not ref or not kind or ref.startswith(('data:', 'javascript:', '#')):
+            continue
+        full_url = urljoin(url, ref.strip())
+        if not full_url.startswith(('http://', 'https://')):
+            continue
+        canonical = canonicalize_url(full_url)
+        if canonical not in seen:
+            seen.add(canonical)
+            resources.append((full_url, kind))
+    return resources
+
+def _content_range_total(value):
+    # "bytes 0-0/12345" -> 12345
+    total = (value or '').rpartition('/')[2]
+    return int(total) if total.isdigit() else None
+
+def size_resource(resource_url, timeout=RESOURCE_TIMEOUT):
+    """
+    Transfer size of one resource in bytes: Content-Length of a HEAD, else the total
+    of a 1-byte ranged GET, else the streamed body (up to STREAM_LIMIT_BYTES)
+    Returns dict with bytes (None if unknown) and status, plus capped=True when the
+    body hit the limit and bytes is only a lower bound
+    """
+    session = get_session()
+    try:
+        response = session.head(resource_url, timeout=timeout, allow_redirects=True)
+        length = response.headers.get('Content-Length')
+        if response.status_code < 400 and length and length.isdigit() and int(length) > 0:
+            return {'bytes': int(length), 'status': response.status_code}
+
+        with session.get(resource_url, timeout=timeout, stream=True, headers={"Range": "bytes=0-0"}) as ranged:
+            if ranged.status_code >= 400:
+                return {'bytes': None, 'status': ranged.status_code}
+            total = _content_range_total(ranged.headers.get('Content-Range'))
+            if total is not None:
+                return {'bytes': total, 'status': ranged.status_code}
+            length = ranged.headers.get('Content-Length')
+            if ranged.status_code == 200 and length and length.isdigit():
+                return {'bytes': int(length), 'status': 200}
+
+            # No length anywhere (e.g. chunked): count the body as it streams
+            size = 0
+            for chunk in ranged.raw.stream(64 * 1024, decode_content=False):
+                size += len(chunk)
+                if size >= STREAM_LIMIT_BYTES:
+                    return {'bytes': size, 'status': ranged.status_code, 'capped': True}
+            return {'bytes': size, 'status': ranged.status_code}
+    except requests.exceptions.RequestException as e:
+        return {'bytes': None, 'status': 'Error', 'error': str(e)[:50]}
+
+def _site(host):
+    host = (host or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+def is_third_party(page_url, resource_url):
+    """True unless the resource's host is the page's site or one of its subdomains"""
+    site = _site(urlsplit(page_url).hostname)
+    host = _site(urlsplit(resource_url).hostname)
+    return not (host == site or host.endswith('.' + site) or site.endswith('.' + host))
+
+def _failed(result):
+    return isinstance(result['status'], str) or result['status'] >= 400
+
+def analyze_resources(url, resources, html_bytes=0, timeout=RESOURCE_TIMEOUT,
+                      max_concurrency=RESOURCE_CONCURRENCY, per_host_limit=RESOURCE_PER_HOST,
+                      time_budget=RESOURCE_TIME_BUDGET, use_cache=True):
+    """
+    Sizes collected resources concurrently and totals the page weight
+    Consults the resource size cache first and sizes only the misses, under total
+    and per-host concurrency limits and a time budget
+    Returns dict with total bytes/MB (HTML included), bytes and counts per resource
+    type, first- vs third-party split, the largest resources, and counts of
+    resources that failed, could not be sized, were only sized up to the stream
+    limit (so the totals are lower bounds) or ran out of time budget
+    """
+    types = dict(resources)
+    keys = {canonicalize_url(resource_url): resource_url for resource_url in types}
+
+    cached = {}
+    if use_cache:
+        try:
+            cached = {keys[key]: result for key, result in get_resource_cache().get_many(keys).items()}
+        except sqlite3.Error:
+            cached = {}
+    probed = probe_urls(
+        [resource_url for resource_url in types if resource_url not in cached],
+        lambda resource_url: size_resource(resource_url, timeout),
+        max_concurrency=max_concurrency,
+        per_host_limit=per_host_limit,
+        time_budget=time_budget
+    )
+
+    if use_cache and probed['results']:
+        try:
+            get_resource_cache().set_many(
+                (canonicalize_url(resource_url), result,
+                 FAILED_RESOURCE_TTL if _failed(result) else RESOURCE_CACHE_TTL)
+                for resource_url, result in probed['results'].items()
+            )
+        except sqlite3.Error:
+            pass
+
+    by_type = {kind: {'count': 0, 'bytes': 0} for kind in RESOURCE_TYPES}
+    by_type['html'] = {'count': 1, 'bytes': html_bytes}
+    party = {'first_party_bytes': html_bytes, 'third_party_bytes': 0}
+    third_party_hosts = {}
+    sized = []
+    failed = unsized = capped = 0
+
+    for resource_url, result in {**cached, **probed['results']}.items():
+        kind = types[resource_url]
+        by_type[kind]['count'] += 1
+        if _failed(result):
+            failed += 1
+            continue
+        if result['bytes'] is None:
+            unsized += 1
+            continue
+        by_type[kind]['bytes'] += result['bytes']
+        capped += bool(result.get('capped'))
+        third_party = is_third_party(url, resource_url)
+        if third_party:
+            party['third_party_bytes'] += result['bytes']
+            host = urlsplit(resource_url).hostname
+            third_party_hosts[host] = third_party_hosts.get(host, 0) + result['bytes']
+        else:
+            party['first_party_bytes'] += result['bytes']
+        sized.append({'url': resource_url, 'type': kind, 'bytes': result['bytes'], 'third_party': third_party,
+                      'capped': bool(result.get('capped'))})
+
+    total_bytes = sum(entry['bytes'] for entry in by_type.values())
+    largest = sorted(sized, key=lambda entry: entry['bytes'], reverse=True)[:10]
+    return {
+        'total_bytes': total_bytes,
+        'total_mb': round(total_bytes / (1024 * 1024), 3),
+        'html_bytes': html_bytes,
+        'resource_count': len(resources),
+        'by_type': by_type,
+        **party,
+        'third_party_hosts': dict(sorted(third_party_hosts.items(), key=lambda item: item[1], reverse=True)[:10]),
+        'largest_resources': largest,
+        'failed_count': failed,
+        'unsized_count': unsized,
+        'capped_count': capped,
+        'unchecked_count': len(probed['unchecked']),
+        'cache_hits': len(cached),
+        'check_time': round(probed['elapsed'], 2)
+    }
+
+def html_only_resource_data(html_bytes, resources=()):
+    """Resource result counting only the HTML, used when sizing is unavailable"""
+    by_type = {kind: {'count': 0, 'bytes': 0} for kind in RESOURCE_TYPES}
+    by_type['html'] = {'count': 1, 'bytes': html_bytes}
+    return {
+        'total_bytes': html_bytes, 'total_mb': round(html_bytes / (1024 * 1024), 3), 'html_bytes': html_bytes,
+        'resource_count': len(resources), 'by_type': by_type,
+        'first_party_bytes': html_bytes, 'third_party_bytes': 0, 'third_party_hosts': {},
+        'largest_resources': [], 'failed_count': 0, 'unsized_count': 0, 'capped_count': 0,
+        'unchecked_count': len(resources), 'cache_hits': 0, 'check_time': 0
+    }
@@ -1,56 +1,75 @@
-from bs4 import BeautifulSoup
-import time
-from utils import safe_request
+from document import fetch_document, FETCH_PHASES
 
-def scan_website(url):
+def scan_website(url, document=None):
+    """
+    Scans a page for SEO and technical metrics
+    Pass an already fetched PageDocument to reuse it instead of fetching again
+    """
     data = {}
 
-    # Measure total load time including HTTP request
-    start = time.time()
-    response = safe_request(url)
-    if not response:
+    if document is None:
+        document = fetch_document(url)
+    if document is None:
         return {"error": "Unable to fetch URL", "score": 0}
 
-    soup = BeautifulSoup(response.text, "html.parser")
-    load_time = round(time.time() - start, 2)
+    index = document.index
+
+    # Load time is the network fetch only; parsing is reported separately
+    load_time = round(document.timings.get("fetch", 0), 2)
 
     # Page size in MB
-    page_size_mb = len(response.content) / (1024*1024)
+    page_size_mb = document.page_size_mb
 
     # Count internal vs external links
     internal_links = 0
     external_links = 0
-    for link in soup.find_all("a", href=True):
+    for link in index.with_attr("href", "a"):
         href = link.get("href")
         if href.startswith("http") and url.split("//")[1] in href:
             internal_links += 1
         elif href.startswith("http"):
             external_links += 1
 
+    # Plain str, so results pickle without dragging the parse tree along
+    title_tag = index.find("title")
+    title = title_tag.string if title_tag else "Missing"
+    if title is not None:
+        title = str(title)
+
     # Heading counts
     headings_count = {
-        "H1": len(soup.find_all("h1")),
-        "H2": len(soup.find_all("h2")),
-        "H3": len(soup.find_all("h3"))
+        "H1": index.count("h1"),
+        "H2": index.count("h2"),
+        "H3": index.count("h3")
     }
 
     data.update({
-        "status_code": response.status_code,
+        "status_code": document.status_code,
         "load_time": load_time,
+        "timings": page_timings(document),
         "https": url.startswith("https"),
-        "title": soup.title.string if soup.title else "Missing",
-        "meta_description": bool(soup.find("meta", attrs={"name": "description"})),
+        "title": title,
+        "meta_description": bool(index.find_by_attr("meta", "name", "description")),
         "h1_count": headings_count["H1"],
         "h2_count": headings_count["H2"],
         "h3_count": headings_count["H3"],
         "headings_count": headings_count,
-        "images_without_alt": len([img for img in soup.find_all("img") if not img.get("alt")]),
-        "links_count": len(soup.find_all("a")),
+        "images_without_alt": len([img for img in index.find_all("img") if not img.get("alt")]),
+        "links_count": index.count("a"),
         "internal_links": internal_links,
         "external_links": external_links,
-        "scripts_count": len(soup.find_all("script")),
-        "paragraph_count": len(soup.find_all("p")),
-        "page_size_mb": page_size_mb
+        "scripts_count": index.count("script"),
+        "paragraph_count": index.count("p"),
+        "page_size_mb": page_size_mb,
+        "truncated": document.truncated
     })
+    if document.timing_stats:
+        data["timings_p95"] = {phase: round(stats['p95'], 4) for phase, stats in document.timing_stats.items()}
 
     return data
+
+def page_timings(document, parse_time=None):
+    """Seconds per fetch phase (dns, connect, tls, ttfb, download, fetch) plus parse"""
+    timings = {phase: round(document.timings.get(phase, 0), 4) for phase in FETCH_PHASES}
+    timings["parse"] = round(document.parse_time if parse_time is None else parse_time, 4)
+    return timings
@@ -1,11 +1,37 @@
+# Per-phase budgets in seconds, and for the full page weight in MB: a phase within
+# budget earns all its weight, one at PHASE_LIMIT times its budget or over earns none
+PHASE_BUDGETS = {'dns': 0.1, 'connect': 0.1, 'tls': 0.2, 'ttfb': 0.6, 'download': 1.0, 'parse': 0.5,
+                 'page_weight_mb': 1.5}
+PHASE_WEIGHTS = {'dns': 5, 'connect': 5, 'tls': 10, 'ttfb': 30, 'download': 15, 'parse': 15,
+                 'page_weight_mb': 20}
+PHASE_LIMIT = 4
+
+def _phase_points(value, phase):
+    over = value / PHASE_BUDGETS[phase]
+    return PHASE_WEIGHTS[phase] * min(1, max(0, (PHASE_LIMIT - over) / (PHASE_LIMIT - 1)))
+
+def performance_score(scan_data):
+    """
+    0-100 from the DNS, connect, TLS, TTFB, download and parse timings and, once the
+    subresources are sized, the full page weight
+    Results without a timing breakdown (e.g. older history) are scored on load_time
+    """
+    timings = scan_data.get("timings")
+    if not timings:
+        return max(0, 100 - scan_data.get("load_time", 5) * 10)
+
+    phases = {phase: timings.get(phase, 0) for phase in PHASE_WEIGHTS if phase != 'page_weight_mb'}
+    if scan_data.get("page_weight_mb") is not None:
+        phases['page_weight_mb'] = scan_data["page_weight_mb"]
+    points = sum(_phase_points(value, phase) for phase, value in phases.items())
+    return round(points * 100 / sum(PHASE_WEIGHTS[phase] for phase in phases), 2)
+
 def calculate_score(scan_data):
     score = 0
     score += 15 if scan_data.get("https") else 0
 
-    load_time = scan_data.get("load_time", 5)
-    if load_time <= 1: score += 15
-    elif load_time <= 3: score += 10
-    else: score += 5
+    # Speed earns 5 to 15 points, the range the old load time buckets gave
+    score += 5 + performance_score(scan_data) / 10
 
     score += 10 if scan_data.get("title") != "Missing" else 0
     score += 10 if scan_data.get("meta_description") else 0
@@ -23,3 +49,11 @@ def calculate_score(scan_data):
     score += 10 if scan_data.get("status_code") == 200 else 0
 
     return round(min(score, 100), 2)
+
+def add_category_scores(scan_data):
+    """Adds overall, SEO, performance and security scores to scan_data"""
+    scan_data["overall_score"] = calculate_score(scan_data)
+    scan_data["seo_score"] = max(0, 100 - scan_data.get("images_without_alt", 0) * 5)
+    scan_data["performance_score"] = performance_score(scan_data)
+    scan_data["security_score"] = 100 if scan_data.get("https") else 50
+    return scan_data
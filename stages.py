@@ -0,0 +1,164 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# Small dependency-aware executor for audit stages. Each stage declares the stages
+# it requires and receives their results as keyword arguments; every stage whose
+# requirements are met starts at once, so an audit takes about as long as its
+# slowest chain of stages rather than the sum of all of them.
+
+class Stage:
+    """
+    One unit of work in a stage graph
+    - func: called with the results of `requires` as keyword arguments
+    - kind: 'thread' for I/O-bound work, 'process' to run in the process executor
+      (func and its arguments must then be picklable)
+    - timeout: seconds before the stage is given up on (None waits forever)
+    - fallback: called like func when the stage fails or times out; its value is
+      used instead, so dependent stages still run. Without one they are skipped.
+    """
+    def __init__(self, name, func, requires=(), kind='thread', timeout=None, fallback=None):
+        if kind not in ('thread', 'process'):
+            raise ValueError(f"Unknown stage kind '{kind}', expected 'thread' or 'process'")
+        self.name = name
+        self.func = func
+        self.requires = tuple(requires)
+        self.kind = kind
+        self.timeout = timeout
+        self.fallback = fallback
+
+def _check_graph(stages):
+    names = set()
+    for stage in stages:
+        if stage.name in names:
+            raise ValueError(f"Duplicate stage '{stage.name}'")
+        names.add(stage.name)
+    for stage in stages:
+        missing = [name for name in stage.requires if name not in names]
+        if missing:
+            raise ValueError(f"Stage '{stage.name}' requires unknown stages {missing}")
+
+    # Kahn's algorithm: anything left over is part of a cycle
+    remaining = {stage.name: set(stage.requires) for stage in stages}
+    while remaining:
+        ready = [name for name, requires in remaining.items() if not requires]
+        if not ready:
+            raise ValueError(f"Stage graph has a cycle through {sorted(remaining)}")
+        for name in ready:
+            del remaining[name]
+        for requires in remaining.values():
+            requires.difference_update(ready)
+
+def iter_stages(stages, executor=None, process_executor=None, cancel_event=None):
+    """
+    Runs a stage graph with as much parallelism as the dependencies allow
+    Yields (name, status, value, elapsed) as each stage finishes, where status is
+    'ok', 'error', 'timeout', 'skipped' or 'cancelled'. Process stages run in
+    process_executor when given, otherwise on threads. Setting cancel_event (or
+    closing the generator) stops new stages from starting; stages already running
+    finish in the background and their results are discarded.
+    """
+    stages = list(stages)
+    _check_graph(stages)
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=max(1, len(stages)), thread_name_prefix='stage')
+
+    results = {}    # name -> (usable, value)
+    waiting = list(stages)
+    running = {}    # future -> (stage, started)
+    poll = 0.1 if cancel_event is not None else None
+
+    def cancelled():
+        return cancel_event is not None and cancel_event.is_set()
+
+    def finish(stage, status, value, started, usable=False):
+        results[stage.name] = (usable, value)
+        return stage.name, status, value, round(time.time() - started, 3)
+
+    def recover(stage, status, error, started):
+        # Failed or timed out: use the fallback value if there is one
+        if stage.fallback is not None:
+            try:
+                kwargs = {name: results[name][1] for name in stage.requires}
+                return finish(stage, status, stage.fallback(**kwargs), started, usable=True)
+            except Exception as e:
+                error = e
+        return finish(stage, status, error, started)
+
+    try:
+        while (waiting or running) and not cancelled():
+            # Start every stage whose requirements are done; skip those with a failed requirement
+            progressed = True
+            while progressed:
+                progressed = False
+                for stage in list(waiting):
+                    if any(name not in results for name in stage.requires):
+                        continue
+                    waiting.remove(stage)
+                    progressed = True
+                    if not all(results[name][0] for name in stage.requires):
+                        yield finish(stage, 'skipped', None, time.time())
+                        continue
+                    kwargs = {name: results[name][1] for name in stage.requires}
+                    pool = process_executor if stage.kind == 'process' and process_executor else executor
+                    running[pool.submit(stage.func, **kwargs)] = (stage, time.time())
+
+            if not running:
+                break
+
+            # Wait for the next stage to finish, the nearest deadline, or a cancellation check
+            now = time.time()
+            waits = [started + stage.timeout - now for stage, started in running.values()
+                     if stage.timeout is not None]
+            if poll:
+                waits.append(poll)
+            done, _ = wait(list(running), timeout=max(0, min(waits)) if waits else None,
+                           return_when=FIRST_COMPLETED)
+
+            for future in done:
+                stage, started = running.pop(future)
+                try:
+                    value = future.result()
+                except Exception as e:
+                    yield recover(stage, 'error', e, started)
+                else:
+                    yield finish(stage, 'ok', value, started, usable=True)
+
+            now = time.time()
+            for future, (stage, started) in list(running.items()):
+                if stage.timeout is not None and now - started >= stage.timeout:
+                    del running[future]
+                    future.cancel()
+                    yield recover(stage, 'timeout', TimeoutError(f"Stage '{stage.name}' timed out"), started)
+
+        if cancelled():
+            for future, (stage, started) in list(running.items()):
+                future.cancel()
+                yield finish(stage, 'cancelled', None, started)
+            running.clear()
+            for stage in waiting:
+                yield finish(stage, 'cancelled', None, time.time())
+    finally:
+        for future in running:
+            future.cancel()
+        if own_executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+def run_stages(stages, executor=None, process_executor=None, cancel_event=None, on_stage=None):
+    """
+    Runs a stage graph to completion
+    on_stage(name, status, value, elapsed) is called as each stage finishes
+    Returns (results, report): stage name -> value, and stage name -> dict with
+    status and elapsed seconds (plus error for failed stages)
+    """
+    results = {}
+    report = {}
+    for name, status, value, elapsed in iter_stages(stages, executor, process_executor, cancel_event):
+        if on_stage:
+            on_stage(name, status, value, elapsed)
+        report[name] = {'status': status, 'elapsed': elapsed}
+        if isinstance(value, BaseException):
+            report[name]['error'] = f"{type(value).__name__}: {value}"
+            value = None
+        results[name] = value
+    return results, report
@@ -1,24 +1,42 @@
 import re
 import requests
+from urllib.parse import urlsplit, urlunsplit
+from http_client import get_session
 
 def normalize_url(url):
     if not url.startswith(("http://", "https://")):
         return "https://" + url
     return url
 
+def canonicalize_url(url):
+    """
+    Canonical form used to deduplicate URLs: lowercase scheme and host,
+    no default port, no fragment, and '/' for an empty path
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if ":" in host:
+        host = f"[{host}]"
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and not ((scheme == "http" and port == 80) or (scheme == "https" and port == 443)):
+        host = f"{host}:{port}"
+    if parts.username:
+        host = f"{parts.username}@{host}"
+    return urlunsplit((scheme, host, parts.path or "/", parts.query, ""))
+
 def is_valid_url(url):
     regex = re.compile(
         r'^(https?:\/\/)?([\da-z.-]+)\.([a-z.]{2,6})([\/\w .-]*)*\/?$'
     )
     return re.match(regex, url) is not None
 
-def safe_request(url, timeout=10):
+def safe_request(url, timeout=10, headers=None, stream=False):
     try:
-        response = requests.get(
-            url,
-            timeout=timeout,
-            headers={"User-Agent": "AI-Site-Auditor"}
-        )
+        response = get_session().get(url, timeout=timeout, headers=headers, stream=stream)
         return response
     except requests.exceptions.RequestException:
         return None